@@ -31,6 +31,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # ← Servidor ASGI (runserver con soporte WebSocket)
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'corsheaders',
     'drf_yasg',
+    # Chat en tiempo real (WebSocket)
+    'channels',
 ]
 
 MIDDLEWARE = [
@@ -52,6 +55,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.sesion.UsuarioActualMiddleware',  # request.usuario (sesión propia)
+    'core.bitacora.ContextoBitacoraMiddleware',  # usuario en los registros de core
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -75,6 +80,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'academia.wsgi.application'
+ASGI_APPLICATION = 'academia.asgi.application'
 
 
 # Database
@@ -114,6 +120,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cifrado de contraseñas: el primero se usa para las contraseñas nuevas; los
+# demás solo para verificar. Al iniciar sesión, un hash con otro algoritmo o
+# con parámetros anteriores se vuelve a cifrar con el primero (ver
+# core/sesion.py). Medir cada uno con: python manage.py benchmark_login
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -201,6 +219,86 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 # Guardar la sesión en cada request
 SESSION_SAVE_EVERY_REQUEST = False
 
+# Sesiones en la base de datos más el índice de sesiones por usuario (ver
+# core/motor_sesiones.py). Si CACHES define el alias 'sesiones' con un cache
+# compartido también se leen de él; un cache local al proceso se ignora,
+# porque una sesión revocada seguiría valiendo en los demás procesos.
+SESSION_ENGINE = 'core.motor_sesiones'
+SESSION_CACHE_ALIAS = 'sesiones'
+
+# Sesiones vencidas que borra clearsessions en cada lote
+SESSION_LIMPIEZA_LOTE = 1000
+
+
+# ===================================
+# CONFIGURACIÓN DEL CHAT
+# ===================================
+
+# Tiempo máximo (segundos) que una petición de long-polling espera mensajes nuevos
+CHAT_LONG_POLL_TIMEOUT = 25
+
+# Mensajes por página en el historial de chat_room (los anteriores se cargan por cursor)
+CHAT_MENSAJES_POR_PAGINA = 50
+
+# Filas por INSERT al enviar un mensaje a todos los estudiantes de un curso
+CHAT_DIFUSION_LOTE = 500
+
+# Presencia en el chat: almacenamiento, segundos para seguir "en línea" desde
+# el último latido, y cada cuánto se escribe como máximo un latido por usuario.
+# Con varios procesos usar 'core.presencia.PresenciaEnCache' y un cache compartido.
+CHAT_PRESENCIA_BACKEND = 'core.presencia.PresenciaEnMemoria'
+CHAT_PRESENCIA_TTL = 60
+CHAT_PRESENCIA_LATIDO = 20
+
+# Segundos que dura el indicador "escribiendo..." sin nuevas pulsaciones
+CHAT_ESCRIBIENDO_TTL = 5
+
+# Channel layer para el chat por WebSocket.
+# En memoria (un solo proceso); para varios servidores cambiar por un broker
+# compartido, por ejemplo 'channels_redis.core.RedisChannelLayer'.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+
+# ===================================
+# CONFIGURACIÓN DE CACHÉ
+# ===================================
+
+# En memoria (un solo proceso). Con varios procesos o servidores usar un cache
+# compartido, por ejemplo 'django.core.cache.backends.redis.RedisCache', para
+# que la invalidación de los paneles llegue a todos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'academia',
+    },
+    # Páginas completas para visitantes anónimos; siempre local al proceso
+    'paginas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'academia-paginas',
+    },
+    # Sesiones (SESSION_CACHE_ALIAS): descomentar con un cache compartido
+    # para leerlas sin consultar la base de datos en cada petición
+    # 'sesiones': {
+    #     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #     'LOCATION': 'redis://127.0.0.1:6379/1',
+    # },
+}
+
+# Segundos que se guarda cada sección de los paneles; los cambios de datos
+# la invalidan antes mediante señales (ver core/paneles.py)
+PANEL_CACHE_TIMEOUT = 600
+
+# Segundos que se guarda el catálogo público de cursos (ver core/catalogo.py)
+CATALOGO_CACHE_TIMEOUT = 3600
+
+# Páginas públicas para visitantes anónimos (ver core/cache_paginas.py)
+PAGINAS_CACHE_ALIAS = 'paginas'
+PAGINAS_CACHE_TIMEOUT = 300
+
 
 # ===================================
 # CONFIGURACIÓN DE LOGGING (Opcional)
@@ -214,16 +312,41 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        # Registros de core: incluye el usuario de la petición (ver core/bitacora.py)
+        # (defaults: registros que no pasaron por el filtro 'contexto')
+        'estructurado': {
+            '()': 'logging.Formatter',
+            'fmt': '{levelname} {asctime} {name} usuario={usuario_id} {message}',
+            'style': '{',
+            'defaults': {'usuario_id': None},
+        },
+    },
+    'filters': {
+        'contexto': {
+            '()': 'core.bitacora.ContextoSolicitud',
+        },
+        # Fracción de registros que se guarda por nivel; DEBUG solo para los
+        # usuarios en depuración (python manage.py depurar_usuario <id>)
+        'muestreo': {
+            '()': 'core.bitacora.MuestreoPorNivel',
+            'tasas': {'DEBUG': 0.0, 'INFO': 1.0},
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'core_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'estructurado',
+            'filters': ['contexto', 'muestreo'],
+        },
         'file': {
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'logs' / 'debug.log',
-            'formatter': 'verbose',
+            'formatter': 'estructurado',
+            'filters': ['contexto', 'muestreo'],
         },
     },
     'loggers': {
@@ -231,14 +354,19 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        # Los handlers de core se escriben desde un hilo aparte (QueueListener)
+        # y sus filtros se aplican antes de encolar; ver core/bitacora.py
         'core': {
-            'handlers': ['console', 'file'],
+            'handlers': ['core_console', 'file'],
             'level': 'DEBUG',
             'propagate': False,
         },
     },
 }
 
+# Segundos entre relecturas de los usuarios en depuración
+BITACORA_DEPURACION_REFRESCO = 5
+
 
 # ===================================
 # CONFIGURACIÓN DE AUTENTICACIÓN
@@ -3,13 +3,19 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
+from django.db import transaction
 from django.contrib import messages as admin_messages
+from .busqueda import motor_busqueda
+from .paneles import PANEL_ADMIN, invalidar_paneles
 from .models import (
     Usuario, Curso, Inscripcion, Clase, ReciboPago,
     ContenidoEducativo, Evaluacion, ResultadoEvaluacion,
-    Mensaje, Reporte, TicketSoporte, LogActividad, IdiomaInterfaz
+    Mensaje, Reporte, TicketSoporte, LogActividad, IdiomaInterfaz, Estadistica
 )
 
+# Máximo de mensajes que aporta la búsqueda de texto completo en el admin
+LIMITE_BUSQUEDA_ADMIN = 500
+
 # ===== FORMULARIO PERSONALIZADO PARA VALIDACIÓN =====
 
 class UsuarioInlineForm(forms.ModelForm):
@@ -184,13 +190,15 @@ class UsuarioAdmin(admin.ModelAdmin):
 
 @admin.register(Curso)
 class CursoAdmin(admin.ModelAdmin):
-    list_display = ('idCurso', 'Nombre', 'Nivel_mcerl', 'Modalidad', 'Estado')
-    list_filter = ('Nivel_mcerl', 'Modalidad', 'Estado')
+    list_display = ('idCurso', 'Nombre', 'Idioma', 'Nivel_mcerl', 'Modalidad', 'Estado')
+    list_filter = ('Idioma', 'Nivel_mcerl', 'Modalidad', 'Estado')
     search_fields = ('Nombre',)
+    # Se deriva del nombre al guardar (ver Curso.save)
+    readonly_fields = ('Idioma',)
     
     fieldsets = (
         ('📚 Información del Curso', {
-            'fields': ('Nombre', 'Nivel_mcerl')
+            'fields': ('Nombre', 'Idioma', 'Nivel_mcerl')
         }),
         ('⚙️ Configuración', {
             'fields': ('Modalidad', 'Estado')
@@ -350,8 +358,20 @@ Academia de Idiomas
     enviar_recibo_email.short_description = "Enviar recibo por email"
     
     def marcar_como_pagado(self, request, queryset):
-        """Marca los recibos seleccionados como pagados"""
-        actualizados = queryset.update(Estado_pago='pagado')
+        """
+        Marca los recibos seleccionados como pagados. update() no dispara
+        las señales, así que el contador de pagos pendientes y los paneles
+        afectados (administrativo y de cada estudiante) se ajustan aquí.
+        """
+        with transaction.atomic():
+            # Bloquea los pendientes para que el descuento coincida con lo actualizado
+            pendientes = list(
+                queryset.filter(Estado_pago='pendiente').select_for_update().values_list('pk', flat=True)
+            )
+            usuarios = set(queryset.values_list('idUsuario_id', flat=True))
+            actualizados = queryset.update(Estado_pago='pagado')
+            Estadistica.sumar('pagos_pendientes', -len(pendientes))
+            transaction.on_commit(lambda: invalidar_paneles({PANEL_ADMIN, *usuarios}))
         self.message_user(
             request,
             f'Se marcaron {actualizados} recibo(s) como pagados.',
@@ -427,7 +447,8 @@ class ResultadoEvaluacionAdmin(admin.ModelAdmin):
 class MensajeAdmin(admin.ModelAdmin):
     list_display = ('idMensaje', 'Remitente', 'Destinatario', 'obtener_contenido_corto', 'Fecha_hora')
     list_filter = ('Fecha_hora',)
-    search_fields = ('Remitente__Nombres', 'Destinatario__Nombres', 'Contenido')
+    # El contenido se busca con el índice de texto completo (ver get_search_results)
+    search_fields = ('Remitente__Nombres', 'Destinatario__Nombres')
     date_hierarchy = 'Fecha_hora'
     readonly_fields = ('Fecha_hora',)
     
@@ -448,6 +469,31 @@ class MensajeAdmin(admin.ModelAdmin):
             return f"{obj.Contenido[:50]}..."
         return obj.Contenido
     obtener_contenido_corto.short_description = 'Contenido'
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Agrega las coincidencias en el contenido usando el motor de texto
+        completo (solo Mensaje). Aporta como máximo LIMITE_BUSQUEDA_ADMIN
+        mensajes, los más relevantes, y avisa si hubo más.
+        """
+        resultados, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            ids = [
+                id_ for _, id_, _ in motor_busqueda().buscar(
+                    None, search_term, LIMITE_BUSQUEDA_ADMIN + 1, tipos=('mensaje',)
+                )
+            ]
+            if len(ids) > LIMITE_BUSQUEDA_ADMIN:
+                ids = ids[:LIMITE_BUSQUEDA_ADMIN]
+                self.message_user(
+                    request,
+                    f'La búsqueda en el contenido muestra solo los {LIMITE_BUSQUEDA_ADMIN} mensajes más '
+                    f'relevantes; usa un término más específico o los filtros para ver el resto.',
+                    level=admin_messages.WARNING
+                )
+            # Sobre el queryset recibido, para respetar los filtros del listado
+            resultados |= queryset.filter(idMensaje__in=ids)
+        return resultados, may_have_duplicates
 
 
 @admin.register(Reporte)
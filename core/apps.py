@@ -6,5 +6,7 @@ class CoreConfig(AppConfig):
     verbose_name = 'Core'
     
     def ready(self):
-        """Importar signals cuando la app esté lista"""
-        import core.signals
\ No newline at end of file
+        """Importar signals cuando la app esté lista y poner en cola el logging de core"""
+        import core.signals
+        from core.bitacora import iniciar_cola
+        iniciar_cola('core')
@@ -0,0 +1,215 @@
+import contextvars
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import timedelta
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+
+# -----------------------------------------------------
+# Logging del paquete core: cola, contexto, muestreo y depuración por usuario
+# -----------------------------------------------------
+#
+# Los handlers del logger 'core' definidos en settings.LOGGING se mueven a
+# un QueueListener (hilo aparte) y el logger queda con un solo ColaCore:
+# las vistas solo encolan el registro y nunca esperan por el archivo o la
+# consola. Los filtros van en los handlers (no en el logger) para que
+# también se apliquen a core.views, core.sesion, etc.; los que comparten
+# todos los handlers pasan al ColaCore para que se evalúen en el hilo de la
+# petición (el contexto vive en contextvars) y para que los registros
+# descartados por muestreo no lleguen a la cola.
+#
+# Si LOGGING se vuelve a aplicar (otro django.setup()), dictConfig cierra
+# el ColaCore, lo que detiene su QueueListener; los handlers nuevos quedan
+# síncronos pero con sus filtros, así que los registros siguen completos.
+#
+# Los mensajes usan el formato perezoso de logging: logger.info('x=%s', x)
+# solo arma el texto si el registro pasa el nivel y los filtros.
+
+# Contexto de la petición actual (lo fija ContextoBitacoraMiddleware)
+_usuario_id = contextvars.ContextVar('bitacora_usuario_id', default=None)
+_depurado = contextvars.ContextVar('bitacora_depurado', default=False)
+
+_cola_lock = threading.Lock()
+
+
+class ColaCore(QueueHandler):
+    """QueueHandler dueño de su QueueListener: al cerrarse lo detiene"""
+
+    def __init__(self, destinos):
+        super().__init__(queue.SimpleQueue())
+        self.oyente = QueueListener(self.queue, *destinos, respect_handler_level=True)
+
+    def close(self):
+        with _cola_lock:
+            # stop() vacía la cola antes de volver; no se puede llamar dos veces
+            if self.oyente._thread is not None:
+                self.oyente.stop()
+        super().close()
+
+
+def iniciar_cola(nombre='core'):
+    """
+    Pone en cola los handlers del logger (se llama en CoreConfig.ready()).
+    Es idempotente: si el logger ya tiene su ColaCore retorna el mismo oyente.
+    """
+    registro = logging.getLogger(nombre)
+    with _cola_lock:
+        actual = next((h for h in registro.handlers if isinstance(h, ColaCore)), None)
+        if actual is not None:
+            return actual.oyente
+
+        destinos = [h for h in registro.handlers if not isinstance(h, QueueHandler)]
+        if not destinos:
+            return None
+
+        manejador = ColaCore(destinos)
+        comunes = [f for f in destinos[0].filters if all(f in h.filters for h in destinos)]
+        for destino in destinos:
+            destino.filters = [f for f in destino.filters if f not in comunes]
+        manejador.filters = registro.filters + comunes
+        registro.filters = []
+        registro.handlers = [manejador]
+        manejador.oyente.start()
+    # logging.shutdown() (atexit) cierra el ColaCore y vacía la cola
+    return manejador.oyente
+
+
+class ContextoSolicitud(logging.Filter):
+    """Agrega usuario_id y depurado (de la petición en curso) a cada registro"""
+
+    def filter(self, record):
+        record.usuario_id = _usuario_id.get()
+        record.depurado = _depurado.get()
+        return True
+
+
+class MuestreoPorNivel(logging.Filter):
+    """
+    Deja pasar una fracción de los registros de cada nivel según tasas
+    ({'DEBUG': 0.0, 'INFO': 0.5}); los niveles que no están pasan todos.
+    Los registros de un usuario en depuración pasan siempre.
+    """
+
+    def __init__(self, tasas=None):
+        super().__init__()
+        self.tasas = {logging.getLevelName(nivel): tasa for nivel, tasa in (tasas or {}).items()}
+
+    def filter(self, record):
+        if getattr(record, 'depurado', False):
+            return True
+        tasa = self.tasas.get(record.levelno, 1.0)
+        return tasa >= 1.0 or random.random() < tasa
+
+
+# -----------------------------------------------------
+# Depuración por usuario (sin reiniciar)
+# -----------------------------------------------------
+#
+# Los usuarios en depuración se guardan en la tabla UsuarioDepurado y cada
+# proceso los relee cada BITACORA_DEPURACION_REFRESCO segundos (una consulta
+# pequeña), así que activar o desactivar la depuración (comando
+# depurar_usuario, que corre en su propio proceso) llega a todos los
+# procesos del servidor sin reiniciar. No se usa el cache: con LocMem cada
+# proceso tiene el suyo y el cambio no saldría del comando.
+
+_depurados = {}
+_depurados_leidos = 0
+_depurados_lock = threading.Lock()
+
+
+def usuarios_depurados():
+    """{usuario_id: vence} vigentes, releídos de la base cada pocos segundos"""
+    # Import diferido: LOGGING carga este módulo antes que las apps
+    from .models import UsuarioDepurado
+
+    global _depurados, _depurados_leidos
+    ahora = time.time()
+    with _depurados_lock:
+        if ahora - _depurados_leidos >= settings.BITACORA_DEPURACION_REFRESCO:
+            _depurados = {
+                usuario_id: vence.timestamp()
+                for usuario_id, vence in UsuarioDepurado.objects.filter(
+                    Vence__gt=timezone.now()
+                ).values_list('idUsuario_id', 'Vence')
+            }
+            _depurados_leidos = ahora
+        return _depurados
+
+
+def _releer_depurados():
+    """El proceso que hizo el cambio lo ve en la próxima petición"""
+    global _depurados_leidos
+    with _depurados_lock:
+        _depurados_leidos = 0
+
+
+def activar_depuracion(usuario_id, minutos):
+    from .models import UsuarioDepurado
+
+    UsuarioDepurado.objects.filter(Vence__lte=timezone.now()).delete()
+    UsuarioDepurado.objects.update_or_create(
+        idUsuario_id=usuario_id, defaults={'Vence': timezone.now() + timedelta(minutes=minutos)}
+    )
+    _releer_depurados()
+
+
+def desactivar_depuracion(usuario_id):
+    from .models import UsuarioDepurado
+
+    UsuarioDepurado.objects.filter(idUsuario_id=usuario_id).delete()
+    _releer_depurados()
+
+
+class ContextoBitacoraMiddleware:
+    """
+    Fija el usuario de la sesión en el contexto de logging durante la
+    petición y activa el nivel DEBUG si ese usuario está en depuración.
+    Va después de SessionMiddleware. Admite vistas asíncronas: el contexto
+    vive en contextvars, que también ven los hilos de sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def _contexto(self, request):
+        """(usuario_id, depurado) de la sesión; puede consultar la base"""
+        usuario_id = request.session.get('usuario_id')
+        depurado = False
+        if usuario_id:
+            depurado = usuarios_depurados().get(usuario_id, 0) > time.time()
+        return usuario_id, depurado
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+
+        usuario_id, depurado = self._contexto(request)
+        token_usuario = _usuario_id.set(usuario_id)
+        token_depurado = _depurado.set(depurado)
+        try:
+            return self.get_response(request)
+        finally:
+            _usuario_id.reset(token_usuario)
+            _depurado.reset(token_depurado)
+
+    async def __acall__(self, request):
+        usuario_id, depurado = await sync_to_async(self._contexto)(request)
+        token_usuario = _usuario_id.set(usuario_id)
+        token_depurado = _depurado.set(depurado)
+        try:
+            return await self.get_response(request)
+        finally:
+            _usuario_id.reset(token_usuario)
+            _depurado.reset(token_depurado)
@@ -0,0 +1,272 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import F, Max, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Chat, Mensaje
+
+
+# -----------------------------------------------------
+# Búsqueda de texto completo en Chat.message y Mensaje.Contenido
+# -----------------------------------------------------
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Igual que innodb_ft_min_token_size por defecto en MySQL
+LONGITUD_MINIMA = 3
+
+# Tipos de mensaje que se buscan, con sus campos (id, remitente, destinatario)
+TIPOS = ('chat', 'mensaje')
+CAMPOS = {
+    'chat': ('id', 'sender_id', 'receiver_id'),
+    'mensaje': ('idMensaje', 'Remitente_id', 'Destinatario_id'),
+}
+
+
+def tokenizar(texto):
+    """Minúsculas, sin tildes y solo palabras de al menos LONGITUD_MINIMA letras"""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [token for token in TOKEN_RE.findall(texto) if len(token) >= LONGITUD_MINIMA]
+
+
+def ordenar_por_puntaje(fuentes, usuario_id, limite):
+    """
+    Une los resultados de {tipo: queryset anotado con puntaje}, limitados a
+    los mensajes del usuario (si se indica), en orden de relevancia.
+    """
+    resultados = []
+    for tipo, queryset in fuentes.items():
+        campo_id, remitente, destinatario = CAMPOS[tipo]
+        if usuario_id is not None:
+            queryset = queryset.filter(Q(**{remitente: usuario_id}) | Q(**{destinatario: usuario_id}))
+        resultados += [
+            (tipo, id_, puntaje)
+            for id_, puntaje in queryset.order_by('-puntaje').values_list(campo_id, 'puntaje')[:limite]
+        ]
+    resultados.sort(key=lambda r: r[2], reverse=True)
+    return resultados[:limite]
+
+
+class BusquedaMySQL:
+    """
+    Usa los índices FULLTEXT de MySQL (migración 0009) con MATCH ... AGAINST.
+    Cada consulta se limita a los mensajes donde participa el usuario.
+    """
+
+    def buscar(self, usuario_id, consulta, limite, tipos=TIPOS):
+        fuentes = {}
+        if 'chat' in tipos:
+            fuentes['chat'] = Chat.objects.annotate(
+                puntaje=RawSQL('MATCH (`Chat`.`message`) AGAINST (%s IN NATURAL LANGUAGE MODE)', (consulta,))
+            ).filter(puntaje__gt=0)
+        if 'mensaje' in tipos:
+            fuentes['mensaje'] = Mensaje.objects.annotate(
+                puntaje=RawSQL('MATCH (`Mensaje`.`Contenido`) AGAINST (%s IN NATURAL LANGUAGE MODE)', (consulta,))
+            ).filter(puntaje__gt=0)
+        return ordenar_por_puntaje(fuentes, usuario_id, limite)
+
+    # MySQL mantiene los índices FULLTEXT por sí mismo
+    def actualizar(self, tipo, id_, participantes, texto):
+        pass
+
+    def eliminar(self, tipo, id_):
+        pass
+
+
+class BusquedaPostgres:
+    """
+    Usa to_tsvector/plainto_tsquery de PostgreSQL con los índices GIN de la
+    migración 0016 (la expresión debe coincidir con la de SearchVector).
+    Cada consulta se limita a los mensajes donde participa el usuario.
+    """
+    CONFIGURACION = 'spanish'
+
+    def _ranking(self, queryset, campo, consulta):
+        vector = SearchVector(campo, config=self.CONFIGURACION)
+        busqueda = SearchQuery(consulta, config=self.CONFIGURACION)
+        return queryset.annotate(
+            documento=vector,
+            puntaje=SearchRank(F('documento'), busqueda),
+        ).filter(documento=busqueda)
+
+    def buscar(self, usuario_id, consulta, limite, tipos=TIPOS):
+        fuentes = {}
+        if 'chat' in tipos:
+            fuentes['chat'] = self._ranking(Chat.objects.all(), 'message', consulta)
+        if 'mensaje' in tipos:
+            fuentes['mensaje'] = self._ranking(Mensaje.objects.all(), 'Contenido', consulta)
+        return ordenar_por_puntaje(fuentes, usuario_id, limite)
+
+    # PostgreSQL mantiene los índices GIN por sí mismo
+    def actualizar(self, tipo, id_, participantes, texto):
+        pass
+
+    def eliminar(self, tipo, id_):
+        pass
+
+
+class BusquedaEnMemoria:
+    """
+    Índice invertido en Python para SQLite (desarrollo y pruebas); carga en
+    memoria todos los mensajes, así que no se usa con MySQL ni PostgreSQL.
+    Se carga la primera vez que se busca y en cada búsqueda incorpora solo
+    las filas con id mayor al último indexado, así que también ve los
+    mensajes creados con bulk_create o por otros procesos.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)   # token -> {(tipo, id): frecuencia}
+        self._documentos = {}                # (tipo, id) -> (participantes, tokens)
+        self._ultimo_id = {'chat': 0, 'mensaje': 0}
+
+    def _fuentes(self, tipos):
+        fuentes = {
+            'chat': Chat.objects.values_list('id', 'sender_id', 'receiver_id', 'message'),
+            'mensaje': Mensaje.objects.values_list('idMensaje', 'Remitente_id', 'Destinatario_id', 'Contenido'),
+        }
+        return [(tipo, fuentes[tipo]) for tipo in tipos]
+
+    def _sincronizar(self, tipos):
+        """Indexa las filas nuevas de esos tipos desde la última búsqueda"""
+        for tipo, filas in self._fuentes(tipos):
+            campo_id = CAMPOS[tipo][0]
+            maximo = filas.aggregate(maximo=Max(campo_id))['maximo'] or 0
+            if maximo < self._ultimo_id[tipo]:
+                # La tabla se vació (p. ej. entre pruebas): reconstruir este tipo
+                for clave in [c for c in self._documentos if c[0] == tipo]:
+                    self._quitar(clave)
+                self._ultimo_id[tipo] = 0
+            if maximo == self._ultimo_id[tipo]:
+                continue
+            nuevas = filas.filter(**{f'{campo_id}__gt': self._ultimo_id[tipo]}).order_by(campo_id)
+            for id_, remitente, destinatario, texto in nuevas.iterator(chunk_size=2000):
+                self._indexar((tipo, id_), (remitente, destinatario), texto)
+                self._ultimo_id[tipo] = id_
+
+    def _indexar(self, clave, participantes, texto):
+        self._quitar(clave)
+        frecuencias = defaultdict(int)
+        for token in tokenizar(texto):
+            frecuencias[token] += 1
+        for token, frecuencia in frecuencias.items():
+            self._postings[token][clave] = frecuencia
+        self._documentos[clave] = (participantes, tuple(frecuencias))
+
+    def _quitar(self, clave):
+        documento = self._documentos.pop(clave, None)
+        if documento is None:
+            return
+        for token in documento[1]:
+            self._postings[token].pop(clave, None)
+            if not self._postings[token]:
+                del self._postings[token]
+
+    def actualizar(self, tipo, id_, participantes, texto):
+        """Reindexa un mensaje editado (solo si ya estaba indexado)"""
+        with self._lock:
+            if (tipo, id_) in self._documentos:
+                self._indexar((tipo, id_), participantes, texto)
+
+    def eliminar(self, tipo, id_):
+        with self._lock:
+            self._quitar((tipo, id_))
+
+    def buscar(self, usuario_id, consulta, limite, tipos=TIPOS):
+        tokens = set(tokenizar(consulta))
+        if not tokens:
+            return []
+
+        with self._lock:
+            self._sincronizar(tipos)
+
+            listas = [self._postings.get(token, {}) for token in tokens]
+            if not all(listas):
+                return []
+
+            # Todas las palabras deben aparecer; se parte de la lista más corta
+            listas.sort(key=len)
+            candidatos = set(listas[0])
+            for lista in listas[1:]:
+                candidatos.intersection_update(lista)
+
+            total = len(self._documentos)
+            resultados = []
+            for clave in candidatos:
+                if clave[0] not in tipos:
+                    continue
+                if usuario_id is not None and usuario_id not in self._documentos[clave][0]:
+                    continue
+                puntaje = sum(
+                    lista[clave] * math.log(1 + total / len(lista))
+                    for lista in listas
+                )
+                resultados.append((clave[0], clave[1], puntaje))
+
+        resultados.sort(key=lambda r: (r[2], r[1]), reverse=True)
+        return resultados[:limite]
+
+
+MOTORES = {
+    'mysql': BusquedaMySQL,
+    'postgresql': BusquedaPostgres,
+    'sqlite': BusquedaEnMemoria,
+}
+
+_motor = None
+_motor_lock = threading.Lock()
+
+
+def motor_busqueda():
+    """Motor de búsqueda según la base de datos configurada"""
+    global _motor
+    with _motor_lock:
+        if _motor is None:
+            if connection.vendor not in MOTORES:
+                raise ImproperlyConfigured(
+                    f'La búsqueda de mensajes no soporta la base de datos {connection.vendor}'
+                )
+            _motor = MOTORES[connection.vendor]()
+        return _motor
+
+
+def buscar_mensajes_usuario(usuario_id, consulta, pagina=1, por_pagina=20):
+    """
+    Busca en el chat y en los mensajes del usuario. Retorna (resultados, hay_mas)
+    con los resultados de la página ordenados por relevancia.
+    """
+    limite = pagina * por_pagina + 1
+    ranking = motor_busqueda().buscar(usuario_id, consulta, limite)
+    hay_mas = len(ranking) > pagina * por_pagina
+    ranking = ranking[(pagina - 1) * por_pagina:pagina * por_pagina]
+
+    ids_chat = [id_ for tipo, id_, _ in ranking if tipo == 'chat']
+    ids_mensaje = [id_ for tipo, id_, _ in ranking if tipo == 'mensaje']
+    chats = Chat.objects.select_related('sender', 'receiver').in_bulk(ids_chat)
+    mensajes = Mensaje.objects.select_related('Remitente', 'Destinatario').in_bulk(ids_mensaje)
+
+    resultados = []
+    for tipo, id_, puntaje in ranking:
+        if tipo == 'chat' and id_ in chats:
+            chat = chats[id_]
+            contraparte = chat.receiver if chat.sender_id == usuario_id else chat.sender
+            resultados.append({
+                'tipo': 'chat', 'id': id_, 'texto': chat.message,
+                'fecha': chat.timestamp, 'contraparte': contraparte, 'puntaje': puntaje,
+            })
+        elif tipo == 'mensaje' and id_ in mensajes:
+            mensaje = mensajes[id_]
+            contraparte = mensaje.Destinatario if mensaje.Remitente_id == usuario_id else mensaje.Remitente
+            resultados.append({
+                'tipo': 'mensaje', 'id': id_, 'texto': mensaje.Contenido,
+                'fecha': mensaje.Fecha_hora, 'contraparte': contraparte, 'puntaje': puntaje,
+            })
+    return resultados, hay_mas
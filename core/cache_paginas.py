@@ -0,0 +1,67 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache_versiones import version_actual
+
+
+# -----------------------------------------------------
+# Caché de páginas completas para visitantes anónimos
+# -----------------------------------------------------
+#
+# Guarda el HTML ya renderizado en el cache PAGINAS_CACHE_ALIAS (local a
+# cada proceso) durante PAGINAS_CACHE_TIMEOUT segundos, con un ETag fuerte
+# calculado del contenido. Las peticiones condicionales reciben 304 si la
+# página no cambió. Con usuario_id en la sesión la vista se ejecuta normal,
+# porque la página depende del usuario.
+
+
+def cache_pagina_anonima(*espacios):
+    """
+    Decorador de vistas GET. espacios son espacios de cache_versiones cuyos
+    cambios deben invalidar la página (p. ej. el catálogo en el index).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or request.GET
+                    or request.session.get('usuario_id')):
+                return vista(request, *args, **kwargs)
+
+            cache = caches[settings.PAGINAS_CACHE_ALIAS]
+            versiones = ':'.join(str(version_actual(espacio)) for espacio in espacios)
+            clave = f'pagina:{request.path}:{versiones}'
+
+            pagina = cache.get(clave)
+            if pagina is None:
+                response = vista(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                pagina = {
+                    'contenido': response.content,
+                    'content_type': response['Content-Type'],
+                    'etag': '"%s"' % hashlib.sha256(response.content).hexdigest(),
+                    'modificada': int(time.time()),
+                }
+                cache.set(clave, pagina, settings.PAGINAS_CACHE_TIMEOUT)
+
+            response = get_conditional_response(
+                request, etag=pagina['etag'], last_modified=pagina['modificada']
+            )
+            if response is None:
+                response = HttpResponse(pagina['contenido'], content_type=pagina['content_type'])
+            response['ETag'] = pagina['etag']
+            response['Last-Modified'] = http_date(pagina['modificada'])
+            # El navegador revalida siempre: tras iniciar sesión no debe
+            # reutilizar la versión anónima
+            patch_cache_control(response, max_age=0, must_revalidate=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return envoltura
+    return decorador
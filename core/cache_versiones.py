@@ -0,0 +1,48 @@
+import time
+
+from django.core.cache import cache
+
+
+# -----------------------------------------------------
+# Versiones de cache por espacio (invalidación sin borrar claves)
+# -----------------------------------------------------
+#
+# Cada espacio (un panel, el catálogo, un curso) tiene una versión guardada
+# en el cache. Los datos se guardan bajo claves que incluyen la versión;
+# renovarla hace que las lecturas siguientes usen claves nuevas y las
+# anteriores simplemente vencen por TTL. Así una lectura que empezó antes
+# de un cambio nunca puede dejar datos viejos bajo la clave vigente.
+
+
+def clave_version(espacio):
+    return f'version:{espacio}'
+
+
+def version_existente(espacio):
+    """Versión vigente del espacio, o None si todavía no tiene"""
+    return cache.get(clave_version(espacio))
+
+
+def crear_version(espacio):
+    """
+    Crea la versión del espacio y la retorna; None si otro proceso la creó
+    o la renovó antes (add() no pisa una versión existente).
+    """
+    version = time.time_ns()
+    return version if cache.add(clave_version(espacio), version, None) else None
+
+
+def version_actual(espacio):
+    """Versión vigente del espacio; se crea si no existe"""
+    version = version_existente(espacio)
+    if version is None:
+        version = crear_version(espacio) or version_existente(espacio) or time.time_ns()
+    return version
+
+
+def renovar_versiones(espacios):
+    """Renueva la versión de varios espacios en una sola escritura"""
+    espacios = set(espacios)
+    if espacios:
+        version = time.time_ns()
+        cache.set_many({clave_version(espacio): version for espacio in espacios}, None)
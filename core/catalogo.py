@@ -0,0 +1,88 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_versiones import crear_version, renovar_versiones, version_actual, version_existente
+from .models import Curso, Clase, ContenidoEducativo, Evaluacion
+
+
+# -----------------------------------------------------
+# Catálogo público de cursos (página de cursos)
+# -----------------------------------------------------
+#
+# El catálogo agrupado por idioma se guarda en el cache bajo la versión del
+# espacio 'catalogo'; las señales (signals.py) la renuevan al guardar o
+# eliminar un Curso o una Clase (el catálogo muestra el total de clases).
+
+ESPACIO_CATALOGO = 'catalogo'
+
+
+def construir_catalogo():
+    """{idioma: [cursos activos]} en orden de idioma y nivel"""
+    cursos = Curso.objects.filter(Estado='activo').with_stats().order_by('Idioma', 'Nombre', 'Nivel_mcerl')
+    return {idioma: list(grupo) for idioma, grupo in groupby(cursos, key=lambda curso: curso.Idioma)}
+
+
+def catalogo_por_idioma():
+    """Catálogo agrupado desde el cache; solo consulta la base al reconstruirlo"""
+    clave = f'catalogo:{version_actual(ESPACIO_CATALOGO)}'
+    return cache.get_or_set(clave, construir_catalogo, settings.CATALOGO_CACHE_TIMEOUT)
+
+
+def invalidar_catalogo():
+    renovar_versiones([ESPACIO_CATALOGO])
+
+
+# -----------------------------------------------------
+# Detalle de cada curso
+# -----------------------------------------------------
+#
+# La parte común a todos los visitantes (curso, clases, contenidos y
+# evaluaciones) se guarda como un solo paquete por curso, bajo la versión
+# del espacio 'curso:<id>' que las señales renuevan al cambiar cualquiera
+# de esos modelos. Lo propio de cada usuario se calcula en la vista.
+
+def espacio_curso(curso_id):
+    return f'curso:{curso_id}'
+
+
+def construir_detalle(curso_id):
+    """Paquete del curso con sus listas ya evaluadas, o None si no existe"""
+    curso = Curso.objects.filter(idCurso=curso_id).first()
+    if curso is None:
+        return None
+    return {
+        'curso': curso,
+        'clases': list(Clase.objects.filter(idCurso_id=curso_id).order_by('Fecha_hora')),
+        'contenidos': list(ContenidoEducativo.objects.filter(idCurso_id=curso_id)),
+        'evaluaciones': list(Evaluacion.objects.filter(idCurso_id=curso_id)),
+    }
+
+
+def detalle_de_curso(curso_id):
+    """
+    Paquete del curso desde el cache (None si el curso no existe). Los ids
+    inexistentes no se guardan ni crean versión, así que no ocupan el cache.
+    """
+    espacio = espacio_curso(curso_id)
+    version = version_existente(espacio)
+    if version is not None:
+        detalle = cache.get(f'curso:{curso_id}:{version}:detalle')
+        if detalle is not None:
+            return detalle
+
+    detalle = construir_detalle(curso_id)
+    if detalle is None:
+        return None
+    if version is None:
+        version = crear_version(espacio)
+        if version is None:
+            # Se creó o renovó la versión mientras se leía: no guardar datos quizá viejos
+            return detalle
+    cache.set(f'curso:{curso_id}:{version}:detalle', detalle, settings.CATALOGO_CACHE_TIMEOUT)
+    return detalle
+
+
+def invalidar_detalle_cursos(curso_ids):
+    renovar_versiones(espacio_curso(curso_id) for curso_id in curso_ids)
@@ -0,0 +1,103 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+
+from .models import Usuario, Chat
+from .notifier import grupo_conversacion, marcar_leidos, difundir_escribiendo
+from .presencia import presencia
+from .sesion import sesion_valida
+
+
+class ChatConsumer(JsonWebsocketConsumer):
+    """
+    Chat en tiempo real por WebSocket entre el usuario en sesión y otro usuario.
+
+    Mensajes del cliente:
+        {"type": "message", "message": "texto"}  -> guarda un Chat
+        {"type": "read"}                         -> marca como leídos los recibidos
+        {"type": "typing"}                       -> el usuario está escribiendo
+        {"type": "ping"}                         -> latido de presencia
+
+    Eventos enviados al cliente:
+        {"type": "message", "message": {...}}    -> mensaje guardado en la conversación
+        {"type": "read", "reader_id": id}        -> confirmación de lectura
+        {"type": "typing", "user_id": id}        -> el otro usuario está escribiendo
+    """
+
+    def connect(self):
+        # Misma autenticación por sesión que verificar_sesion
+        session = self.scope.get('session')
+        if session is None or not sesion_valida(session):
+            self.close()
+            return
+
+        self.usuario_id = session['usuario_id']
+        self.otro_id = self.scope['url_route']['kwargs']['user_id']
+
+        # No se puede chatear con administradores
+        if not Usuario.objects.filter(idUsuario=self.otro_id).exclude(Rol='admin').exists():
+            self.close()
+            return
+
+        self.grupo = grupo_conversacion(self.usuario_id, self.otro_id)
+        async_to_sync(self.channel_layer.group_add)(self.grupo, self.channel_name)
+        self.accept()
+
+        presencia().latido(self.usuario_id)
+        marcar_leidos(self.usuario_id, self.otro_id)
+
+    def disconnect(self, code):
+        if hasattr(self, 'grupo'):
+            async_to_sync(self.channel_layer.group_discard)(self.grupo, self.channel_name)
+
+    def receive_json(self, content, **kwargs):
+        tipo = content.get('type')
+        # Cualquier actividad en el socket cuenta como latido (se agrupan en presencia)
+        presencia().latido(self.usuario_id)
+
+        if tipo == 'message':
+            message_text = str(content.get('message', '')).strip()
+            if not message_text:
+                self.send_json({'type': 'error', 'error': 'Mensaje vacío'})
+                return
+            # La señal post_save difunde el mensaje a ambos participantes
+            Chat.objects.create(
+                sender_id=self.usuario_id,
+                receiver_id=self.otro_id,
+                message=message_text
+            )
+        elif tipo == 'read':
+            marcar_leidos(self.usuario_id, self.otro_id)
+        elif tipo == 'typing':
+            presencia().escribiendo(self.usuario_id, self.otro_id)
+            difundir_escribiendo(self.usuario_id, self.otro_id)
+        elif tipo == 'ping':
+            pass
+        else:
+            self.send_json({'type': 'error', 'error': 'Tipo de mensaje no soportado'})
+
+    # Handlers de eventos del channel layer
+
+    def chat_message(self, event):
+        self.send_json({
+            'type': 'message',
+            'message': {
+                'id': event['id'],
+                'text': event['text'],
+                'timestamp': event['timestamp'],
+                'is_mine': event['sender_id'] == self.usuario_id,
+            }
+        })
+
+    def chat_read(self, event):
+        self.send_json({
+            'type': 'read',
+            'reader_id': event['reader_id'],
+        })
+
+    def chat_typing(self, event):
+        # Solo le interesa al otro participante
+        if event['user_id'] != self.usuario_id:
+            self.send_json({
+                'type': 'typing',
+                'user_id': event['user_id'],
+            })
@@ -0,0 +1,61 @@
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import Greatest, Least
+
+
+# -----------------------------------------------------
+# Resúmenes de conversación calculados desde el historial de Chat
+# -----------------------------------------------------
+#
+# Lo usan el comando reconstruir_conversaciones y la migración
+# 0015_poblar_conversaciones. Recibe los modelos como parámetros para que
+# la migración pueda pasar sus modelos históricos (apps.get_model).
+
+
+def poblar_conversaciones(Chat, Conversation, lote=1000, existentes=frozenset()):
+    """
+    Crea una Conversation por pareja con su último mensaje y los no leídos
+    de cada participante, en lotes de `lote` filas. Omite las parejas
+    (user_a, user_b) de `existentes`. Retorna cuántas creó.
+    """
+    resumen = Chat.objects.annotate(
+        par_a=Least('sender', 'receiver'),
+        par_b=Greatest('sender', 'receiver'),
+    ).values('par_a', 'par_b').annotate(
+        ultimo_id=Max('id'),
+        no_leidos_a=Count('id', filter=Q(is_read=False, receiver=F('par_a'))),
+        no_leidos_b=Count('id', filter=Q(is_read=False, receiver=F('par_b'))),
+    ).order_by('par_a', 'par_b')
+
+    total = 0
+    filas = []
+    for fila in resumen.iterator(chunk_size=lote):
+        if (fila['par_a'], fila['par_b']) in existentes:
+            continue
+        filas.append(fila)
+        if len(filas) >= lote:
+            total += _insertar_lote(Chat, Conversation, filas)
+            filas = []
+    if filas:
+        total += _insertar_lote(Chat, Conversation, filas)
+    return total
+
+
+def _insertar_lote(Chat, Conversation, filas):
+    """Inserta un lote de conversaciones con sus fechas de último mensaje"""
+    fechas = dict(
+        Chat.objects.filter(
+            id__in=[fila['ultimo_id'] for fila in filas]
+        ).values_list('id', 'timestamp')
+    )
+    Conversation.objects.bulk_create([
+        Conversation(
+            user_a_id=fila['par_a'],
+            user_b_id=fila['par_b'],
+            last_message_id=fila['ultimo_id'],
+            last_timestamp=fechas[fila['ultimo_id']],
+            unread_a=fila['no_leidos_a'],
+            unread_b=fila['no_leidos_b'],
+        )
+        for fila in filas
+    ], ignore_conflicts=True)
+    return len(filas)
@@ -0,0 +1,123 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Usuario, Chat, Conversation
+from core.views import conversaciones_activas, mensajes_conversacion
+
+
+class Command(BaseCommand):
+    """
+    Ejecuta EXPLAIN sobre las consultas de las vistas del chat y reporta
+    si usan un índice o recorren la tabla completa.
+    Uso: python manage.py auditar_consultas_chat [--seed 5000] [--strict]
+    """
+    help = 'Audita con EXPLAIN las consultas del chat para detectar escaneos completos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insertar N mensajes de prueba (se revierten al terminar)'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Terminar con error si alguna consulta hace un escaneo completo'
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+
+        with transaction.atomic():
+            if options['seed']:
+                self._sembrar(options['seed'])
+
+            escaneos = self._auditar()
+
+            # Nunca conservar los datos sembrados
+            transaction.set_rollback(True)
+
+        if escaneos and options['strict']:
+            raise CommandError(f'{len(escaneos)} consulta(s) con escaneo completo: {", ".join(escaneos)}')
+
+    def _sembrar(self, total_mensajes):
+        """Crea usuarios y mensajes de prueba para que el plan sea realista"""
+        total_usuarios = max(2, total_mensajes // 50)
+        inicio = Usuario.objects.count()
+        Usuario.objects.bulk_create([
+            Usuario(
+                Nombres=f'Auditoria{inicio + i}',
+                Apellidos='Chat',
+                Correo=f'auditoria{inicio + i}@chat.local',
+                Rol='profesor' if i % 10 == 0 else 'estudiante',
+            )
+            for i in range(total_usuarios)
+        ], batch_size=1000)
+        ids = list(
+            Usuario.objects.filter(Apellidos='Chat', Correo__endswith='@chat.local')
+            .values_list('idUsuario', flat=True)
+        )
+        Chat.objects.bulk_create([
+            Chat(
+                sender_id=ids[i % len(ids)],
+                receiver_id=ids[(i * 7 + 1) % len(ids)],
+                message=f'Mensaje de auditoría {i}',
+                is_read=i % 3 != 0,
+            )
+            for i in range(total_mensajes)
+        ], batch_size=1000)
+        self.stdout.write(f'Sembrados {total_usuarios} usuarios y {total_mensajes} mensajes')
+
+    def _consultas(self):
+        """Consultas equivalentes a las que ejecuta cada vista del chat"""
+        par = Chat.objects.values_list('sender_id', 'receiver_id').first() or (1, 2)
+        usuario_id, otro_id = par
+        user_a, user_b = Conversation.pareja(usuario_id, otro_id)
+        conversacion = Conversation.objects.filter(user_a_id=user_a, user_b_id=user_b)
+
+        return [
+            ('chat_list: conversaciones', conversaciones_activas(usuario_id)[:20]),
+            ('chat_list: total no leídos', Conversation.de_usuario(usuario_id)),
+            ('chat_room: historial reciente',
+             mensajes_conversacion(usuario_id, otro_id).select_related('sender').order_by('-timestamp', '-id')[:51]),
+            ('chat_room: marcar leídos (resumen)', conversacion.filter(unread_a__gt=0)),
+            ('chat_room: marcar leídos (mensajes)',
+             Chat.objects.filter(sender_id=otro_id, receiver_id=usuario_id, is_read=False)),
+            ('send_message: conversación de la pareja', conversacion),
+            ('get_messages: mensajes nuevos',
+             mensajes_conversacion(usuario_id, otro_id).filter(id__gt=0).order_by('timestamp')),
+        ]
+
+    def _auditar(self):
+        """Imprime el resultado de cada consulta y retorna las que hacen escaneo completo"""
+        escaneos = []
+        for nombre, queryset in self._consultas():
+            plan = self._explain(queryset)
+            if self._escaneo_completo(plan):
+                escaneos.append(nombre)
+                self.stdout.write(self.style.ERROR(f'❌ {nombre}: ESCANEO COMPLETO'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ {nombre}: usa índice'))
+            if self.verbosity > 1:
+                self.stdout.write(plan)
+        return escaneos
+
+    def _explain(self, queryset):
+        if connection.vendor == 'mysql':
+            return queryset.explain(format='json')
+        return queryset.explain()
+
+    def _escaneo_completo(self, plan):
+        """Detecta un recorrido completo de tabla según el motor de base de datos"""
+        if connection.vendor == 'mysql':
+            return re.search(r'"access_type":\s*"ALL"', plan) is not None
+        if connection.vendor == 'postgresql':
+            return 'Seq Scan' in plan
+        # SQLite: "SCAN tabla" sin "USING INDEX" recorre toda la tabla
+        return any(
+            re.search(r'\bSCAN \w+$', linea.strip())
+            for linea in plan.splitlines()
+        )
@@ -0,0 +1,123 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers, make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+
+from core.models import Usuario
+from core.sesion import autenticar_usuario
+
+
+class Command(BaseCommand):
+    """
+    Mide el camino de inicio de sesión (autenticar_usuario: una consulta y
+    la verificación de la contraseña) con cada algoritmo de PASSWORD_HASHERS.
+    Reporta inicios de sesión por segundo y latencias p50/p99 para
+    dimensionar los workers. Con --hilos simula peticiones simultáneas en
+    un mismo proceso. Crea un usuario temporal por algoritmo y lo elimina
+    al terminar. Ejemplo:
+        python manage.py benchmark_login --logins 300 --hilos 4
+    """
+    help = 'Mide inicios de sesión por segundo y latencia p99 con cada algoritmo de contraseñas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--logins',
+            type=int,
+            default=200,
+            help='Inicios de sesión por algoritmo (por defecto 200)'
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=1,
+            help='Inicios de sesión simultáneos (por defecto 1)'
+        )
+        parser.add_argument(
+            '--algoritmo',
+            action='append',
+            help='Medir solo este algoritmo (p. ej. pbkdf2_sha256); se puede repetir'
+        )
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1 or options['hilos'] < 1:
+            raise CommandError('--logins y --hilos deben ser mayores que 0')
+
+        hashers = get_hashers()
+        if options['algoritmo']:
+            hashers = [hasher for hasher in hashers if hasher.algorithm in options['algoritmo']]
+            if not hashers:
+                raise CommandError('Ningún algoritmo de PASSWORD_HASHERS coincide')
+
+        self.stdout.write(
+            f"⏱️  {options['logins']} inicios de sesión por algoritmo, {options['hilos']} hilo(s)"
+        )
+        for hasher in hashers:
+            try:
+                # Falla si falta la librería opcional (argon2-cffi, bcrypt)
+                if hasher.library:
+                    hasher._load_library()
+            except ValueError as e:
+                self.stdout.write(self.style.WARNING(f'⚠️  {hasher.algorithm}: omitido ({e})'))
+                continue
+            self._medir(hasher, options['logins'], options['hilos'])
+
+    def _medir(self, hasher, logins, hilos):
+        # El algoritmo medido va primero para que check_password no lo actualice
+        ruta = f'{type(hasher).__module__}.{type(hasher).__name__}'
+        preferidos = [ruta] + [h for h in settings.PASSWORD_HASHERS if h != ruta]
+        with override_settings(PASSWORD_HASHERS=preferidos):
+            correo = f'benchmark-{uuid.uuid4().hex[:12]}@benchmark.invalid'
+            contrasena = uuid.uuid4().hex
+            user = User.objects.create(
+                username=correo, email=correo, password=make_password(contrasena, hasher=hasher.algorithm)
+            )
+            Usuario.objects.create(
+                user=user, Nombres='Benchmark', Apellidos='Login', Correo=correo, Rol='estudiante'
+            )
+            try:
+                latencias, duracion = self._ejecutar(correo, contrasena, logins, hilos)
+            finally:
+                # Elimina también el Usuario (CASCADE)
+                user.delete()
+
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        self.stdout.write(
+            f'🔐 {hasher.algorithm:<22} {logins / duracion:8.1f} logins/s   '
+            f'p50 {statistics.median(latencias) * 1000:7.1f} ms   p99 {p99 * 1000:7.1f} ms'
+        )
+
+    def _ejecutar(self, correo, contrasena, logins, hilos):
+        """Retorna (latencias en segundos, duración total)"""
+        def serie(cantidad):
+            latencias = []
+            for _ in range(cantidad):
+                inicio = time.perf_counter()
+                _, error = autenticar_usuario(correo, contrasena)
+                if error:
+                    raise CommandError(f'El inicio de sesión de prueba falló: {error}')
+                latencias.append(time.perf_counter() - inicio)
+            return latencias
+
+        def serie_en_hilo(cantidad):
+            # Cada hilo usa su propia conexión y la cierra al terminar
+            try:
+                return serie(cantidad)
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        if hilos == 1:
+            latencias = serie(logins)
+        else:
+            cantidades = [logins // hilos + (i < logins % hilos) for i in range(hilos)]
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                latencias = [t for parte in ejecutor.map(serie_en_hilo, cantidades) for t in parte]
+        return latencias, time.perf_counter() - inicio
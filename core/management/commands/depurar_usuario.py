@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bitacora import activar_depuracion, desactivar_depuracion
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    """
+    Activa (o desactiva) los registros DEBUG de core solo para las
+    peticiones de un usuario, sin reiniciar el servidor. Los procesos lo
+    toman en unos segundos (BITACORA_DEPURACION_REFRESCO). Ejemplos:
+        python manage.py depurar_usuario 42 --minutos 15
+        python manage.py depurar_usuario 42 --desactivar
+    """
+    help = 'Activa o desactiva los registros DEBUG de core para un usuario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario_id', type=int)
+        parser.add_argument('--minutos', type=int, default=30,
+                            help='Minutos que dura la depuración (por defecto 30)')
+        parser.add_argument('--desactivar', action='store_true',
+                            help='Desactiva la depuración del usuario')
+
+    def handle(self, *args, **options):
+        usuario_id = options['usuario_id']
+        if not Usuario.objects.filter(idUsuario=usuario_id).exists():
+            raise CommandError(f'No existe el usuario {usuario_id}')
+
+        if options['desactivar']:
+            desactivar_depuracion(usuario_id)
+            self.stdout.write(self.style.SUCCESS(f'✅ Depuración desactivada para el usuario {usuario_id}'))
+        else:
+            activar_depuracion(usuario_id, options['minutos'])
+            self.stdout.write(self.style.SUCCESS(
+                f"🔍 Depuración activada para el usuario {usuario_id} durante {options['minutos']} minutos"
+            ))
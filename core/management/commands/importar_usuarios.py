@@ -0,0 +1,195 @@
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Usuario, Estadistica
+from core.paneles import PANEL_ADMIN, invalidar_paneles
+
+
+def _iniciar_proceso():
+    """Los procesos hijos creados con spawn (Windows/macOS) deben configurar Django"""
+    django.setup()
+
+
+class Command(BaseCommand):
+    """
+    Alta masiva de usuarios desde un archivo CSV o NDJSON (una fila/objeto
+    por usuario) con los campos nombres, apellidos, correo, contrasena y,
+    opcionalmente, rol. Las contraseñas se cifran en paralelo en varios
+    procesos y cada lote se inserta con bulk_create (User y luego Usuario)
+    en su propia transacción, sin las señales por fila; al final el email
+    de auth_user se sincroniza con un solo UPDATE. Ejemplos:
+        python manage.py importar_usuarios estudiantes.csv
+        python manage.py importar_usuarios estudiantes.ndjson --lote 2000 --procesos 8
+    """
+    help = 'Crea usuarios (User + Usuario) en bloque desde un archivo CSV o NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .ndjson')
+        parser.add_argument(
+            '--formato',
+            choices=['csv', 'ndjson'],
+            help='Formato del archivo (por defecto según la extensión)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Usuarios por transacción (por defecto 1000)'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos para cifrar contraseñas (por defecto uno por CPU)'
+        )
+        parser.add_argument(
+            '--rol',
+            default='estudiante',
+            choices=[rol for rol, _ in Usuario.ROLES],
+            help='Rol de las filas que no indican uno (por defecto estudiante)'
+        )
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.exists():
+            raise CommandError(f'No existe el archivo {ruta}')
+        formato = options['formato'] or ('ndjson' if ruta.suffix in ('.ndjson', '.jsonl') else 'csv')
+        self.rol_por_defecto = options['rol']
+        self.roles = {rol for rol, _ in Usuario.ROLES}
+
+        inicio = time.perf_counter()
+        self.tiempo_cifrado = 0.0
+        creados, omitidos, usuario_ids = 0, 0, []
+
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=_iniciar_proceso) as procesos:
+            self.procesos = procesos
+            self.num_procesos = options['procesos']
+            lote = []
+            for numero, fila in self._leer(ruta, formato):
+                lote.append((numero, fila))
+                if len(lote) >= options['lote']:
+                    ids, n_omitidos = self._importar_lote(lote)
+                    usuario_ids += ids
+                    creados += len(ids)
+                    omitidos += n_omitidos
+                    lote = []
+            if lote:
+                ids, n_omitidos = self._importar_lote(lote)
+                usuario_ids += ids
+                creados += len(ids)
+                omitidos += n_omitidos
+
+        # Lo que hacía la señal sincronizar_email por fila, en un UPDATE
+        sincronizados = Usuario.sincronizar_emails(usuario_ids) if usuario_ids else 0
+
+        duracion = time.perf_counter() - inicio
+        filas = creados + omitidos
+        self.stdout.write(f'🔐 Cifrado de contraseñas: {self.tiempo_cifrado:.2f} s en {self.num_procesos} procesos')
+        self.stdout.write(f'📧 Emails sincronizados: {sincronizados}')
+        if omitidos:
+            self.stdout.write(self.style.WARNING(f'⚠️  {omitidos} filas omitidas'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {creados} usuarios creados en {duracion:.2f} s '
+            f'({filas / duracion if duracion else 0:.0f} filas/s)'
+        ))
+
+    def _leer(self, ruta, formato):
+        """Genera (número de fila, dict) del archivo"""
+        with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+            if formato == 'csv':
+                for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+                    yield numero, fila
+            else:
+                for numero, linea in enumerate(archivo, start=1):
+                    if not linea.strip():
+                        continue
+                    try:
+                        yield numero, json.loads(linea)
+                    except json.JSONDecodeError:
+                        self.stdout.write(self.style.WARNING(f'⚠️  Fila {numero}: JSON inválido'))
+                        yield numero, {}
+
+    def _validar(self, numero, fila, vistos):
+        """Retorna la fila normalizada o None (y avisa) si no se puede importar"""
+        datos = {
+            campo: str(fila.get(campo) or '').strip()
+            for campo in ('nombres', 'apellidos', 'correo', 'contrasena', 'rol')
+        }
+        datos['rol'] = datos['rol'] or self.rol_por_defecto
+        error = None
+        if not all(datos[campo] for campo in ('nombres', 'apellidos', 'correo', 'contrasena')):
+            error = 'faltan campos obligatorios'
+        elif len(datos['contrasena']) < 6:
+            error = 'la contraseña debe tener al menos 6 caracteres'
+        elif datos['rol'] not in self.roles:
+            error = f"rol inválido '{datos['rol']}'"
+        elif datos['correo'] in vistos:
+            error = f"correo repetido {datos['correo']}"
+        if error:
+            self.stdout.write(self.style.WARNING(f'⚠️  Fila {numero}: {error}'))
+            return None
+        vistos.add(datos['correo'])
+        return datos
+
+    def _importar_lote(self, lote):
+        """Cifra e inserta un lote. Retorna (ids de Usuario creados, filas omitidas)"""
+        vistos = set()
+        filas = [datos for datos in (self._validar(n, f, vistos) for n, f in lote) if datos]
+
+        # Correos ya registrados (en Usuario o como username/email de User)
+        correos = [datos['correo'] for datos in filas]
+        existentes = set(Usuario.objects.filter(Correo__in=correos).values_list('Correo', flat=True))
+        existentes.update(User.objects.filter(username__in=correos).values_list('username', flat=True))
+        existentes.update(User.objects.filter(email__in=correos).values_list('email', flat=True))
+        for datos in filas:
+            if datos['correo'] in existentes:
+                self.stdout.write(self.style.WARNING(f"⚠️  {datos['correo']} ya está registrado"))
+        filas = [datos for datos in filas if datos['correo'] not in existentes]
+        if not filas:
+            return [], len(lote)
+
+        inicio = time.perf_counter()
+        chunksize = max(1, math.ceil(len(filas) / (self.num_procesos * 4)))
+        hashes = list(self.procesos.map(
+            make_password, [datos['contrasena'] for datos in filas], chunksize=chunksize
+        ))
+        self.tiempo_cifrado += time.perf_counter() - inicio
+
+        ahora = timezone.now()
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=datos['correo'], email=datos['correo'], password=hash_, date_joined=ahora)
+                for datos, hash_ in zip(filas, hashes)
+            ])
+            # MySQL no devuelve los ids de bulk_create: se leen por username
+            user_ids = dict(User.objects.filter(username__in=correos).values_list('username', 'id'))
+            usuarios = Usuario.objects.bulk_create([
+                Usuario(
+                    user_id=user_ids[datos['correo']],
+                    Nombres=datos['nombres'],
+                    Apellidos=datos['apellidos'],
+                    Correo=datos['correo'],
+                    Rol=datos['rol'],
+                    Fecha_registro=ahora,
+                    Estado='activo',
+                )
+                for datos in filas
+            ])
+            # bulk_create no envía post_save: el contador y el panel se ajustan aquí
+            Estadistica.sumar('total_usuarios', len(usuarios))
+            transaction.on_commit(lambda: invalidar_paneles([PANEL_ADMIN]))
+
+        nuevos = Usuario.objects.filter(Correo__in=[datos['correo'] for datos in filas])
+        return list(nuevos.values_list('idUsuario', flat=True)), len(lote) - len(filas)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Estadistica
+
+
+class Command(BaseCommand):
+    """
+    Recalcula con COUNT(*) los contadores del panel administrativo y
+    corrige las diferencias acumuladas por cambios que no pasan por señales.
+    Pensado para ejecutarse periódicamente (cron), por ejemplo cada hora:
+        0 * * * * python manage.py reconciliar_estadisticas
+    """
+    help = 'Recalcula los contadores de estadísticas del panel administrativo'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            anteriores = dict(Estadistica.objects.select_for_update().values_list('clave', 'valor'))
+            valores = Estadistica.reconciliar()
+
+        for clave, valor in valores.items():
+            anterior = anteriores.get(clave)
+            if anterior is None:
+                self.stdout.write(f'➕ {clave}: {valor}')
+            elif anterior != valor:
+                self.stdout.write(self.style.WARNING(f'⚠️  {clave}: {anterior} -> {valor}'))
+            else:
+                self.stdout.write(f'✔️  {clave}: {valor}')
+
+        self.stdout.write(self.style.SUCCESS('✅ Estadísticas reconciliadas'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.conversaciones import poblar_conversaciones
+from core.models import Chat, Conversation
+
+
+class Command(BaseCommand):
+    """
+    Reconstruye la tabla Conversation a partir del historial de Chat.
+    Uso: python manage.py reconstruir_conversaciones
+    """
+    help = 'Reconstruye los resúmenes de conversación desde el historial de Chat'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Cantidad de conversaciones a insertar por lote (por defecto 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            Conversation.objects.all().delete()
+            total = poblar_conversaciones(Chat, Conversation, lote=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} conversaciones reconstruidas'))
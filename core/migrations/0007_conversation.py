@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_chat_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('unread_a', models.PositiveIntegerField(default=0)),
+                ('unread_b', models.PositiveIntegerField(default=0)),
+                ('last_message', models.ForeignKey(blank=True, db_column='last_message', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.chat')),
+                ('user_a', models.ForeignKey(db_column='user_a', on_delete=django.db.models.deletion.CASCADE, related_name='conversaciones_a', to='core.usuario')),
+                ('user_b', models.ForeignKey(db_column='user_b', on_delete=django.db.models.deletion.CASCADE, related_name='conversaciones_b', to='core.usuario')),
+            ],
+            options={
+                'verbose_name': 'Conversación',
+                'verbose_name_plural': 'Conversaciones',
+                'db_table': 'Conversation',
+                'indexes': [models.Index(fields=['user_a', '-last_timestamp'], name='conv_user_a_recientes'), models.Index(fields=['user_b', '-last_timestamp'], name='conv_user_b_recientes')],
+                'unique_together': {('user_a', 'user_b')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_conversation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['sender', 'receiver', 'timestamp', 'id'], name='chat_conversacion_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['receiver', 'is_read', 'sender'], name='chat_no_leidos'),
+        ),
+    ]
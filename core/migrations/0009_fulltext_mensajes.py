@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def crear_indices_fulltext(apps, schema_editor):
+    """Índices FULLTEXT para la búsqueda de mensajes (solo MySQL)"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE `Chat` ADD FULLTEXT INDEX `chat_message_ft` (`message`)')
+    schema_editor.execute('ALTER TABLE `Mensaje` ADD FULLTEXT INDEX `mensaje_contenido_ft` (`Contenido`)')
+
+
+def eliminar_indices_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE `Chat` DROP INDEX `chat_message_ft`')
+    schema_editor.execute('ALTER TABLE `Mensaje` DROP INDEX `mensaje_contenido_ft`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_chat_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_fulltext, eliminar_indices_fulltext),
+    ]
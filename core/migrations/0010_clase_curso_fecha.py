@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_fulltext_mensajes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clase',
+            index=models.Index(fields=['idCurso', 'Fecha_hora'], name='clase_curso_fecha'),
+        ),
+    ]
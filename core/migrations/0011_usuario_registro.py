@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_clase_curso_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['Fecha_registro', 'idUsuario'], name='usuario_registro'),
+        ),
+    ]
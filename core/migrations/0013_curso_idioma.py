@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+def poblar_idioma(apps, schema_editor):
+    # Misma regla que Curso.idioma_desde_nombre (el modelo histórico no la tiene)
+    Curso = apps.get_model('core', 'Curso')
+    cursos = list(Curso.objects.filter(Idioma='').only('idCurso', 'Nombre'))
+    for curso in cursos:
+        curso.Idioma = curso.Nombre.split(' - ')[0].strip() if ' - ' in curso.Nombre else curso.Nombre
+    Curso.objects.bulk_update(cursos, ['Idioma'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_estadistica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='curso',
+            name='Idioma',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.RunPython(poblar_idioma, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_curso_idioma'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionUsuario',
+            fields=[
+                ('session_key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('idUsuario', models.ForeignKey(db_column='idUsuario', on_delete=django.db.models.deletion.CASCADE, related_name='sesiones', to='core.usuario')),
+            ],
+            options={
+                'verbose_name': 'Sesión de usuario',
+                'verbose_name_plural': 'Sesiones de usuarios',
+                'db_table': 'SesionUsuario',
+            },
+        ),
+    ]
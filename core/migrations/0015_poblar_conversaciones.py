@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from core.conversaciones import poblar_conversaciones
+
+
+def poblar(apps, schema_editor):
+    # Mismo resumen que el comando reconstruir_conversaciones, solo para las
+    # parejas que aún no tienen fila (historial anterior a 0007_conversation)
+    Chat = apps.get_model('core', 'Chat')
+    Conversation = apps.get_model('core', 'Conversation')
+    existentes = set(Conversation.objects.values_list('user_a_id', 'user_b_id'))
+    poblar_conversaciones(Chat, Conversation, existentes=existentes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sesion_usuario'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def crear_indices_gin(apps, schema_editor):
+    """Índices GIN para la búsqueda de mensajes (solo PostgreSQL, ver BusquedaPostgres)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX "chat_message_fts" ON "Chat" '
+        'USING GIN (to_tsvector(\'spanish\'::regconfig, COALESCE("message", \'\')))'
+    )
+    schema_editor.execute(
+        'CREATE INDEX "mensaje_contenido_fts" ON "Mensaje" '
+        'USING GIN (to_tsvector(\'spanish\'::regconfig, COALESCE("Contenido", \'\')))'
+    )
+
+
+def eliminar_indices_gin(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX "chat_message_fts"')
+    schema_editor.execute('DROP INDEX "mensaje_contenido_fts"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_poblar_conversaciones'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_gin, eliminar_indices_gin),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_busqueda_postgres'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsuarioDepurado',
+            fields=[
+                ('idUsuario', models.OneToOneField(db_column='idUsuario', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='depuracion', serialize=False, to='core.usuario')),
+                ('Vence', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Usuario en depuración',
+                'verbose_name_plural': 'Usuarios en depuración',
+                'db_table': 'UsuarioDepurado',
+            },
+        ),
+    ]
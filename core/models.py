@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils import timezone
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User  # ← Importar el modelo User de Django
 
 # -----------------------------------------------------
@@ -42,14 +43,56 @@ class Usuario(models.Model):
         db_table = 'Usuario'
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
+        indexes = [
+            # Tabla paginada del panel administrativo (más recientes primero)
+            models.Index(fields=['Fecha_registro', 'idUsuario'], name='usuario_registro'),
+        ]
 
     def __str__(self):
         return f"{self.Nombres} {self.Apellidos} ({self.Rol})"
 
+    @classmethod
+    def sincronizar_emails(cls, usuario_ids):
+        """
+        Versión por conjuntos de la señal sincronizar_email: copia Correo
+        al email de auth_user en un solo UPDATE para los usuarios indicados.
+        Para altas masivas (bulk_create no envía señales).
+        """
+        correo = cls.objects.filter(user_id=models.OuterRef('pk')).values('Correo')[:1]
+        return User.objects.filter(
+            perfil__idUsuario__in=usuario_ids
+        ).exclude(
+            email=models.F('perfil__Correo')
+        ).update(email=models.Subquery(correo))
+
 
 # -----------------------------------------------------
 # Modelo Curso
 # -----------------------------------------------------
+def contar_por_curso(modelo, **filtros):
+    """Subconsulta COUNT(*) de las filas de modelo que pertenecen al curso externo"""
+    conteo = modelo.objects.filter(
+        idCurso=models.OuterRef('pk'), **filtros
+    ).order_by().values('idCurso').annotate(total=models.Count('*')).values('total')
+    return Coalesce(models.Subquery(conteo, output_field=models.IntegerField()), 0)
+
+
+class CursoQuerySet(models.QuerySet):
+    def with_stats(self):
+        """
+        Anota los conteos por curso (inscripciones, inscripciones activas,
+        clases y contenidos) en la misma consulta, para que las plantillas
+        no ejecuten un COUNT por fila. Se usan subconsultas y no JOIN + COUNT
+        para que las tablas relacionadas no se multipliquen entre sí.
+        """
+        return self.annotate(
+            total_inscripciones=contar_por_curso(Inscripcion),
+            inscripciones_activas=contar_por_curso(Inscripcion, Estado='activa'),
+            total_clases=contar_por_curso(Clase),
+            total_contenidos=contar_por_curso(ContenidoEducativo),
+        )
+
+
 class Curso(models.Model):
     NIVELES = [
         ('A1', 'A1'),
@@ -72,6 +115,10 @@ class Curso(models.Model):
     Nivel_mcerl = models.CharField(max_length=2, choices=NIVELES)
     Modalidad = models.CharField(max_length=12, choices=MODALIDADES)
     Estado = models.CharField(max_length=8, choices=ESTADOS, default='activo')
+    # Agrupa el catálogo; se toma del nombre en cada save()
+    Idioma = models.CharField(max_length=50, blank=True, db_index=True)
+
+    objects = CursoQuerySet.as_manager()
 
     class Meta:
         db_table = 'Curso'
@@ -81,6 +128,21 @@ class Curso(models.Model):
     def __str__(self):
         return f"{self.Nombre} - {self.Nivel_mcerl}"
 
+    @staticmethod
+    def idioma_desde_nombre(nombre):
+        """Extrae el idioma del nombre (ej: "Inglés - A1" -> "Inglés")"""
+        if ' - ' in nombre:
+            return nombre.split(' - ')[0].strip()
+        return nombre  # Si no tiene formato "Idioma - Nivel"
+
+    def save(self, *args, **kwargs):
+        # Idioma se deriva siempre del nombre, así que sigue al renombrar el curso
+        self.Idioma = self.idioma_desde_nombre(self.Nombre)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'Nombre' in update_fields and 'Idioma' not in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'Idioma'}
+        super().save(*args, **kwargs)
+
 
 # -----------------------------------------------------
 # Modelo Inscripcion
@@ -144,6 +206,10 @@ class Clase(models.Model):
         verbose_name = 'Clase'
         verbose_name_plural = 'Clases'
         ordering = ['Fecha_hora']
+        indexes = [
+            # Próximas clases por curso (dashboard del estudiante)
+            models.Index(fields=['idCurso', 'Fecha_hora'], name='clase_curso_fecha'),
+        ]
 
     def __str__(self):
         return f"Clase {self.idClase} - {self.idCurso.Nombre}"
@@ -501,6 +567,283 @@ class Chat(models.Model):
         verbose_name = 'Chat'
         verbose_name_plural = 'Chats'
         ordering = ['timestamp']
+        indexes = [
+            # Historial de una conversación y paginación por (timestamp, id)
+            models.Index(fields=['sender', 'receiver', 'timestamp', 'id'], name='chat_conversacion_fecha'),
+            # Mensajes no leídos de un receptor (marcar como leídos, contadores)
+            models.Index(fields=['receiver', 'is_read', 'sender'], name='chat_no_leidos'),
+        ]
     
     def __str__(self):
-        return f"{self.sender.Nombres} -> {self.receiver.Nombres}: {self.message[:30]}"
\ No newline at end of file
+        return f"{self.sender.Nombres} -> {self.receiver.Nombres}: {self.message[:30]}"
+
+# -----------------------------------------------------
+# Modelo de conversación (resumen por pareja de usuarios)
+# -----------------------------------------------------
+
+class Conversation(models.Model):
+    """
+    Resumen desnormalizado de la conversación entre dos usuarios.
+    La pareja se guarda ordenada (user_a < user_b) para que exista
+    una sola fila por conversación; se mantiene al crear mensajes
+    (ver signals.py) y al marcarlos como leídos.
+    """
+    user_a = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='conversaciones_a',
+        db_column='user_a'
+    )
+    user_b = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='conversaciones_b',
+        db_column='user_b'
+    )
+    last_message = models.ForeignKey(
+        Chat,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        db_column='last_message',
+        null=True,
+        blank=True
+    )
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    # Mensajes sin leer por cada participante
+    unread_a = models.PositiveIntegerField(default=0)
+    unread_b = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'Conversation'
+        verbose_name = 'Conversación'
+        verbose_name_plural = 'Conversaciones'
+        unique_together = ['user_a', 'user_b']
+        indexes = [
+            models.Index(fields=['user_a', '-last_timestamp'], name='conv_user_a_recientes'),
+            models.Index(fields=['user_b', '-last_timestamp'], name='conv_user_b_recientes'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_a_id} <-> {self.user_b_id}"
+
+    @staticmethod
+    def pareja(id_1, id_2):
+        """Retorna los ids de la pareja en orden (user_a, user_b)"""
+        return (id_1, id_2) if id_1 < id_2 else (id_2, id_1)
+
+    @classmethod
+    def registrar_mensaje(cls, chat):
+        """Actualiza el resumen con un mensaje recién creado"""
+        user_a, user_b = cls.pareja(chat.sender_id, chat.receiver_id)
+        campo_unread = 'unread_a' if chat.receiver_id == user_a else 'unread_b'
+        conversacion, _ = cls.objects.get_or_create(user_a_id=user_a, user_b_id=user_b)
+        cls.objects.filter(pk=conversacion.pk).update(**{
+            campo_unread: models.F(campo_unread) + 1,
+        })
+        # Solo avanza: si un mensaje posterior se registró antes, no lo reemplaza
+        cls.objects.filter(
+            models.Q(last_message__isnull=True) | models.Q(last_message_id__lt=chat.id),
+            pk=conversacion.pk,
+        ).update(last_message=chat, last_timestamp=chat.timestamp)
+
+    @classmethod
+    def registrar_difusion(cls, sender_id, receiver_ids):
+        """
+        Actualiza en bloque los resúmenes tras un envío masivo con
+        bulk_create (que no dispara post_save): crea las conversaciones
+        que falten y actualiza último mensaje y no leídos con dos UPDATE.
+        """
+        # El remitente es user_a frente a ids mayores y user_b frente a ids menores
+        mayores = [r for r in receiver_ids if r > sender_id]
+        menores = [r for r in receiver_ids if r < sender_id]
+
+        existentes = set(cls.objects.filter(
+            models.Q(user_a_id=sender_id, user_b_id__in=mayores) |
+            models.Q(user_b_id=sender_id, user_a_id__in=menores)
+        ).values_list('user_a_id', 'user_b_id'))
+        cls.objects.bulk_create([
+            cls(user_a_id=user_a, user_b_id=user_b)
+            for user_a, user_b in (cls.pareja(sender_id, r) for r in receiver_ids)
+            if (user_a, user_b) not in existentes
+        ], ignore_conflicts=True)
+
+        for receptores, campo_receptor, campo_unread in (
+            (mayores, 'user_b', 'unread_b'),
+            (menores, 'user_a', 'unread_a'),
+        ):
+            if not receptores:
+                continue
+            ultimo = Chat.objects.filter(
+                sender_id=sender_id,
+                receiver_id=models.OuterRef(campo_receptor)
+            ).order_by('-timestamp', '-id')
+            campo_remitente = 'user_a' if campo_receptor == 'user_b' else 'user_b'
+            cls.objects.filter(**{
+                f'{campo_remitente}_id': sender_id,
+                f'{campo_receptor}_id__in': receptores,
+            }).update(**{
+                'last_message': models.Subquery(ultimo.values('id')[:1]),
+                'last_timestamp': models.Subquery(ultimo.values('timestamp')[:1]),
+                campo_unread: models.F(campo_unread) + 1,
+            })
+
+    @classmethod
+    def marcar_leidos(cls, lector_id, otro_id):
+        """
+        Marca como leídos los mensajes de otro_id hacia lector_id.
+        Solo escribe si el contador indica mensajes pendientes.
+        """
+        user_a, user_b = cls.pareja(lector_id, otro_id)
+        campo_unread = 'unread_a' if lector_id == user_a else 'unread_b'
+        reseteadas = cls.objects.filter(
+            user_a_id=user_a, user_b_id=user_b, **{f'{campo_unread}__gt': 0}
+        ).update(**{campo_unread: 0})
+        if reseteadas:
+            Chat.objects.filter(
+                sender_id=otro_id,
+                receiver_id=lector_id,
+                is_read=False
+            ).update(is_read=True)
+        return reseteadas
+
+    @classmethod
+    def de_usuario(cls, usuario_id):
+        """Conversaciones de un usuario, de la más reciente a la más antigua"""
+        return cls.objects.filter(
+            models.Q(user_a_id=usuario_id) | models.Q(user_b_id=usuario_id)
+        ).order_by('-last_timestamp')
+
+    @classmethod
+    def total_no_leidos(cls, usuario_id):
+        """Total de mensajes sin leer del usuario (para insignias)"""
+        totales = cls.de_usuario(usuario_id).aggregate(
+            a=models.Sum('unread_a', filter=models.Q(user_a_id=usuario_id)),
+            b=models.Sum('unread_b', filter=models.Q(user_b_id=usuario_id)),
+        )
+        return (totales['a'] or 0) + (totales['b'] or 0)
+
+    def contraparte_de(self, usuario_id):
+        """El otro participante de la conversación"""
+        return self.user_b if self.user_a_id == usuario_id else self.user_a
+
+    def no_leidos_de(self, usuario_id):
+        """Mensajes sin leer para el participante indicado"""
+        return self.unread_a if self.user_a_id == usuario_id else self.unread_b
+
+
+# -----------------------------------------------------
+# Modelo de estadísticas del panel administrativo
+# -----------------------------------------------------
+
+class Estadistica(models.Model):
+    """
+    Contadores globales del panel administrativo. Las señales los ajustan
+    con incrementos al crear, cambiar de estado o eliminar registros
+    (ver signals.py) y el comando reconciliar_estadisticas los recalcula
+    con COUNT(*) para corregir lo que no pasa por señales (update(),
+    bulk_create, cambios directos en la base de datos).
+    """
+    clave = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'Estadistica'
+        verbose_name = 'Estadística'
+        verbose_name_plural = 'Estadísticas'
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+    @staticmethod
+    def consultas():
+        """Consulta exacta de cada contador"""
+        return {
+            'total_usuarios': Usuario.objects.all(),
+            'total_cursos': Curso.objects.all(),
+            'total_inscripciones': Inscripcion.objects.filter(Estado='activa'),
+            'pagos_pendientes': ReciboPago.objects.filter(Estado_pago='pendiente'),
+        }
+
+    @classmethod
+    def sumar(cls, clave, delta):
+        """Ajusta un contador con un UPDATE atómico (valor = valor + delta)"""
+        if delta:
+            cls.objects.filter(clave=clave).update(valor=models.F('valor') + delta)
+
+    @classmethod
+    def leer(cls):
+        """
+        Todos los contadores en una consulta. Los que aún no existen
+        se calculan y se guardan una única vez.
+        """
+        valores = dict(cls.objects.values_list('clave', 'valor'))
+        faltantes = [clave for clave in cls.consultas() if clave not in valores]
+        if faltantes:
+            valores.update(cls.reconciliar(faltantes))
+        return valores
+
+    @classmethod
+    def reconciliar(cls, claves=None):
+        """Recalcula los contadores indicados (o todos) y retorna sus valores"""
+        valores = {}
+        for clave, consulta in cls.consultas().items():
+            if claves is None or clave in claves:
+                valores[clave] = consulta.count()
+                cls.objects.update_or_create(clave=clave, defaults={'valor': valores[clave]})
+        return valores
+
+
+# -----------------------------------------------------
+# Índice de sesiones por usuario
+# -----------------------------------------------------
+
+class SesionUsuario(models.Model):
+    """
+    Índice usuario -> claves de sus sesiones abiertas. Lo mantiene el motor
+    de sesiones (core/motor_sesiones.py) al guardar y eliminar sesiones,
+    para cerrar todas las sesiones de un usuario sin recorrer django_session.
+    """
+    session_key = models.CharField(max_length=40, primary_key=True)
+    idUsuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        db_column='idUsuario',
+        related_name='sesiones'
+    )
+
+    class Meta:
+        db_table = 'SesionUsuario'
+        verbose_name = 'Sesión de usuario'
+        verbose_name_plural = 'Sesiones de usuarios'
+
+    def __str__(self):
+        return f"{self.idUsuario_id}: {self.session_key}"
+
+
+# -----------------------------------------------------
+# Usuarios con registros DEBUG activados
+# -----------------------------------------------------
+
+class UsuarioDepurado(models.Model):
+    """
+    Usuarios cuyas peticiones registran en nivel DEBUG hasta Vence. Va en la
+    base de datos para que el comando depurar_usuario llegue a todos los
+    procesos del servidor (ver core/bitacora.py).
+    """
+    idUsuario = models.OneToOneField(
+        Usuario,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='idUsuario',
+        related_name='depuracion'
+    )
+    Vence = models.DateTimeField()
+
+    class Meta:
+        db_table = 'UsuarioDepurado'
+        verbose_name = 'Usuario en depuración'
+        verbose_name_plural = 'Usuarios en depuración'
+
+    def __str__(self):
+        return f"{self.idUsuario_id} hasta {self.Vence}"
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db, db
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from .models import SesionUsuario
+
+
+# -----------------------------------------------------
+# Motor de sesiones: cache + base de datos con índice por usuario
+# -----------------------------------------------------
+#
+# SESSION_ENGINE = 'core.motor_sesiones'. Las sesiones se guardan en
+# django_session y, si SESSION_CACHE_ALIAS apunta a un cache compartido
+# (Redis, Memcached), también se leen y escriben en él como cached_db de
+# Django. Con un cache local al proceso (LocMem) o sin ese alias se usa solo
+# la base de datos: una sesión revocada en un proceso seguiría valiendo en
+# el cache de los demás. Además mantiene SesionUsuario para poder cerrar
+# todas las sesiones de un usuario (revocar_sesiones) y limpia las vencidas
+# por lotes en clearsessions.
+
+
+def cache_de_sesiones():
+    """Cache compartido de las sesiones, o None si no hay uno configurado"""
+    alias = settings.SESSION_CACHE_ALIAS
+    if alias not in settings.CACHES:
+        return None
+    cache = caches[alias]
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+_cache = cache_de_sesiones()
+
+
+class SessionStore(cached_db.SessionStore if _cache is not None else db.SessionStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # (session_key, usuario_id) que ya está en el índice
+        self._indexado = None
+
+    def load(self):
+        datos = super().load()
+        if self.session_key:
+            self._indexado = (self.session_key, datos.get('usuario_id'))
+        return datos
+
+    def save(self, must_create=False):
+        super().save(must_create)
+        # Solo se escribe el índice si cambió la clave o el usuario (login, logout, cycle_key)
+        usuario_id = self._get_session(no_load=must_create).get('usuario_id')
+        if (self.session_key, usuario_id) == self._indexado:
+            return
+        if usuario_id:
+            SesionUsuario.objects.update_or_create(
+                session_key=self.session_key, defaults={'idUsuario_id': usuario_id}
+            )
+        else:
+            SesionUsuario.objects.filter(session_key=self.session_key).delete()
+        self._indexado = (self.session_key, usuario_id)
+
+    def delete(self, session_key=None):
+        clave = session_key or self.session_key
+        super().delete(session_key)
+        if clave:
+            SesionUsuario.objects.filter(session_key=clave).delete()
+
+    @classmethod
+    def clear_expired(cls):
+        """
+        Elimina las sesiones vencidas en lotes de SESSION_LIMPIEZA_LOTE
+        (cada lote en su propia transacción) en lugar de un solo DELETE
+        sobre toda la tabla. Lo usa el comando clearsessions.
+        """
+        modelo = cls.get_model_class()
+        while True:
+            claves = list(modelo.objects.filter(
+                expire_date__lt=timezone.now()
+            ).values_list('session_key', flat=True)[:settings.SESSION_LIMPIEZA_LOTE])
+            if not claves:
+                break
+            modelo.objects.filter(session_key__in=claves).delete()
+            SesionUsuario.objects.filter(session_key__in=claves).delete()
+
+
+def sesiones_de(usuario_id):
+    """Claves de las sesiones abiertas del usuario, desde el índice"""
+    return list(SesionUsuario.objects.filter(idUsuario_id=usuario_id).values_list('session_key', flat=True))
+
+
+def eliminar_sesiones(claves):
+    """Elimina las sesiones del cache, de django_session y del índice"""
+    if not claves:
+        return
+    if _cache is not None:
+        _cache.delete_many([cached_db.KEY_PREFIX + clave for clave in claves])
+    SessionStore.get_model_class().objects.filter(session_key__in=claves).delete()
+    SesionUsuario.objects.filter(session_key__in=claves).delete()
+
+
+def revocar_sesiones(usuario_id):
+    """Cierra todas las sesiones del usuario. Retorna cuántas había"""
+    claves = sesiones_de(usuario_id)
+    eliminar_sesiones(claves)
+    return len(claves)
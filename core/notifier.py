@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Conversation
+
+
+class NotificadorChat:
+    """
+    Notificador en memoria (un solo proceso) para la entrega de mensajes
+    del chat por long-polling. Guarda el último id de mensaje publicado
+    por pareja de usuarios y despierta solo a las peticiones que esperan
+    esa conversación (una Condition por pareja con esperas activas).
+
+    Los últimos ids solo cubren el intervalo entre la consulta a la base de
+    datos y la espera, así que se descartan pasados RETENCION segundos o al
+    superar MAXIMO_PAREJAS (los más antiguos primero).
+    """
+    RETENCION = 60
+    MAXIMO_PAREJAS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._esperas = {}              # pareja -> [Condition, peticiones esperando]
+        self._ultimos = OrderedDict()   # pareja -> (mensaje_id, instante), del más antiguo al más reciente
+
+    @staticmethod
+    def pareja(id_1, id_2):
+        """Clave de la conversación, independiente del orden"""
+        return (id_1, id_2) if id_1 < id_2 else (id_2, id_1)
+
+    def _purgar(self, ahora):
+        while self._ultimos:
+            clave, (_, instante) = next(iter(self._ultimos.items()))
+            if len(self._ultimos) <= self.MAXIMO_PAREJAS and ahora - instante < self.RETENCION:
+                break
+            del self._ultimos[clave]
+
+    def _ultimo(self, clave):
+        return self._ultimos.get(clave, (0, 0))[0]
+
+    def publicar(self, id_1, id_2, mensaje_id):
+        """Registra un mensaje nuevo y despierta a quienes esperan esa conversación"""
+        clave = self.pareja(id_1, id_2)
+        ahora = time.monotonic()
+        with self._lock:
+            self._ultimos[clave] = (max(mensaje_id, self._ultimo(clave)), ahora)
+            self._ultimos.move_to_end(clave)
+            self._purgar(ahora)
+            espera = self._esperas.get(clave)
+            if espera is not None:
+                espera[0].notify_all()
+
+    def esperar(self, id_1, id_2, ultimo_id, timeout):
+        """
+        Bloquea hasta que llegue un mensaje con id mayor a ultimo_id
+        o se cumpla el timeout. Retorna True si hay mensajes nuevos.
+        """
+        clave = self.pareja(id_1, id_2)
+        with self._lock:
+            espera = self._esperas.setdefault(clave, [threading.Condition(self._lock), 0])
+            espera[1] += 1
+            try:
+                return espera[0].wait_for(lambda: self._ultimo(clave) > ultimo_id, timeout=timeout)
+            finally:
+                espera[1] -= 1
+                if not espera[1]:
+                    del self._esperas[clave]
+
+
+# Instancia compartida por todo el proceso
+notificador = NotificadorChat()
+
+
+# -----------------------------------------------------
+# Difusión por WebSocket (channel layer)
+# -----------------------------------------------------
+
+def grupo_conversacion(id_1, id_2):
+    """Nombre del grupo del channel layer para una conversación"""
+    user_a, user_b = NotificadorChat.pareja(id_1, id_2)
+    return f'chat_{user_a}_{user_b}'
+
+
+def difundir(id_1, id_2, evento):
+    """
+    Envía un evento a los WebSockets conectados a la conversación.
+    No hace nada si no hay un channel layer configurado.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(grupo_conversacion(id_1, id_2), evento)
+
+
+def difundir_mensaje(chat):
+    """Publica un mensaje recién guardado para long-polling y WebSocket"""
+    notificador.publicar(chat.sender_id, chat.receiver_id, chat.id)
+    difundir(chat.sender_id, chat.receiver_id, {
+        'type': 'chat.message',
+        'id': chat.id,
+        'text': chat.message,
+        'timestamp': chat.timestamp.strftime('%H:%M'),
+        'sender_id': chat.sender_id,
+    })
+
+
+def difundir_envio_masivo(chats):
+    """
+    Publica en tiempo real los mensajes de un envío masivo; bulk_create no
+    envía post_save, así que se difunden aquí a partir de las filas creadas
+    """
+    for chat in chats:
+        difundir_mensaje(chat)
+
+
+def difundir_escribiendo(usuario_id, otro_id):
+    """Avisa a la conversación que usuario_id está escribiendo"""
+    difundir(usuario_id, otro_id, {
+        'type': 'chat.typing',
+        'user_id': usuario_id,
+    })
+
+
+def marcar_leidos(lector_id, otro_id):
+    """
+    Marca como leídos los mensajes de otro_id hacia lector_id y,
+    si hubo cambios, envía la confirmación de lectura a ambos.
+    """
+    reseteadas = Conversation.marcar_leidos(lector_id, otro_id)
+    if reseteadas:
+        difundir(lector_id, otro_id, {
+            'type': 'chat.read',
+            'reader_id': lector_id,
+        })
+    return reseteadas
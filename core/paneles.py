@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_versiones import version_actual, renovar_versiones
+from .models import Inscripcion, ProfesorCurso
+
+
+# -----------------------------------------------------
+# Caché de las secciones de los paneles (dashboards)
+# -----------------------------------------------------
+#
+# Cada usuario tiene una versión en el cache; las secciones de su panel se
+# guardan bajo una clave que incluye esa versión. Al cambiar sus datos,
+# las señales (signals.py) renuevan la versión una vez confirmada la
+# transacción y las claves anteriores dejan de leerse (vencen por TTL).
+# El panel administrativo comparte una sola versión: PANEL_ADMIN.
+
+PANEL_ADMIN = 'admin'
+
+
+def version_panel(panel_id):
+    """Versión actual del panel; se crea si no existe"""
+    return version_actual(f'panel:{panel_id}')
+
+
+def invalidar_paneles(panel_ids):
+    """Renueva la versión de los paneles indicados en una sola escritura"""
+    renovar_versiones(f'panel:{panel_id}' for panel_id in panel_ids)
+
+
+def seccion_en_cache(panel_id, nombre, construir):
+    """
+    Retorna la sección del panel desde el cache o la construye con
+    construir() y la guarda. construir debe retornar datos ya evaluados
+    (listas, no querysets perezosos).
+    """
+    clave = f'panel:{panel_id}:{version_panel(panel_id)}:{nombre}'
+    return cache.get_or_set(clave, construir, settings.PANEL_CACHE_TIMEOUT)
+
+
+def paneles_del_curso(curso_id):
+    """Usuarios cuyo panel muestra datos del curso: inscritos y profesores"""
+    inscritos = Inscripcion.objects.filter(idCurso_id=curso_id).values_list('idUsuario_id', flat=True)
+    profesores = ProfesorCurso.objects.filter(idCurso_id=curso_id).values_list('idProfesor_id', flat=True)
+    return set(inscritos.union(profesores))
+
+
+def paneles_de_profesores_del_alumno(usuario_id):
+    """Profesores que tienen al usuario en alguno de sus cursos"""
+    return set(ProfesorCurso.objects.filter(
+        idCurso__inscripciones__idUsuario_id=usuario_id
+    ).values_list('idProfesor_id', flat=True))
@@ -0,0 +1,162 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+# -----------------------------------------------------
+# Presencia (en línea) e indicador de "escribiendo" del chat
+# -----------------------------------------------------
+
+class Presencia(ABC):
+    """
+    Interfaz de almacenamiento de la presencia. Guarda cuándo se vio por
+    última vez a cada usuario y quién está escribiendo a quién; ambos datos
+    caducan solos (TTL). Las implementaciones deben ser seguras entre hilos.
+    """
+
+    def __init__(self, ttl, ttl_escribiendo):
+        self.ttl = ttl
+        self.ttl_escribiendo = ttl_escribiendo
+
+    @abstractmethod
+    def marcar_visto(self, usuario_id, ahora):
+        ...
+
+    @abstractmethod
+    def vistos(self, usuario_ids, ahora):
+        """Retorna {usuario_id: última vez visto} de los usuarios aún vigentes"""
+
+    @abstractmethod
+    def marcar_escribiendo(self, usuario_id, otro_id, ahora):
+        ...
+
+    @abstractmethod
+    def esta_escribiendo(self, usuario_id, otro_id, ahora):
+        ...
+
+
+class PresenciaEnMemoria(Presencia):
+    """Diccionarios del proceso; las entradas vencidas se purgan cada TTL"""
+
+    def __init__(self, ttl, ttl_escribiendo):
+        super().__init__(ttl, ttl_escribiendo)
+        self._lock = threading.Lock()
+        self._vistos = {}        # usuario_id -> timestamp
+        self._escribiendo = {}   # (usuario_id, otro_id) -> timestamp
+        self._proxima_purga = 0
+
+    def _purgar(self, ahora):
+        if ahora < self._proxima_purga:
+            return
+        self._vistos = {k: t for k, t in self._vistos.items() if ahora - t < self.ttl}
+        self._escribiendo = {k: t for k, t in self._escribiendo.items() if ahora - t < self.ttl_escribiendo}
+        self._proxima_purga = ahora + self.ttl
+
+    def marcar_visto(self, usuario_id, ahora):
+        with self._lock:
+            self._vistos[usuario_id] = ahora
+            self._purgar(ahora)
+
+    def vistos(self, usuario_ids, ahora):
+        with self._lock:
+            return {
+                usuario_id: self._vistos[usuario_id]
+                for usuario_id in usuario_ids
+                if usuario_id in self._vistos and ahora - self._vistos[usuario_id] < self.ttl
+            }
+
+    def marcar_escribiendo(self, usuario_id, otro_id, ahora):
+        with self._lock:
+            self._escribiendo[(usuario_id, otro_id)] = ahora
+            self._purgar(ahora)
+
+    def esta_escribiendo(self, usuario_id, otro_id, ahora):
+        with self._lock:
+            momento = self._escribiendo.get((usuario_id, otro_id))
+        return momento is not None and ahora - momento < self.ttl_escribiendo
+
+
+class PresenciaEnCache(Presencia):
+    """
+    Usa el cache de Django (CACHES['default']); con un cache compartido
+    como Redis o Memcached la presencia es visible desde todos los procesos.
+    """
+
+    def _clave(self, usuario_id):
+        return f'chat:visto:{usuario_id}'
+
+    def marcar_visto(self, usuario_id, ahora):
+        cache.set(self._clave(usuario_id), ahora, self.ttl)
+
+    def vistos(self, usuario_ids, ahora):
+        claves = {self._clave(usuario_id): usuario_id for usuario_id in usuario_ids}
+        return {claves[clave]: momento for clave, momento in cache.get_many(list(claves)).items()}
+
+    def marcar_escribiendo(self, usuario_id, otro_id, ahora):
+        cache.set(f'chat:escribiendo:{usuario_id}:{otro_id}', ahora, self.ttl_escribiendo)
+
+    def esta_escribiendo(self, usuario_id, otro_id, ahora):
+        return cache.get(f'chat:escribiendo:{usuario_id}:{otro_id}') is not None
+
+
+class RastreadorPresencia:
+    """
+    Punto de entrada para vistas y consumers. Agrupa los latidos: un mismo
+    usuario solo se escribe en el almacenamiento una vez por intervalo,
+    sin importar cuántas pestañas o peticiones tenga abiertas.
+    """
+
+    def __init__(self, almacen, intervalo):
+        self.almacen = almacen
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._ultimo_latido = {}   # usuario_id -> última escritura desde este proceso
+
+    def latido(self, usuario_id, ahora=None):
+        """Registra actividad del usuario. Retorna True si se escribió"""
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            if ahora - self._ultimo_latido.get(usuario_id, 0) < self.intervalo:
+                return False
+            self._ultimo_latido[usuario_id] = ahora
+            if len(self._ultimo_latido) > 10000:
+                self._ultimo_latido = {
+                    k: t for k, t in self._ultimo_latido.items() if ahora - t < self.intervalo
+                }
+        self.almacen.marcar_visto(usuario_id, ahora)
+        return True
+
+    def en_linea(self, usuario_ids, ahora=None):
+        """Conjunto de los usuarios de la lista que están en línea"""
+        ahora = time.time() if ahora is None else ahora
+        return set(self.almacen.vistos(usuario_ids, ahora))
+
+    def escribiendo(self, usuario_id, otro_id, ahora=None):
+        """Indica que usuario_id está escribiendo a otro_id"""
+        ahora = time.time() if ahora is None else ahora
+        self.almacen.marcar_escribiendo(usuario_id, otro_id, ahora)
+
+    def esta_escribiendo(self, usuario_id, otro_id, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        return self.almacen.esta_escribiendo(usuario_id, otro_id, ahora)
+
+
+_rastreador = None
+_rastreador_lock = threading.Lock()
+
+
+def presencia():
+    """Rastreador de presencia compartido por todo el proceso"""
+    global _rastreador
+    with _rastreador_lock:
+        if _rastreador is None:
+            almacen = import_string(settings.CHAT_PRESENCIA_BACKEND)(
+                ttl=settings.CHAT_PRESENCIA_TTL,
+                ttl_escribiendo=settings.CHAT_ESCRIBIENDO_TTL,
+            )
+            _rastreador = RastreadorPresencia(almacen, settings.CHAT_PRESENCIA_LATIDO)
+        return _rastreador
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    # Chat en tiempo real (WebSocket)
+    path('ws/chat/<int:user_id>/', consumers.ChatConsumer.as_asgi()),
+]
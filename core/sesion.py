@@ -0,0 +1,144 @@
+import logging
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.contrib.auth.hashers import make_password, verify_password
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+
+from .models import Usuario
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------
+# Sesión propia (usuario_id / usuario_rol) y usuario actual
+# -----------------------------------------------------
+
+def sesion_valida(session, rol=None):
+    """
+    Valida los datos de sesión (usuario_id y rol) sin depender del request.
+    La usan las vistas HTTP y el consumidor WebSocket del chat.
+    """
+    if not session.get('usuario_id'):
+        logger.debug('sesión sin usuario_id')
+        return False
+    
+    if rol and session.get('usuario_rol') != rol:
+        logger.info('rol incorrecto esperado=%s actual=%s', rol, session.get('usuario_rol'))
+        return False
+    
+    logger.debug('sesión válida rol=%s', session.get('usuario_rol'))
+    return True
+
+
+def autenticar_usuario(correo, contrasena):
+    """
+    Verifica correo y contraseña con una sola consulta (perfil y User
+    juntos). Retorna (usuario, error) donde error es None, 'no_registrado',
+    'inactivo' o 'contrasena'. Si el hash guardado usa otro algoritmo o
+    parámetros anteriores a los de PASSWORD_HASHERS, se vuelve a cifrar y
+    se guarda (un UPDATE, solo esa vez).
+    """
+    usuario, error = _buscar_para_login(correo)
+    if error:
+        return usuario, error
+    return usuario, _guardar_verificacion(usuario, *_verificar_contrasena(usuario, contrasena))
+
+
+async def autenticar_usuario_async(correo, contrasena):
+    """
+    autenticar_usuario para vistas asíncronas. Las consultas van por el hilo
+    de las vistas síncronas; el hash (lo costoso del login) se calcula en
+    un hilo aparte, así que no bloquea ese hilo mientras tanto.
+    """
+    usuario, error = await sync_to_async(_buscar_para_login)(correo)
+    if error:
+        return usuario, error
+    verificacion = await sync_to_async(_verificar_contrasena, thread_sensitive=False)(usuario, contrasena)
+    return usuario, await sync_to_async(_guardar_verificacion)(usuario, *verificacion)
+
+
+def _buscar_para_login(correo):
+    usuario = Usuario.objects.select_related('user').filter(Correo=correo).first()
+    if usuario is None:
+        return None, 'no_registrado'
+    if usuario.Estado == 'inactivo':
+        return usuario, 'inactivo'
+    return usuario, None
+
+
+def _verificar_contrasena(usuario, contrasena):
+    """(correcta, hash nuevo o None). Solo cifra, sin consultas"""
+    if usuario.user is None:
+        return False, None
+    correcta, actualizar = verify_password(contrasena, usuario.user.password)
+    return correcta, make_password(contrasena) if correcta and actualizar else None
+
+
+def _guardar_verificacion(usuario, correcta, hash_nuevo):
+    if not correcta:
+        return 'contrasena'
+    if hash_nuevo:
+        usuario.user.password = hash_nuevo
+        usuario.user.save(update_fields=['password'])
+    return None
+
+
+def obtener_usuario(request):
+    """Usuario de la sesión con su User (una consulta), o None"""
+    usuario_id = request.session.get('usuario_id')
+    if not usuario_id:
+        return None
+    return Usuario.objects.select_related('user').filter(idUsuario=usuario_id).first()
+
+
+class UsuarioActualMiddleware:
+    """
+    Agrega request.usuario: el Usuario de la sesión, cargado la primera vez
+    que se usa y reutilizado el resto de la petición. Las páginas que no lo
+    usan no hacen la consulta. Sin sesión (o si el usuario ya no existe) se
+    evalúa como falso. Va después de SessionMiddleware. Admite vistas
+    asíncronas (como login) sin pasarlas a un hilo; ahí no se usa
+    request.usuario, que consulta la base de forma síncrona.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Con get_response asíncrono retorna su corrutina, que espera Django
+        request.usuario = SimpleLazyObject(lambda: obtener_usuario(request))
+        return self.get_response(request)
+
+
+def usuario_o_404(request):
+    """request.usuario o 404 si la sesión apunta a un usuario que ya no existe"""
+    if not request.usuario:
+        raise Http404("Usuario no encontrado")
+    return request.usuario
+
+
+def sesion_requerida(rol=None, mensaje=None, nivel=messages.ERROR):
+    """
+    Decorador de vistas que exige sesión válida y, si se indica, el rol.
+    Con mensaje, la vista es una página: se avisa y se redirige a login.
+    Sin mensaje, es una vista AJAX: se responde con JSON de error.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not sesion_valida(request.session, rol):
+                if mensaje is None:
+                    return JsonResponse({'success': False, 'error': 'No autorizado'})
+                messages.add_message(request, nivel, mensaje)
+                return redirect('login')
+            return vista(request, *args, **kwargs)
+        return envoltura
+    return decorador
@@ -1,6 +1,17 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import Usuario
+from .models import (
+    Usuario, Curso, Inscripcion, Clase, ReciboPago, ContenidoEducativo, Evaluacion,
+    ResultadoEvaluacion, ProfesorCurso, TicketSoporte, Chat, Conversation, Mensaje, Estadistica
+)
+from .busqueda import motor_busqueda
+from .catalogo import invalidar_catalogo, invalidar_detalle_cursos
+from .paneles import (
+    PANEL_ADMIN, invalidar_paneles, paneles_del_curso, paneles_de_profesores_del_alumno
+)
+from .notifier import difundir_mensaje
+from .motor_sesiones import sesiones_de, eliminar_sesiones, revocar_sesiones
 
 @receiver(post_save, sender=Usuario)
 def sincronizar_email(sender, instance, created, **kwargs):
@@ -12,4 +23,227 @@ def sincronizar_email(sender, instance, created, **kwargs):
         # Solo actualizar si el email cambió
         if instance.user.email != instance.Correo:
             instance.user.email = instance.Correo
-            instance.user.save(update_fields=['email'])
\ No newline at end of file
+            instance.user.save(update_fields=['email'])
+
+
+@receiver(post_save, sender=Usuario)
+def revocar_sesiones_inactivo(sender, instance, update_fields=None, **kwargs):
+    """Al desactivar una cuenta se cierran todas sus sesiones abiertas"""
+    if update_fields is not None and 'Estado' not in update_fields:
+        return
+    if instance.Estado == 'inactivo':
+        usuario_id = instance.pk
+        transaction.on_commit(lambda: revocar_sesiones(usuario_id))
+
+
+@receiver(pre_delete, sender=Usuario)
+def revocar_sesiones_eliminado(sender, instance, **kwargs):
+    # Las claves se leen antes de que el borrado en cascada vacíe el índice
+    claves = sesiones_de(instance.pk)
+    transaction.on_commit(lambda: eliminar_sesiones(claves))
+
+
+@receiver(post_save, sender=Chat)
+def actualizar_conversacion(sender, instance, created, **kwargs):
+    """
+    Mantiene el resumen de la conversación (último mensaje y
+    contadores de no leídos) cada vez que se crea un mensaje
+    """
+    if created:
+        Conversation.registrar_mensaje(instance)
+
+
+@receiver(post_save, sender=Chat)
+def notificar_mensaje(sender, instance, created, **kwargs):
+    """
+    Entrega el mensaje en tiempo real (long-polling y WebSocket)
+    una vez confirmada la transacción
+    """
+    if created:
+        transaction.on_commit(lambda: difundir_mensaje(instance))
+
+
+@receiver(post_save, sender=Chat)
+@receiver(post_save, sender=Mensaje)
+def reindexar_busqueda(sender, instance, created, **kwargs):
+    """
+    Reindexa en la búsqueda los mensajes editados.
+    Los mensajes nuevos se incorporan solos en la siguiente búsqueda.
+    """
+    if created:
+        return
+    if sender is Chat:
+        motor_busqueda().actualizar(
+            'chat', instance.id, (instance.sender_id, instance.receiver_id), instance.message
+        )
+    else:
+        motor_busqueda().actualizar(
+            'mensaje', instance.idMensaje, (instance.Remitente_id, instance.Destinatario_id), instance.Contenido
+        )
+
+
+@receiver(post_delete, sender=Chat)
+@receiver(post_delete, sender=Mensaje)
+def quitar_de_busqueda(sender, instance, **kwargs):
+    """Quita de la búsqueda los mensajes eliminados"""
+    if sender is Chat:
+        motor_busqueda().eliminar('chat', instance.id)
+    else:
+        motor_busqueda().eliminar('mensaje', instance.idMensaje)
+
+
+# -----------------------------------------------------
+# Estadísticas del panel administrativo (incrementos)
+# -----------------------------------------------------
+
+# Contadores de filas: modelo -> clave en Estadistica
+CONTADORES_TOTALES = {
+    Usuario: 'total_usuarios',
+    Curso: 'total_cursos',
+}
+
+# Contadores por estado: modelo -> (campo, valor contado, clave en Estadistica)
+CONTADORES_POR_ESTADO = {
+    Inscripcion: ('Estado', 'activa', 'total_inscripciones'),
+    ReciboPago: ('Estado_pago', 'pendiente', 'pagos_pendientes'),
+}
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=Curso)
+def contar_creado(sender, instance, created, **kwargs):
+    if created:
+        Estadistica.sumar(CONTADORES_TOTALES[sender], 1)
+
+
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=Curso)
+def descontar_eliminado(sender, instance, **kwargs):
+    Estadistica.sumar(CONTADORES_TOTALES[sender], -1)
+
+
+# Estado no cargado todavía (el campo se difirió con only()/defer())
+DIFERIDO = object()
+
+
+@receiver(post_init, sender=Inscripcion)
+@receiver(post_init, sender=ReciboPago)
+def recordar_estado(sender, instance, **kwargs):
+    """Guarda el estado con el que se cargó la fila para calcular el cambio al guardar"""
+    campo = CONTADORES_POR_ESTADO[sender][0]
+    # __dict__ evita una consulta extra si el campo fue diferido
+    instance._estado_contado = instance.__dict__.get(campo, DIFERIDO)
+
+
+@receiver(pre_save, sender=Inscripcion)
+@receiver(pre_save, sender=ReciboPago)
+@receiver(pre_delete, sender=Inscripcion)
+@receiver(pre_delete, sender=ReciboPago)
+def cargar_estado_diferido(sender, instance, **kwargs):
+    """Lee el estado guardado si se difirió, antes de que el cambio lo pise"""
+    if instance._estado_contado is DIFERIDO and not instance._state.adding:
+        campo = CONTADORES_POR_ESTADO[sender][0]
+        instance._estado_contado = sender._base_manager.filter(
+            pk=instance.pk
+        ).values_list(campo, flat=True).first()
+
+
+@receiver(post_save, sender=Inscripcion)
+@receiver(post_save, sender=ReciboPago)
+def contar_cambio_estado(sender, instance, created, **kwargs):
+    """Suma o resta según la fila entre o salga del estado contado"""
+    campo, contado, clave = CONTADORES_POR_ESTADO[sender]
+    antes = None if created else instance._estado_contado
+    ahora = getattr(instance, campo)
+    Estadistica.sumar(clave, (ahora == contado) - (antes == contado))
+    instance._estado_contado = ahora
+
+
+@receiver(post_delete, sender=Inscripcion)
+@receiver(post_delete, sender=ReciboPago)
+def descontar_estado_eliminado(sender, instance, **kwargs):
+    campo, contado, clave = CONTADORES_POR_ESTADO[sender]
+    if instance._estado_contado == contado:
+        Estadistica.sumar(clave, -1)
+
+
+# -----------------------------------------------------
+# Caché de los paneles (invalidación por versión)
+# -----------------------------------------------------
+
+def paneles_afectados(instance):
+    """Paneles (usuarios y el administrativo) que muestran datos de la instancia"""
+    if isinstance(instance, Inscripcion):
+        return {instance.idUsuario_id, PANEL_ADMIN} | set(
+            ProfesorCurso.objects.filter(idCurso_id=instance.idCurso_id).values_list('idProfesor_id', flat=True)
+        )
+    if isinstance(instance, (Clase, Evaluacion)):
+        return paneles_del_curso(instance.idCurso_id)
+    if isinstance(instance, ResultadoEvaluacion):
+        return {instance.idUsuario_id}
+    if isinstance(instance, ReciboPago):
+        return {instance.idUsuario_id, PANEL_ADMIN}
+    if isinstance(instance, ContenidoEducativo):
+        return {instance.Subido_por_id, PANEL_ADMIN}
+    if isinstance(instance, Curso):
+        return paneles_del_curso(instance.pk) | {PANEL_ADMIN}
+    if isinstance(instance, ProfesorCurso):
+        return {instance.idProfesor_id}
+    if isinstance(instance, Usuario):
+        return {instance.pk, PANEL_ADMIN} | paneles_de_profesores_del_alumno(instance.pk)
+    return {PANEL_ADMIN}
+
+
+@receiver(post_save, sender=Inscripcion)
+@receiver(post_save, sender=Clase)
+@receiver(post_save, sender=ResultadoEvaluacion)
+@receiver(post_save, sender=ReciboPago)
+@receiver(post_save, sender=ContenidoEducativo)
+@receiver(post_save, sender=Evaluacion)
+@receiver(post_save, sender=Curso)
+@receiver(post_save, sender=ProfesorCurso)
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=TicketSoporte)
+@receiver(post_delete, sender=Inscripcion)
+@receiver(post_delete, sender=Clase)
+@receiver(post_delete, sender=ResultadoEvaluacion)
+@receiver(post_delete, sender=ReciboPago)
+@receiver(post_delete, sender=ContenidoEducativo)
+@receiver(post_delete, sender=Evaluacion)
+@receiver(post_delete, sender=Curso)
+@receiver(post_delete, sender=ProfesorCurso)
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=TicketSoporte)
+def invalidar_cache_paneles(sender, instance, **kwargs):
+    """
+    Renueva la versión de los paneles afectados cuando se confirma la
+    transacción, para que ninguna lectura posterior vea datos anteriores
+    """
+    paneles = paneles_afectados(instance)
+    paneles.discard(None)
+    transaction.on_commit(lambda: invalidar_paneles(paneles))
+
+
+# -----------------------------------------------------
+# Caché del catálogo público y del detalle de los cursos
+# -----------------------------------------------------
+
+@receiver(post_save, sender=Curso)
+@receiver(post_save, sender=Clase)
+@receiver(post_delete, sender=Curso)
+@receiver(post_delete, sender=Clase)
+def invalidar_cache_catalogo(sender, instance, **kwargs):
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(post_save, sender=Curso)
+@receiver(post_save, sender=Clase)
+@receiver(post_save, sender=ContenidoEducativo)
+@receiver(post_save, sender=Evaluacion)
+@receiver(post_delete, sender=Curso)
+@receiver(post_delete, sender=Clase)
+@receiver(post_delete, sender=ContenidoEducativo)
+@receiver(post_delete, sender=Evaluacion)
+def invalidar_cache_detalle_curso(sender, instance, **kwargs):
+    curso_id = instance.pk if isinstance(instance, Curso) else instance.idCurso_id
+    transaction.on_commit(lambda: invalidar_detalle_cursos([curso_id]))
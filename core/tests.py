@@ -1,3 +1,1204 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import MD5PasswordHasher, make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from academia.asgi import application
+from core import admin as core_admin, busqueda
+from core.bitacora import (
+    ColaCore, ContextoBitacoraMiddleware, ContextoSolicitud, MuestreoPorNivel,
+    activar_depuracion, iniciar_cola
+)
+from core.cache_versiones import clave_version
+from core.catalogo import catalogo_por_idioma, detalle_de_curso, espacio_curso
+from core.models import (
+    Usuario, Chat, Conversation, Mensaje, Curso, Clase, Inscripcion, ReciboPago, Estadistica,
+    ContenidoEducativo, ProfesorCurso, SesionUsuario, TicketSoporte, UsuarioDepurado
+)
+from core.paneles import PANEL_ADMIN, version_panel
+from core.presencia import PresenciaEnCache, PresenciaEnMemoria, RastreadorPresencia
+from core.sesion import autenticar_usuario
+from core.views import (
+    cursor_de, cursor_usuario, leer_cursor, pagina_historial, pagina_usuarios, proximas_clases_estudiante,
+    render_seccion
+)
+
+
+def crear_usuario(correo, rol='estudiante', contrasena='clave123'):
+    user = User.objects.create_user(username=correo, email=correo, password=contrasena)
+    return Usuario.objects.create(
+        user=user, Nombres=rol.capitalize(), Apellidos='Prueba', Correo=correo, Rol=rol
+    )
+
+
+def crear_curso(nombre='Inglés - A1', nivel='A1'):
+    return Curso.objects.create(Nombre=nombre, Nivel_mcerl=nivel, Modalidad='sincrónica')
+
+
+def crear_clase(curso, dias):
+    return Clase.objects.create(
+        idCurso=curso, Fecha_hora=timezone.now() + timedelta(days=dias),
+        Enlace_clase='https://clase.test', Tipo='sincrónica', Material_asociado='guia.pdf'
+    )
+
+
+def iniciar_sesion(client, usuario):
+    """Sesión de la aplicación (usuario_id y rol) en el cliente de pruebas"""
+    session = client.session
+    session['usuario_id'] = usuario.idUsuario
+    session['usuario_rol'] = usuario.Rol
+    session.save()
+    return client
+
+
+class BandejaChatTests(TestCase):
+    """Bandeja de conversaciones de chat_list, paginada y sin consultas por fila"""
+
+    def setUp(self):
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.contactos = [crear_usuario(f'contacto{n}@test.com', 'profesor') for n in range(25)]
+        for contacto in self.contactos:
+            Chat.objects.create(sender=contacto, receiver=self.estudiante, message=f'Hola {contacto.Correo}')
+        self.administrador = crear_usuario('admin@test.com', 'admin')
+        Chat.objects.create(sender=self.administrador, receiver=self.estudiante, message='Aviso')
+        self.inactivo = crear_usuario('inactivo@test.com')
+        Chat.objects.create(sender=self.inactivo, receiver=self.estudiante, message='Hola')
+        Usuario.objects.filter(pk=self.inactivo.pk).update(Estado='inactivo')
+        iniciar_sesion(self.client, self.estudiante)
+
+    def contrapartes(self, respuesta):
+        return [c['usuario'].idUsuario for c in respuesta.context['conversaciones']]
+
+    def test_paginas_sin_admins_ni_inactivos(self):
+        primera = self.client.get(reverse('chat_list'))
+        segunda = self.client.get(reverse('chat_list'), {'page': 2})
+
+        vistos = self.contrapartes(primera) + self.contrapartes(segunda)
+        self.assertEqual(len(self.contrapartes(primera)), 20)
+        # De la más reciente a la más antigua, sin repetir entre páginas
+        self.assertEqual(vistos, [c.idUsuario for c in reversed(self.contactos)])
+        self.assertFalse(segunda.context['pagina'].has_next())
+        conversacion = primera.context['conversaciones'][0]
+        self.assertEqual(conversacion['unread_count'], 1)
+        self.assertEqual(conversacion['ultimo_mensaje'].message, f'Hola {self.contactos[-1].Correo}')
+
+    def test_consultas_fijas_por_pagina(self):
+        # La primera petición del proceso también lee los usuarios en depuración
+        self.client.get(reverse('chat_list'))
+        # Sesión, usuario, COUNT, página (con contrapartes y último mensaje) y no leídos
+        with self.assertNumQueries(5):
+            self.client.get(reverse('chat_list'))
+        with self.assertNumQueries(5):
+            self.client.get(reverse('chat_list'), {'page': 2})
+
+class ConversacionesTests(TestCase):
+    """Resumen de Conversation: contadores, último mensaje y reconstrucción"""
+
+    def setUp(self):
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+        self.otro = crear_usuario('otro@test.com')
+
+    def escribir(self, emisor, receptor, texto='hola'):
+        return Chat.objects.create(sender=emisor, receiver=receptor, message=texto)
+
+    def conversacion(self, usuario, otro):
+        user_a, user_b = Conversation.pareja(usuario.idUsuario, otro.idUsuario)
+        return Conversation.objects.get(user_a_id=user_a, user_b_id=user_b)
+
+    def test_contadores_de_no_leidos(self):
+        self.escribir(self.estudiante, self.profesor)
+        self.escribir(self.estudiante, self.profesor)
+        ultimo = self.escribir(self.profesor, self.estudiante)
+
+        conversacion = self.conversacion(self.estudiante, self.profesor)
+        self.assertEqual(conversacion.no_leidos_de(self.profesor.idUsuario), 2)
+        self.assertEqual(conversacion.no_leidos_de(self.estudiante.idUsuario), 1)
+        self.assertEqual(conversacion.last_message_id, ultimo.id)
+
+        self.assertEqual(Conversation.marcar_leidos(self.profesor.idUsuario, self.estudiante.idUsuario), 1)
+        self.assertEqual(Chat.objects.filter(receiver=self.profesor, is_read=False).count(), 0)
+        self.assertEqual(Chat.objects.filter(receiver=self.estudiante, is_read=False).count(), 1)
+        conversacion.refresh_from_db()
+        self.assertEqual(conversacion.no_leidos_de(self.profesor.idUsuario), 0)
+        self.assertEqual(conversacion.no_leidos_de(self.estudiante.idUsuario), 1)
+
+        # Sin pendientes no escribe
+        with self.assertNumQueries(1):
+            self.assertEqual(Conversation.marcar_leidos(self.profesor.idUsuario, self.estudiante.idUsuario), 0)
+
+    def test_ultimo_mensaje_no_retrocede(self):
+        anterior = self.escribir(self.estudiante, self.profesor, 'primero')
+        posterior = self.escribir(self.estudiante, self.profesor, 'segundo')
+        # Registro tardío del mensaje anterior (p. ej. otra transacción)
+        Conversation.registrar_mensaje(anterior)
+
+        conversacion = self.conversacion(self.estudiante, self.profesor)
+        self.assertEqual(conversacion.last_message_id, posterior.id)
+        self.assertEqual(conversacion.last_timestamp, posterior.timestamp)
+        self.assertEqual(conversacion.no_leidos_de(self.profesor.idUsuario), 3)
+
+    def test_reconstruir_corrige_el_resumen(self):
+        self.escribir(self.estudiante, self.profesor)
+        ultimo = self.escribir(self.profesor, self.estudiante)
+        self.escribir(self.otro, self.profesor)
+        # Un resumen desfasado deja los mensajes sin leer para siempre
+        Conversation.objects.update(unread_a=0, unread_b=0, last_message=None, last_timestamp=None)
+        self.assertEqual(Conversation.marcar_leidos(self.profesor.idUsuario, self.estudiante.idUsuario), 0)
+
+        salida = io.StringIO()
+        call_command('reconstruir_conversaciones', batch_size=1, stdout=salida)
+        self.assertIn('2 conversaciones', salida.getvalue())
+
+        conversacion = self.conversacion(self.estudiante, self.profesor)
+        self.assertEqual(conversacion.last_message_id, ultimo.id)
+        self.assertEqual(conversacion.no_leidos_de(self.profesor.idUsuario), 1)
+        self.assertEqual(conversacion.no_leidos_de(self.estudiante.idUsuario), 1)
+        self.assertEqual(Conversation.marcar_leidos(self.profesor.idUsuario, self.estudiante.idUsuario), 1)
+        self.assertFalse(Chat.objects.filter(receiver=self.profesor, sender=self.estudiante, is_read=False).exists())
+
+    def test_migracion_crea_solo_las_parejas_faltantes(self):
+        self.escribir(self.estudiante, self.profesor)
+        ultimo = self.escribir(self.otro, self.profesor)
+        # Historial anterior al resumen: una pareja sin fila y otra con la suya
+        self.conversacion(self.otro, self.profesor).delete()
+        Conversation.objects.update(unread_a=7, unread_b=7)
+
+        importlib.import_module('core.migrations.0015_poblar_conversaciones').poblar(django_apps, None)
+
+        self.assertEqual(Conversation.objects.count(), 2)
+        nueva = self.conversacion(self.otro, self.profesor)
+        self.assertEqual(nueva.last_message_id, ultimo.id)
+        self.assertEqual(nueva.no_leidos_de(self.profesor.idUsuario), 1)
+        self.assertEqual(nueva.no_leidos_de(self.otro.idUsuario), 0)
+        # La existente no se toca
+        self.assertEqual(self.conversacion(self.estudiante, self.profesor).unread_a, 7)
+
+class ChatWebSocketTests(TransactionTestCase):
+    """Chat por WebSocket probado en proceso contra la aplicación ASGI"""
+
+    def setUp(self):
+        self.estudiante = self.crear_usuario('estudiante@test.com', 'estudiante')
+        self.profesor = self.crear_usuario('profesor@test.com', 'profesor')
+
+    def crear_usuario(self, correo, rol):
+        return crear_usuario(correo, rol)
+
+    def crear_sesion(self, usuario):
+        session = SessionStore()
+        session['usuario_id'] = usuario.idUsuario
+        session['usuario_rol'] = usuario.Rol
+        session.create()
+        return session.session_key
+
+    def comunicador(self, usuario, otro, session_key=None):
+        if session_key is None:
+            session_key = self.crear_sesion(usuario)
+        return WebsocketCommunicator(
+            application,
+            f'/ws/chat/{otro.idUsuario}/',
+            headers=[
+                (b'cookie', f'sessionid={session_key}'.encode()),
+                (b'origin', b'http://testserver'),
+            ],
+        )
+
+    async def test_rechaza_conexion_sin_sesion(self):
+        comunicador = WebsocketCommunicator(
+            application,
+            f'/ws/chat/{self.profesor.idUsuario}/',
+            headers=[(b'origin', b'http://testserver')],
+        )
+        conectado, _ = await comunicador.connect()
+        self.assertFalse(conectado)
+
+    async def test_mensaje_llega_a_ambos_participantes(self):
+        emisor = self.comunicador(self.estudiante, self.profesor,
+                                  await sync_to_async(self.crear_sesion)(self.estudiante))
+        receptor = self.comunicador(self.profesor, self.estudiante,
+                                    await sync_to_async(self.crear_sesion)(self.profesor))
+        self.assertTrue((await emisor.connect())[0])
+        self.assertTrue((await receptor.connect())[0])
+
+        inicio = time.perf_counter()
+        await emisor.send_json_to({'type': 'message', 'message': 'Hola profesor'})
+        recibido = await receptor.receive_json_from(timeout=2)
+        latencia = time.perf_counter() - inicio
+        eco = await emisor.receive_json_from(timeout=2)
+
+        self.assertEqual(recibido['type'], 'message')
+        self.assertEqual(recibido['message']['text'], 'Hola profesor')
+        self.assertFalse(recibido['message']['is_mine'])
+        self.assertTrue(eco['message']['is_mine'])
+        self.assertLess(latencia, 1)
+
+        # Confirmación de lectura para ambos participantes
+        await receptor.send_json_to({'type': 'read'})
+        self.assertEqual((await emisor.receive_json_from(timeout=2))['type'], 'read')
+        self.assertEqual((await receptor.receive_json_from(timeout=2))['type'], 'read')
+
+        chat = await sync_to_async(Chat.objects.get)()
+        self.assertTrue(chat.is_read)
+        conversacion = await sync_to_async(Conversation.objects.get)()
+        self.assertEqual(conversacion.last_message_id, chat.id)
+        self.assertEqual(conversacion.unread_a + conversacion.unread_b, 0)
+
+        await emisor.disconnect()
+        await receptor.disconnect()
+
+    async def test_difusion_a_muchas_conexiones(self):
+        session_key = await sync_to_async(self.crear_sesion)(self.profesor)
+        conexiones = [self.comunicador(self.profesor, self.estudiante, session_key) for _ in range(50)]
+        for conexion in conexiones:
+            self.assertTrue((await conexion.connect())[0])
+
+        await sync_to_async(Chat.objects.create)(
+            sender=self.estudiante, receiver=self.profesor, message='Aviso'
+        )
+        for conexion in conexiones:
+            evento = await conexion.receive_json_from(timeout=2)
+            self.assertEqual(evento['message']['text'], 'Aviso')
+            await conexion.disconnect()
+
+
+@override_settings(CHAT_MENSAJES_POR_PAGINA=3)
+class HistorialChatTests(TestCase):
+    """Historial del chat paginado con el cursor (timestamp, id)"""
+
+    def setUp(self):
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+        self.ids = [
+            Chat.objects.create(sender=self.estudiante, receiver=self.profesor, message=f'm{n}').id
+            for n in range(7)
+        ]
+        # Mismo timestamp en todos: el id desempata en el límite de cada página
+        Chat.objects.update(timestamp=Chat.objects.first().timestamp)
+        iniciar_sesion(self.client, self.estudiante)
+
+    def test_recorre_todo_sin_repetir_con_timestamps_iguales(self):
+        mensajes, hay_mas = pagina_historial(self.estudiante.idUsuario, self.profesor.idUsuario)
+        vistos = [m.id for m in mensajes]
+        self.assertEqual(vistos, self.ids[-3:])
+        cursor = cursor_de(mensajes[0])
+
+        while hay_mas:
+            datos = self.client.get(
+                reverse('historial_mensajes', args=[self.profesor.idUsuario]), {'before': cursor}
+            ).json()
+            self.assertTrue(datos['success'])
+            vistos = [m['id'] for m in datos['messages']] + vistos
+            cursor, hay_mas = datos['cursor'], datos['has_more']
+
+        self.assertEqual(vistos, self.ids)
+
+    def test_cursor_invalido(self):
+        datos = self.client.get(
+            reverse('historial_mensajes', args=[self.profesor.idUsuario]), {'before': 'x'}
+        ).json()
+        self.assertFalse(datos['success'])
+
+
+class AuditoriaChatTests(TestCase):
+    """Los índices compuestos de Chat cubren las consultas del chat"""
+
+    def test_consultas_del_chat_usan_indices(self):
+        salida = io.StringIO()
+        # --strict falla si alguna consulta recorre la tabla completa
+        call_command('auditar_consultas_chat', seed=500, strict=True, stdout=salida)
+        self.assertTrue(salida.getvalue())
+        # Los datos sembrados se revierten
+        self.assertFalse(Chat.objects.exists())
+        self.assertFalse(Usuario.objects.exists())
+
+
+class SincronizacionChatTests(TestCase):
+    """get_messages devuelve solo el delta y no escribe si nada cambió"""
+
+    def setUp(self):
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+        self.viejo = Chat.objects.create(sender=self.profesor, receiver=self.estudiante, message='viejo')
+        self.nuevo = Chat.objects.create(sender=self.profesor, receiver=self.estudiante, message='nuevo')
+        iniciar_sesion(self.client, self.estudiante)
+        self.url = reverse('get_messages', args=[self.profesor.idUsuario])
+
+    def test_delta_y_lectura(self):
+        respuesta = self.client.get(self.url, {'last_id': self.viejo.id})
+        self.assertEqual([m['id'] for m in respuesta.json()['messages']], [self.nuevo.id])
+        self.assertFalse(Chat.objects.filter(is_read=False).exists())
+        self.assertEqual(Conversation.total_no_leidos(self.estudiante.idUsuario), 0)
+
+    def test_sin_cambios_responde_304_sin_escrituras(self):
+        etag = self.client.get(self.url, {'last_id': self.nuevo.id})['ETag']
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(
+                self.url, {'last_id': self.nuevo.id}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertFalse([q for q in consultas.captured_queries if not q['sql'].startswith('SELECT')])
+
+        # Un mensaje nuevo cambia el ETag
+        Chat.objects.create(sender=self.profesor, receiver=self.estudiante, message='otro')
+        respuesta = self.client.get(self.url, {'last_id': self.nuevo.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['messages']), 1)
+
+
+    @override_settings(CHAT_LONG_POLL_TIMEOUT=0.1)
+    def test_long_polling_acota_el_timeout(self):
+        url = reverse('esperar_mensajes', args=[self.profesor.idUsuario])
+        for timeout in ['nan', 'inf', '-1', '0', 'abc', '60']:
+            inicio = time.perf_counter()
+            respuesta = self.client.get(url, {'last_id': self.nuevo.id, 'timeout': timeout})
+            self.assertEqual(respuesta.json(), {'success': True, 'messages': []})
+            self.assertLess(time.perf_counter() - inicio, 1, timeout)
+
+
+class DifusionCursoTests(TestCase):
+    """Mensaje del profesor a todos los estudiantes activos de un curso"""
+
+    def setUp(self):
+        # Un estudiante con id menor y otro mayor que el profesor: cubre
+        # ambos lados de la pareja (user_a, user_b) de Conversation
+        self.menor = crear_usuario('menor@test.com')
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+        self.mayor = crear_usuario('mayor@test.com')
+        self.curso = crear_curso()
+        ProfesorCurso.objects.create(idProfesor=self.profesor, idCurso=self.curso)
+        for estudiante in (self.menor, self.mayor):
+            Inscripcion.objects.create(idUsuario=estudiante, idCurso=self.curso)
+        iniciar_sesion(self.client, self.profesor)
+
+    def difundir(self, curso=None, mensaje='Mañana no hay clase'):
+        curso = curso or self.curso
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('difundir_mensaje_curso', args=[curso.idCurso]), {'message': mensaje}
+            ).json()
+
+    def inscribir(self, curso, cantidad, prefijo):
+        for n in range(cantidad):
+            Inscripcion.objects.create(idUsuario=crear_usuario(f'{prefijo}{n}@test.com'), idCurso=curso)
+
+    def assertResumenes(self, receptores, no_leidos=1):
+        for receptor in receptores:
+            chat = Chat.objects.filter(sender=self.profesor, receiver=receptor).latest('id')
+            user_a, user_b = Conversation.pareja(self.profesor.idUsuario, receptor.idUsuario)
+            conversacion = Conversation.objects.get(user_a_id=user_a, user_b_id=user_b)
+            self.assertEqual(conversacion.last_message_id, chat.id)
+            self.assertEqual(conversacion.no_leidos_de(receptor.idUsuario), no_leidos)
+            self.assertEqual(conversacion.no_leidos_de(self.profesor.idUsuario), 0)
+
+    def test_solo_estudiantes_activos_del_curso(self):
+        cancelado = crear_usuario('cancelado@test.com')
+        Inscripcion.objects.create(idUsuario=cancelado, idCurso=self.curso, Estado='cancelada')
+        inactivo = crear_usuario('inactivo@test.com')
+        Usuario.objects.filter(pk=inactivo.pk).update(Estado='inactivo')
+        Inscripcion.objects.create(idUsuario=inactivo, idCurso=self.curso)
+        self.inscribir(crear_curso('Francés - A1'), 1, 'ajeno')
+
+        self.assertEqual(self.difundir(), {'success': True, 'enviados': 2})
+        self.assertEqual(
+            sorted(Chat.objects.values_list('receiver_id', flat=True)),
+            [self.menor.idUsuario, self.mayor.idUsuario]
+        )
+
+    def test_actualiza_no_leidos_y_ultimo_mensaje(self):
+        # Conversación previa con el menor (se actualiza) y ninguna con el mayor (se crea)
+        Chat.objects.create(sender=self.menor, receiver=self.profesor, message='Hola')
+        Conversation.marcar_leidos(self.profesor.idUsuario, self.menor.idUsuario)
+
+        self.difundir()
+        self.assertResumenes([self.menor, self.mayor])
+        self.difundir(mensaje='Recuerden la tarea')
+        self.assertResumenes([self.menor, self.mayor], no_leidos=2)
+
+    def test_rechaza_profesor_no_asignado(self):
+        otro_curso = crear_curso('Francés - A1')
+        self.inscribir(otro_curso, 1, 'frances')
+        datos = self.difundir(otro_curso)
+        self.assertFalse(datos['success'])
+        self.assertFalse(Chat.objects.exists())
+
+    def test_sin_ids_de_bulk_create(self):
+        # Como en MySQL: bulk_create no devuelve los ids
+        caracteristicas = type(connection.features)
+        self.addCleanup(setattr, caracteristicas, 'can_return_rows_from_bulk_insert',
+                        caracteristicas.can_return_rows_from_bulk_insert)
+        caracteristicas.can_return_rows_from_bulk_insert = False
+        # Un mensaje anterior con el mismo texto no se confunde con los nuevos
+        Chat.objects.create(sender=self.profesor, receiver=self.menor, message='Mañana no hay clase')
+        Conversation.marcar_leidos(self.menor.idUsuario, self.profesor.idUsuario)
+
+        self.assertEqual(self.difundir(), {'success': True, 'enviados': 2})
+        self.assertEqual(Chat.objects.filter(receiver=self.menor).count(), 2)
+        self.assertResumenes([self.menor, self.mayor])
+
+    def test_consultas_no_crecen_con_el_curso(self):
+        grande = crear_curso('Francés - A1')
+        ProfesorCurso.objects.create(idProfesor=self.profesor, idCurso=grande)
+        # También con estudiantes a ambos lados de la pareja, como el curso pequeño
+        Inscripcion.objects.create(idUsuario=self.menor, idCurso=grande)
+        self.inscribir(grande, 20, 'frances')
+
+        with CaptureQueriesContext(connection) as pequeno:
+            self.difundir()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.difundir(grande)['enviados'], 21)
+        self.assertEqual(len(consultas), len(pequeno))
+
+class BusquedaMensajesTests(TestCase):
+    """Búsqueda de texto en Chat y Mensaje (índice en memoria con SQLite)"""
+
+    def setUp(self):
+        # El índice en memoria es del proceso: cada prueba parte de uno vacío
+        busqueda._motor = None
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+        self.otro = crear_usuario('otro@test.com')
+        self.chat = Chat.objects.create(
+            sender=self.profesor, receiver=self.estudiante, message='La evaluación de matemáticas es el lunes'
+        )
+        self.mensaje = Mensaje.objects.create(
+            Remitente=self.estudiante, Destinatario=self.profesor, Contenido='Tarea de Matemáticas lista'
+        )
+        self.ajeno = Mensaje.objects.create(
+            Remitente=self.otro, Destinatario=self.profesor, Contenido='Dudas de matemáticas'
+        )
+
+    def test_busca_sin_tildes_solo_en_mensajes_propios(self):
+        iniciar_sesion(self.client, self.estudiante)
+        datos = self.client.get(reverse('buscar_mensajes'), {'q': 'matematicas'}).json()
+        encontrados = {(r['type'], r['id']) for r in datos['results']}
+        self.assertEqual(encontrados, {('chat', self.chat.id), ('mensaje', self.mensaje.idMensaje)})
+
+    def test_admin_respeta_los_filtros_del_listado(self):
+        modelo_admin = admin.site._registry[Mensaje]
+        queryset = Mensaje.objects.filter(Remitente=self.estudiante)
+        resultados, _ = modelo_admin.get_search_results(None, queryset, 'matematicas')
+        self.assertEqual(list(resultados), [self.mensaje])
+
+
+    def test_busca_solo_los_tipos_pedidos(self):
+        motor = busqueda.motor_busqueda()
+        resultados = motor.buscar(None, 'matematicas', 10, tipos=('mensaje',))
+        self.assertEqual({tipo for tipo, _, _ in resultados}, {'mensaje'})
+        self.assertEqual(len(resultados), 2)
+        # Los chats ni siquiera se cargan en el índice
+        self.assertFalse([clave for clave in motor._documentos if clave[0] == 'chat'])
+
+    def test_admin_avisa_si_recorta_los_resultados(self):
+        self.addCleanup(setattr, core_admin, 'LIMITE_BUSQUEDA_ADMIN', core_admin.LIMITE_BUSQUEDA_ADMIN)
+        self.client.force_login(User.objects.create_superuser('root', 'root@test.com', 'clave123'))
+        url = reverse('admin:core_mensaje_changelist')
+
+        core_admin.LIMITE_BUSQUEDA_ADMIN = 1
+        respuesta = self.client.get(url, {'q': 'matematicas'})
+        self.assertEqual(respuesta.context['cl'].result_count, 1)
+        avisos = [str(m) for m in respuesta.context['messages']]
+        self.assertEqual(len(avisos), 1)
+        self.assertIn('los 1 mensajes más relevantes', avisos[0])
+
+        core_admin.LIMITE_BUSQUEDA_ADMIN = 2
+        respuesta = self.client.get(url, {'q': 'matematicas'})
+        self.assertEqual(respuesta.context['cl'].result_count, 2)
+        self.assertFalse(list(respuesta.context['messages']))
+
+class AlmacenContado(PresenciaEnMemoria):
+    """PresenciaEnMemoria que cuenta las escrituras de latidos"""
+
+    def __init__(self, ttl, ttl_escribiendo):
+        super().__init__(ttl, ttl_escribiendo)
+        self.escrituras = 0
+
+    def marcar_visto(self, usuario_id, ahora):
+        self.escrituras += 1
+        super().marcar_visto(usuario_id, ahora)
+
+
+class PresenciaTests(TestCase):
+    """Latidos agrupados por intervalo y caducidad de la presencia (reloj fijo)"""
+
+    def setUp(self):
+        self.almacen = AlmacenContado(ttl=60, ttl_escribiendo=5)
+        self.rastreador = RastreadorPresencia(self.almacen, intervalo=20)
+
+    def test_un_latido_por_intervalo(self):
+        inicio = 1000.0
+        escritos = [self.rastreador.latido(1, inicio + segundo) for segundo in range(0, 45, 5)]
+        # Se escribe en 0, 20 y 40 segundos; el resto se agrupa
+        self.assertEqual(escritos, [True, False, False, False, True, False, False, False, True])
+        self.assertEqual(self.almacen.escrituras, 3)
+        # Otro usuario tiene su propio intervalo
+        self.assertTrue(self.rastreador.latido(2, inicio + 41))
+
+    def test_presencia_caduca_tras_el_ttl(self):
+        self.rastreador.latido(1, 1000.0)
+        self.rastreador.latido(2, 1030.0)
+        self.assertEqual(self.rastreador.en_linea([1, 2, 3], 1059.0), {1, 2})
+        self.assertEqual(self.rastreador.en_linea([1, 2, 3], 1060.0), {2})
+        self.assertEqual(self.rastreador.en_linea([1, 2, 3], 1090.0), set())
+
+        # La purga también quita las entradas vencidas de memoria
+        self.rastreador.latido(3, 1200.0)
+        self.assertEqual(set(self.almacen._vistos), {3})
+
+    def test_escribiendo_caduca(self):
+        self.rastreador.escribiendo(1, 2, 1000.0)
+        self.assertTrue(self.rastreador.esta_escribiendo(1, 2, 1004.0))
+        self.assertFalse(self.rastreador.esta_escribiendo(2, 1, 1004.0))
+        self.assertFalse(self.rastreador.esta_escribiendo(1, 2, 1005.0))
+
+    def test_almacen_en_cache(self):
+        cache.clear()
+        rastreador = RastreadorPresencia(PresenciaEnCache(ttl=60, ttl_escribiendo=5), intervalo=20)
+        self.assertTrue(rastreador.latido(1, 1000.0))
+        self.assertFalse(rastreador.latido(1, 1010.0))
+        self.assertEqual(rastreador.en_linea([1, 2]), {1})
+        rastreador.escribiendo(1, 2)
+        self.assertTrue(rastreador.esta_escribiendo(1, 2))
+        self.assertFalse(rastreador.esta_escribiendo(2, 1))
+
+class ProximasClasesTests(TestCase):
+    """Próximas clases del estudiante en una consulta con ROW_NUMBER()"""
+
+    def test_por_curso_solo_futuras_de_inscripciones_activas(self):
+        estudiante = crear_usuario('estudiante@test.com')
+        ingles, frances, aleman = crear_curso(), crear_curso('Francés - A1'), crear_curso('Alemán - A1')
+        Inscripcion.objects.create(idUsuario=estudiante, idCurso=ingles)
+        Inscripcion.objects.create(idUsuario=estudiante, idCurso=frances)
+        Inscripcion.objects.create(idUsuario=estudiante, idCurso=aleman, Estado='cancelada')
+
+        crear_clase(ingles, -1)
+        ingles_futuras = [crear_clase(ingles, dias) for dias in (4, 1, 3, 2)]
+        frances_futura = crear_clase(frances, 5)
+        crear_clase(aleman, 1)
+
+        with self.assertNumQueries(1):
+            clases = list(proximas_clases_estudiante(estudiante, por_curso=3))
+
+        esperadas = sorted(ingles_futuras, key=lambda c: c.Fecha_hora)[:3] + [frances_futura]
+        self.assertEqual(clases, esperadas)
+
+
+class UsuariosAdminTests(TestCase):
+    """Tabla de usuarios del panel administrativo paginada en el servidor"""
+
+    def setUp(self):
+        self.admin = crear_usuario('admin@test.com', 'admin')
+        self.usuarios = [crear_usuario(f'alumno{n}@test.com') for n in range(5)]
+        self.profesor = crear_usuario('ana.profesora@test.com', 'profesor')
+        Usuario.objects.update(Fecha_registro=timezone.now())
+
+    def test_paginas_sin_repetir_con_fechas_iguales(self):
+        vistos, cursor, hay_mas = [], None, True
+        while hay_mas:
+            usuarios, hay_mas = pagina_usuarios(cursor=cursor, por_pagina=2)
+            vistos += [u.idUsuario for u in usuarios]
+            cursor = leer_cursor(cursor_usuario(usuarios[-1]))
+        todos = sorted(Usuario.objects.values_list('idUsuario', flat=True), reverse=True)
+        self.assertEqual(vistos, todos)
+
+    def test_busqueda_y_filtros(self):
+        iniciar_sesion(self.client, self.admin)
+        datos = self.client.get(reverse('usuarios_admin'), {'q': 'ana test', 'rol': 'profesor'}).json()
+        self.assertEqual([u['id'] for u in datos['usuarios']], [self.profesor.idUsuario])
+
+        self.usuarios[0].Estado = 'inactivo'
+        self.usuarios[0].save()
+        datos = self.client.get(reverse('usuarios_admin'), {'estado': 'inactivo'}).json()
+        self.assertEqual([u['id'] for u in datos['usuarios']], [self.usuarios[0].idUsuario])
+
+    def test_solo_administradores(self):
+        iniciar_sesion(self.client, self.profesor)
+        datos = self.client.get(reverse('usuarios_admin')).json()
+        self.assertFalse(datos['success'])
+        self.assertNotIn('usuarios', datos)
+
+
+class EstadisticasTests(TestCase):
+    """Contadores del panel administrativo ajustados por señales"""
+
+    def setUp(self):
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.curso = crear_curso()
+        Estadistica.leer()
+
+    def assertContadoresExactos(self):
+        guardados = dict(Estadistica.objects.values_list('clave', 'valor'))
+        exactos = {clave: consulta.count() for clave, consulta in Estadistica.consultas().items()}
+        self.assertEqual(guardados, exactos)
+
+    def test_altas_y_bajas(self):
+        otro = crear_usuario('otro@test.com')
+        otro_curso = crear_curso('Francés - A1')
+        self.assertContadoresExactos()
+        otro.delete()
+        otro_curso.delete()
+        self.assertContadoresExactos()
+
+    def test_cambios_de_estado(self):
+        inscripcion = Inscripcion.objects.create(idUsuario=self.estudiante, idCurso=self.curso)
+        recibo = ReciboPago.objects.create(idUsuario=self.estudiante, Valor=100)
+        self.assertEqual(Estadistica.leer()['total_inscripciones'], 1)
+        self.assertEqual(Estadistica.leer()['pagos_pendientes'], 1)
+
+        inscripcion.Estado = 'cancelada'
+        inscripcion.save()
+        inscripcion.save()
+        recibo.Estado_pago = 'pagado'
+        recibo.save()
+        self.assertContadoresExactos()
+
+        inscripcion.Estado = 'activa'
+        inscripcion.save()
+        self.assertContadoresExactos()
+        inscripcion.delete()
+        self.assertContadoresExactos()
+
+    def test_accion_admin_marcar_como_pagado(self):
+        recibos = [ReciboPago.objects.create(idUsuario=self.estudiante, Valor=100) for _ in range(3)]
+        ReciboPago.objects.filter(pk=recibos[0].pk).update(Estado_pago='pagado')
+        Estadistica.reconciliar()
+        self.assertEqual(Estadistica.leer()['pagos_pendientes'], 2)
+
+        self.client.force_login(User.objects.create_superuser('root', 'root@test.com', 'clave123'))
+        respuesta = self.client.post(reverse('admin:core_recibopago_changelist'), {
+            'action': 'marcar_como_pagado', '_selected_action': [r.pk for r in recibos],
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertFalse(ReciboPago.objects.filter(Estado_pago='pendiente').exists())
+        self.assertContadoresExactos()
+
+    def test_estado_diferido(self):
+        inscripcion = Inscripcion.objects.create(idUsuario=self.estudiante, idCurso=self.curso)
+
+        Inscripcion.objects.only('pk').get(pk=inscripcion.pk).save()
+        self.assertContadoresExactos()
+
+        diferida = Inscripcion.objects.defer('Estado').get(pk=inscripcion.pk)
+        diferida.Estado = 'finalizada'
+        diferida.save(update_fields=['Estado'])
+        self.assertContadoresExactos()
+
+        Inscripcion.objects.defer('Estado').get(pk=inscripcion.pk).delete()
+        self.assertContadoresExactos()
+
+    def test_reconciliar_corrige_cambios_sin_senales(self):
+        Inscripcion.objects.bulk_create([Inscripcion(idUsuario=self.estudiante, idCurso=self.curso)])
+        call_command('reconciliar_estadisticas', stdout=io.StringIO())
+        self.assertContadoresExactos()
+
+
+class CursosConConteosTests(TestCase):
+    """Conteos por curso anotados con subconsultas en una sola consulta"""
+
+    def test_conteos_sin_multiplicar_relaciones(self):
+        profesor = crear_usuario('profesor@test.com', 'profesor')
+        curso, vacio = crear_curso(), crear_curso('Francés - A1')
+        for n in range(3):
+            Inscripcion.objects.create(idUsuario=crear_usuario(f'alumno{n}@test.com'), idCurso=curso)
+        Inscripcion.objects.filter(pk=Inscripcion.objects.first().pk).update(Estado='cancelada')
+        crear_clase(curso, 1)
+        crear_clase(curso, 2)
+        ContenidoEducativo.objects.create(
+            idCurso=curso, Titulo='Guía', Tipo='PDF', Archivo_url='guia.pdf', Subido_por=profesor
+        )
+
+        with self.assertNumQueries(1):
+            cursos = {c.pk: c for c in Curso.objects.with_stats()}
+
+        def conteos(c):
+            return c.total_inscripciones, c.inscripciones_activas, c.total_clases, c.total_contenidos
+
+        self.assertEqual(conteos(cursos[curso.pk]), (3, 2, 2, 1))
+        self.assertEqual(conteos(cursos[vacio.pk]), (0, 0, 0, 0))
+
+
+class PanelProfesorTests(TestCase):
+    """Secciones del panel del profesor a partir de ProfesorCurso"""
+
+    def setUp(self):
+        cache.clear()
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+        self.curso = crear_curso()
+        ProfesorCurso.objects.create(idProfesor=self.profesor, idCurso=self.curso)
+        ajeno = crear_curso('Francés - A1')
+
+        self.activo = crear_usuario('activo@test.com')
+        self.cancelado = crear_usuario('cancelado@test.com')
+        self.de_otro_curso = crear_usuario('ajeno@test.com')
+        Inscripcion.objects.create(idUsuario=self.activo, idCurso=self.curso)
+        Inscripcion.objects.create(idUsuario=self.cancelado, idCurso=self.curso, Estado='cancelada')
+        Inscripcion.objects.create(idUsuario=self.de_otro_curso, idCurso=ajeno)
+        iniciar_sesion(self.client, self.profesor)
+
+    def seccion(self, nombre):
+        return self.client.get(reverse('seccion_panel', args=['profesor', nombre])).json()
+
+    def test_estudiantes_solo_inscripciones_activas_de_sus_cursos(self):
+        datos = self.seccion('estudiantes')
+        self.assertTrue(datos['success'])
+        self.assertIn(self.activo.Correo, datos['html'])
+        self.assertNotIn(self.cancelado.Correo, datos['html'])
+        self.assertNotIn(self.de_otro_curso.Correo, datos['html'])
+
+    def test_consultas_no_crecen_con_los_estudiantes(self):
+        with CaptureQueriesContext(connection) as pocos:
+            self.seccion('estudiantes')
+
+        for n in range(10):
+            Inscripcion.objects.create(idUsuario=crear_usuario(f'alumno{n}@test.com'), idCurso=self.curso)
+        cache.clear()
+        with CaptureQueriesContext(connection) as muchos:
+            self.seccion('estudiantes')
+        self.assertEqual(len(muchos), len(pocos))
+
+
+class CachePanelesTests(TestCase):
+    """Secciones del panel en cache, invalidadas por señales al guardar"""
+
+    def setUp(self):
+        cache.clear()
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.curso = crear_curso()
+        self.inscripcion = Inscripcion.objects.create(idUsuario=self.estudiante, idCurso=self.curso)
+        iniciar_sesion(self.client, self.estudiante)
+        self.url = reverse('seccion_panel', args=['estudiante', 'inscripciones'])
+
+    def consultas_a(self, tabla):
+        with CaptureQueriesContext(connection) as consultas:
+            html = self.client.get(self.url).json()['html']
+        return html, [q for q in consultas.captured_queries if f'"{tabla}"' in q['sql']]
+
+    def test_segunda_lectura_sale_del_cache(self):
+        self.client.get(self.url)
+        html, consultas = self.consultas_a('Inscripcion')
+        self.assertIn('Inglés - A1', html)
+        self.assertEqual(consultas, [])
+
+    def test_guardar_el_curso_invalida_la_seccion(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.curso.Nombre = 'Inglés - A2'
+            self.curso.save()
+        html, consultas = self.consultas_a('Inscripcion')
+        self.assertIn('Inglés - A2', html)
+        self.assertTrue(consultas)
+
+    def test_cancelar_la_inscripcion_invalida_la_seccion(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inscripcion.Estado = 'cancelada'
+            self.inscripcion.save()
+        html, _ = self.consultas_a('Inscripcion')
+        self.assertNotIn('Inglés - A1', html)
+
+
+    def test_accion_admin_de_recibos_invalida_los_paneles(self):
+        recibo = ReciboPago.objects.create(idUsuario=self.estudiante, Valor=100)
+        otro = crear_usuario('otro@test.com')
+        antes = {panel: version_panel(panel) for panel in (PANEL_ADMIN, self.estudiante.idUsuario, otro.idUsuario)}
+
+        self.client.force_login(User.objects.create_superuser('root', 'root@test.com', 'clave123'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:core_recibopago_changelist'), {
+                'action': 'marcar_como_pagado', '_selected_action': [recibo.pk],
+            })
+
+        self.assertNotEqual(version_panel(PANEL_ADMIN), antes[PANEL_ADMIN])
+        self.assertNotEqual(version_panel(self.estudiante.idUsuario), antes[self.estudiante.idUsuario])
+        self.assertEqual(version_panel(otro.idUsuario), antes[otro.idUsuario])
+
+class SeccionesPanelTests(TransactionTestCase):
+    """Todas las secciones del panel en una respuesta, armadas en paralelo"""
+
+    def setUp(self):
+        cache.clear()
+        self.estudiante = crear_usuario('estudiante@test.com')
+        Inscripcion.objects.create(idUsuario=self.estudiante, idCurso=crear_curso())
+
+    def test_todas_las_secciones(self):
+        iniciar_sesion(self.client, self.estudiante)
+        datos = self.client.get(reverse('secciones_panel', args=['estudiante'])).json()
+        self.assertTrue(datos['success'])
+        self.assertEqual(
+            set(datos['secciones']), {'inscripciones', 'proximas_clases', 'resultados', 'recibos_pendientes'}
+        )
+        self.assertIn('Inglés - A1', datos['secciones']['inscripciones'])
+
+    def test_otro_rol_no_autorizado(self):
+        iniciar_sesion(self.client, self.estudiante)
+        datos = self.client.get(reverse('secciones_panel', args=['profesor'])).json()
+        self.assertFalse(datos['success'])
+        self.assertEqual(self.client.get(reverse('secciones_panel', args=['x'])).status_code, 404)
+
+
+    def test_tickets_sin_consulta_por_ticket(self):
+        for n in range(5):
+            TicketSoporte.objects.create(
+                idUsuario=crear_usuario(f'cliente{n}@test.com'), Asunto=f'Ticket {n}', Descripcion='Ayuda'
+            )
+        # Una consulta: los tickets junto con su usuario
+        with self.assertNumQueries(1):
+            html = render_seccion('admin', 'tickets', None)
+        self.assertIn('Estudiante Prueba', html)
+
+class CatalogoTests(TestCase):
+    """Catálogo agrupado por idioma desde el cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.ingles = crear_curso()
+        crear_curso('Inglés - B1', 'B1')
+        crear_curso('Francés - A1')
+
+    def test_agrupado_por_idioma_y_en_cache(self):
+        catalogo = catalogo_por_idioma()
+        self.assertEqual(list(catalogo), ['Francés', 'Inglés'])
+        self.assertEqual(len(catalogo['Inglés']), 2)
+        with self.assertNumQueries(0):
+            catalogo_por_idioma()
+
+    def test_renombrar_cambia_el_idioma_y_el_grupo(self):
+        catalogo_por_idioma()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingles.Nombre = 'Alemán - A1'
+            self.ingles.save(update_fields=['Nombre'])
+        self.assertEqual(Curso.objects.get(pk=self.ingles.pk).Idioma, 'Alemán')
+        self.assertEqual(list(catalogo_por_idioma()), ['Alemán', 'Francés', 'Inglés'])
+
+
+class DetalleCursoTests(TestCase):
+    """Paquete del detalle de curso bajo la versión del curso"""
+
+    def setUp(self):
+        cache.clear()
+        self.curso = crear_curso()
+        crear_clase(self.curso, 1)
+
+    def test_lectura_en_cache_e_invalidacion(self):
+        self.assertEqual(len(detalle_de_curso(self.curso.pk)['clases']), 1)
+        with self.assertNumQueries(0):
+            detalle_de_curso(self.curso.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_clase(self.curso, 2)
+        self.assertEqual(len(detalle_de_curso(self.curso.pk)['clases']), 2)
+
+    def test_curso_inexistente_no_ocupa_cache(self):
+        self.assertIsNone(detalle_de_curso(999))
+        self.assertIsNone(cache.get(clave_version(espacio_curso(999))))
+        # Si el curso se crea después, se ve de inmediato
+        Curso.objects.create(idCurso=999, Nombre='Italiano - A1', Nivel_mcerl='A1', Modalidad='sincrónica')
+        self.assertEqual(detalle_de_curso(999)['curso'].Nombre, 'Italiano - A1')
+
+
+class CachePaginasTests(TestCase):
+    """Páginas públicas en cache para visitantes anónimos, con GET condicional"""
+
+    def setUp(self):
+        cache.clear()
+        caches['paginas'].clear()
+
+    def test_anonimo_recibe_304_con_el_mismo_etag(self):
+        respuesta = self.client.get(reverse('index'))
+        self.assertEqual(respuesta.status_code, 200)
+        with self.assertNumQueries(0):
+            condicional = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+
+    def test_cambio_en_el_catalogo_regenera_la_pagina(self):
+        self.client.get(reverse('index'))
+        # En cache no se dibuja ninguna plantilla
+        self.assertFalse(self.client.get(reverse('index')).templates)
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_curso()
+        self.assertTemplateUsed(self.client.get(reverse('index')), 'pagina_web/index.html')
+
+    def test_con_sesion_no_se_usa_el_cache(self):
+        etag = self.client.get(reverse('index'))['ETag']
+        iniciar_sesion(self.client, crear_usuario('estudiante@test.com'))
+        respuesta = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('ETag', respuesta)
+
+
+class UsuarioActualTests(TestCase):
+    """request.usuario perezoso y el decorador sesion_requerida"""
+
+    def setUp(self):
+        cache.clear()
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.profesor = crear_usuario('profesor@test.com', 'profesor')
+
+    def test_paginas_sin_sesion_o_con_otro_rol_van_a_login(self):
+        respuesta = self.client.get(reverse('dashboard_estudiante'))
+        self.assertRedirects(respuesta, reverse('login'), fetch_redirect_response=False)
+        iniciar_sesion(self.client, self.profesor)
+        respuesta = self.client.get(reverse('dashboard_estudiante'))
+        self.assertRedirects(respuesta, reverse('login'), fetch_redirect_response=False)
+
+    def test_usuario_se_carga_solo_si_se_usa(self):
+        iniciar_sesion(self.client, self.estudiante)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('get_messages', args=[self.profesor.idUsuario]))
+        self.assertFalse([q for q in consultas.captured_queries if 'FROM "Usuario"' in q['sql']])
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('dashboard_estudiante'))
+        self.assertEqual(respuesta.context['usuario'], self.estudiante)
+        self.assertEqual(len([q for q in consultas.captured_queries if 'FROM "Usuario"' in q['sql']]), 1)
+
+
+class SesionesTests(TestCase):
+    """Índice de sesiones por usuario y revocación"""
+
+    def setUp(self):
+        self.estudiante = crear_usuario('estudiante@test.com')
+        self.clientes = [Client(), Client()]
+        for cliente in self.clientes:
+            cliente.post(reverse('login'), {'correo': self.estudiante.Correo, 'contrasena': 'clave123'})
+
+    def test_login_y_logout_mantienen_el_indice(self):
+        self.assertEqual(SesionUsuario.objects.filter(idUsuario=self.estudiante).count(), 2)
+        self.clientes[0].get(reverse('logout'))
+        self.assertEqual(SesionUsuario.objects.filter(idUsuario=self.estudiante).count(), 1)
+
+    def test_desactivar_el_usuario_cierra_sus_sesiones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.estudiante.Estado = 'inactivo'
+            self.estudiante.save()
+        self.assertFalse(SesionUsuario.objects.exists())
+        self.assertFalse(Session.objects.exists())
+        for cliente in self.clientes:
+            respuesta = cliente.get(reverse('dashboard_estudiante'))
+            self.assertRedirects(respuesta, reverse('login'), fetch_redirect_response=False)
+
+    def test_eliminar_el_usuario_cierra_sus_sesiones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.estudiante.delete()
+        self.assertFalse(Session.objects.exists())
+
+    @override_settings(SESSION_LIMPIEZA_LOTE=1)
+    def test_clearsessions_por_lotes(self):
+        Session.objects.update(expire_date=timezone.now() - timedelta(days=1))
+        call_command('clearsessions')
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(SesionUsuario.objects.exists())
+
+
+class ListaHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+
+    def emit(self, record):
+        self.registros.append(record)
+
+
+class BitacoraTests(TestCase):
+    """Cola de logging, contexto de la petición y muestreo por nivel"""
+
+    def registro(self, nivel):
+        return logging.LogRecord('core.pruebas', nivel, __file__, 0, 'mensaje', None, None)
+
+    def test_muestreo_descarta_debug_salvo_usuarios_en_depuracion(self):
+        muestreo = MuestreoPorNivel({'DEBUG': 0.0})
+        self.assertFalse(muestreo.filter(self.registro(logging.DEBUG)))
+        self.assertTrue(muestreo.filter(self.registro(logging.INFO)))
+        depurado = self.registro(logging.DEBUG)
+        depurado.depurado = True
+        self.assertTrue(muestreo.filter(depurado))
+
+    def contexto_en_peticion(self, usuario_id):
+        vistos = []
+
+        def vista(request):
+            registro = self.registro(logging.DEBUG)
+            ContextoSolicitud().filter(registro)
+            vistos.append((registro.usuario_id, registro.depurado))
+
+        request = RequestFactory().get('/')
+        request.session = {'usuario_id': usuario_id}
+        ContextoBitacoraMiddleware(vista)(request)
+        return vistos[0]
+
+    @override_settings(BITACORA_DEPURACION_REFRESCO=0)
+    def test_middleware_pone_el_usuario_en_los_registros(self):
+        usuario = crear_usuario('depurado@test.com')
+        activar_depuracion(usuario.idUsuario, minutos=5)
+        self.assertEqual(self.contexto_en_peticion(usuario.idUsuario), (usuario.idUsuario, True))
+
+        registro = self.registro(logging.INFO)
+        ContextoSolicitud().filter(registro)
+        self.assertIsNone(registro.usuario_id)
+
+    @override_settings(BITACORA_DEPURACION_REFRESCO=0)
+    def test_depurar_usuario_llega_por_la_base_de_datos(self):
+        usuario = crear_usuario('depurado@test.com')
+        # El comando corre en otro proceso: solo comparte la base de datos
+        call_command('depurar_usuario', usuario.idUsuario, minutos=5, stdout=io.StringIO())
+        self.assertTrue(UsuarioDepurado.objects.filter(idUsuario=usuario).exists())
+        self.assertEqual(self.contexto_en_peticion(usuario.idUsuario), (usuario.idUsuario, True))
+
+        call_command('depurar_usuario', usuario.idUsuario, desactivar=True, stdout=io.StringIO())
+        self.assertEqual(self.contexto_en_peticion(usuario.idUsuario), (usuario.idUsuario, False))
+
+        # La depuración vencida no cuenta
+        UsuarioDepurado.objects.create(idUsuario=usuario, Vence=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.contexto_en_peticion(usuario.idUsuario), (usuario.idUsuario, False))
+
+    def test_cola_idempotente_y_se_detiene_al_cerrar(self):
+        registro = logging.getLogger('core.pruebas_cola')
+        destino = ListaHandler()
+        contexto = ContextoSolicitud()
+        destino.addFilter(contexto)
+        registro.handlers = [destino]
+        self.addCleanup(setattr, registro, 'handlers', [])
+
+        oyente = iniciar_cola('core.pruebas_cola')
+        self.assertIs(iniciar_cola('core.pruebas_cola'), oyente)
+        cola, = registro.handlers
+        self.assertIsInstance(cola, ColaCore)
+        # El filtro de contexto se evalúa antes de encolar
+        self.assertEqual(cola.filters, [contexto])
+
+        logging.getLogger('core.pruebas_cola.hijo').warning('hola')
+        cola.close()
+        self.assertIsNone(oyente._thread)
+        self.assertEqual([r.getMessage() for r in destino.registros], ['hola'])
+        self.assertIsNone(destino.registros[0].usuario_id)
+
+
+class ImportarUsuariosTests(TestCase):
+    """Alta masiva con importar_usuarios"""
+
+    def importar(self, filas, lote=2):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(['nombres', 'apellidos', 'correo', 'contrasena', 'rol'])
+            escritor.writerows(filas)
+        self.addCleanup(os.remove, archivo.name)
+        salida = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('importar_usuarios', archivo.name, lote=lote, procesos=1, stdout=salida)
+        return salida.getvalue()
+
+    def test_omite_correos_repetidos_y_registrados(self):
+        crear_usuario('registrado@test.com')
+        Estadistica.leer()
+        salida = self.importar([
+            ['Ana', 'Uno', 'ana@test.com', 'clave123', ''],
+            ['Luis', 'Dos', 'luis@test.com', 'clave123', 'profesor'],
+            ['Ana', 'Repetida', 'ana@test.com', 'clave123', ''],       # en otro lote
+            ['Otra', 'Vez', 'registrado@test.com', 'clave123', ''],
+            ['Eva', 'Tres', 'eva@test.com', 'clave123', ''],
+            ['Eva', 'Repetida', 'eva@test.com', 'clave123', ''],       # en el mismo lote
+        ])
+
+        self.assertIn('3 usuarios creados', salida)
+        importados = Usuario.objects.exclude(Correo='registrado@test.com')
+        self.assertEqual(
+            sorted(importados.values_list('Correo', 'Rol')),
+            [('ana@test.com', 'estudiante'), ('eva@test.com', 'estudiante'), ('luis@test.com', 'profesor')]
+        )
+        self.assertEqual(Usuario.objects.get(Correo='ana@test.com').Apellidos, 'Uno')
+        self.assertEqual(Estadistica.leer()['total_usuarios'], Usuario.objects.count())
+        self.assertIsNotNone(authenticate(username='eva@test.com', password='clave123'))
+        self.assertEqual(User.objects.get(username='eva@test.com').email, 'eva@test.com')
+
+
+class MD5ConHilo(MD5PasswordHasher):
+    """MD5PasswordHasher que anota en qué hilo se verificó cada contraseña"""
+    hilos = []
+
+    def verify(self, password, encoded):
+        self.hilos.append(threading.get_ident())
+        return super().verify(password, encoded)
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+])
+class InicioSesionTests(TestCase):
+    """autenticar_usuario y actualización del hash en el login"""
+
+    def setUp(self):
+        self.usuario = crear_usuario('hash@test.com')
+        User.objects.filter(pk=self.usuario.user_id).update(
+            password=make_password('clave123', hasher='md5')
+        )
+
+    def algoritmo(self):
+        return User.objects.get(pk=self.usuario.user_id).password.split('$', 1)[0]
+
+    def test_login_actualiza_hash_antiguo(self):
+        self.assertEqual(self.algoritmo(), 'md5')
+
+        respuesta = Client().post(reverse('login'), {'correo': 'hash@test.com', 'contrasena': 'clave123'})
+
+        self.assertRedirects(respuesta, reverse('dashboard_estudiante'), fetch_redirect_response=False)
+        self.assertEqual(self.algoritmo(), 'pbkdf2_sha256')
+        self.assertIsNotNone(authenticate(username='hash@test.com', password='clave123'))
+
+        # Con el hash ya actualizado no se vuelve a guardar
+        with CaptureQueriesContext(connection) as consultas:
+            _, error = autenticar_usuario('hash@test.com', 'clave123')
+        self.assertIsNone(error)
+        self.assertEqual(len(consultas), 1)
+
+    def test_contrasena_incorrecta_no_actualiza_hash(self):
+        _, error = autenticar_usuario('hash@test.com', 'otra-clave')
+        self.assertEqual(error, 'contrasena')
+        self.assertEqual(self.algoritmo(), 'md5')
+
+    def test_errores(self):
+        self.assertEqual(autenticar_usuario('nadie@test.com', 'clave123'), (None, 'no_registrado'))
+
+        Usuario.objects.filter(pk=self.usuario.pk).update(Estado='inactivo')
+        usuario, error = autenticar_usuario('hash@test.com', 'clave123')
+        self.assertEqual((usuario.pk, error), (self.usuario.pk, 'inactivo'))
+        self.assertEqual(self.algoritmo(), 'md5')
+
+
+    @override_settings(PASSWORD_HASHERS=['core.tests.MD5ConHilo'])
+    async def test_login_asincrono_verifica_el_hash_en_otro_hilo(self):
+        MD5ConHilo.hilos.clear()
+        respuesta = await AsyncClient().post(
+            reverse('login'), {'correo': 'hash@test.com', 'contrasena': 'clave123'}
+        )
+        self.assertRedirects(respuesta, reverse('dashboard_estudiante'), fetch_redirect_response=False)
+        # Las consultas corren en el hilo de la prueba; el hash no
+        self.assertEqual(len(MD5ConHilo.hilos), 1)
+        self.assertNotEqual(MD5ConHilo.hilos[0], threading.get_ident())
+
+        with self.assertLogs('core.views', 'WARNING'):
+            respuesta = await AsyncClient().post(
+                reverse('login'), {'correo': 'hash@test.com', 'contrasena': 'otra-clave'}
+            )
+        self.assertRedirects(respuesta, reverse('login'), fetch_redirect_response=False)
@@ -19,6 +19,9 @@ urlpatterns = [
     path('dashboard-estudiante/', views.dashboard_estudiante, name='dashboard_estudiante'),
     path('dashboard-profesor/', views.dashboard_profesor, name='dashboard_profesor'),
     path('dashboard-administrativo/', views.dashboard_administrativo, name='dashboard_administrativo'),
+    path('dashboard-administrativo/usuarios/', views.usuarios_admin, name='usuarios_admin'),
+    path('panel/<str:panel>/', views.secciones_panel, name='secciones_panel'),
+    path('panel/<str:panel>/<str:seccion>/', views.seccion_panel, name='seccion_panel'),
     
     # Funcionalidades de cursos
     path('curso/<int:id_curso>/', views.detalle_curso, name='detalle_curso'),
@@ -39,4 +42,9 @@ urlpatterns = [
     path('chat/room/<int:user_id>/', views.chat_room, name='chat_room'),
     path('chat/send/', views.send_message, name='send_message'),
     path('chat/get/<int:user_id>/', views.get_messages, name='get_messages'),
+    path('chat/wait/<int:user_id>/', views.esperar_mensajes, name='esperar_mensajes'),
+    path('chat/presence/<int:user_id>/', views.presencia_chat, name='presencia_chat'),
+    path('chat/history/<int:user_id>/', views.historial_mensajes, name='historial_mensajes'),
+    path('chat/broadcast/<int:curso_id>/', views.difundir_mensaje_curso, name='difundir_mensaje_curso'),
+    path('chat/search/', views.buscar_mensajes, name='buscar_mensajes'),
 ]
\ No newline at end of file
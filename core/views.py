@@ -1,68 +1,76 @@
+import asyncio
+import logging
+import math
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.http import JsonResponse, Http404
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import check_password
+from django.db import connections
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
 from .models import (
     Usuario, Curso, Inscripcion, Clase, ContenidoEducativo,
-    Evaluacion, ResultadoEvaluacion, Mensaje, ReciboPago, TicketSoporte
+    Evaluacion, ResultadoEvaluacion, Mensaje, ReciboPago, TicketSoporte, Estadistica
 )
 from .forms import TicketSoporteForm
+from .paneles import PANEL_ADMIN, seccion_en_cache
+from .catalogo import ESPACIO_CATALOGO, catalogo_por_idioma, detalle_de_curso
+from .cache_paginas import cache_pagina_anonima
+from .sesion import sesion_valida, sesion_requerida, usuario_o_404, autenticar_usuario_async
+
+logger = logging.getLogger(__name__)
 
 # ===================================
 # VISTAS ESTÁTICAS (TUS PÁGINAS HTML)
 # ===================================
+@cache_pagina_anonima(ESPACIO_CATALOGO)
 def index(request):
     """Página principal"""
-    cursos_activos = Curso.objects.filter(Estado='activo')[:6]
+    cursos_activos = Curso.objects.filter(Estado='activo').with_stats()[:6]
     context = {
         'cursos': cursos_activos,
-        'usuario': get_usuario_sesion(request)
+        'usuario': request.usuario
     }
     return render(request, 'pagina_web/index.html', context)
 
+@cache_pagina_anonima()
 def nosotros(request):
     return render(request, 'pagina_web/2_Nosotros.html')
 
 def cursos(request):
-    """Lista de cursos desde la base de datos agrupados por idioma"""
-    cursos_list = Curso.objects.filter(Estado='activo').order_by('Nombre', 'Nivel_mcerl')
-    
-    # Agrupar cursos por idioma
-    cursos_agrupados = {}
-    for curso in cursos_list:
-        # Extraer el idioma del nombre (ej: "Inglés - A1" -> "Inglés")
-        if ' - ' in curso.Nombre:
-            idioma = curso.Nombre.split(' - ')[0].strip()
-        else:
-            idioma = curso.Nombre  # Si no tiene formato "Idioma - Nivel"
-        
-        if idioma not in cursos_agrupados:
-            cursos_agrupados[idioma] = []
-        cursos_agrupados[idioma].append(curso)
-    
+    """Lista de cursos activos agrupados por idioma (desde el cache)"""
     context = {
-        'cursos_agrupados': cursos_agrupados,
-        'usuario': get_usuario_sesion(request)
+        'cursos_agrupados': catalogo_por_idioma(),
+        'usuario': request.usuario
     }
     return render(request, 'pagina_web/3_Cursos.html', context)
 
 
+@cache_pagina_anonima()
 def metodologia(request):
     return render(request, 'pagina_web/4_Metodologia.html')
 
+@cache_pagina_anonima()
 def profesores(request):
     return render(request, 'pagina_web/5_Profesores.html')
 
 def pantalla_inicio(request):
     return render(request, 'pagina_web/6_Pantalla_Inicio.html')
 
+@cache_pagina_anonima()
 def politicas_privacidad(request):
     return render(request, 'pagina_web/11_Politicas_Privacidad.html')
 
+@cache_pagina_anonima()
 def terminos(request):
     return render(request, 'pagina_web/12_Terminos.html')
 
+@cache_pagina_anonima()
 def soporte(request):
     return render(request, 'pagina_web/13_Soporte.html')
 
@@ -139,62 +147,64 @@ def registro(request):
 # LOGIN / LOGOUT
 # ===================================
 
-def login(request):
-    """Inicio de sesión"""
-    if request.method == 'POST':
-        correo = request.POST.get('correo')
-        contrasena = request.POST.get('contrasena')
-        
-        if not correo or not contrasena:
-            messages.error(request, 'Por favor ingresa correo y contraseña')
-            return redirect('login')
-        
-        try:
-            usuario = Usuario.objects.get(Correo=correo)
-            print(f"✅ Usuario encontrado: {usuario.Nombres}")
-            print(f"✅ Rol: {usuario.Rol}")
-            print(f"✅ User vinculado: {usuario.user}")
-            
-            if usuario.Estado == 'inactivo':
-                messages.error(request, 'Tu cuenta está inactiva. Contacta al administrador')
-                return redirect('login')
-            
-            # Verificar contraseña usando el User de Django
-            if usuario.user and usuario.user.check_password(contrasena):
-                print(f"✅ Contraseña correcta")
-                
-                # Guardar datos en sesión
-                request.session['usuario_id'] = usuario.idUsuario
-                request.session['usuario_nombre'] = f"{usuario.Nombres} {usuario.Apellidos}"
-                request.session['usuario_rol'] = usuario.Rol
-                request.session.modified = True
-                
-                print(f"✅ Sesión guardada: usuario_id={request.session.get('usuario_id')}")
-                print(f"✅ Sesión guardada: usuario_rol={request.session.get('usuario_rol')}")
-                
-                messages.success(request, f'¡Bienvenido {usuario.Nombres}! ¡Inicio de sesión exitosos!')
-                
-                # Redirigir según el rol
-                if usuario.Rol == 'admin':
-                    print("🔴 Redirigiendo a admin")
-                    return redirect('dashboard_administrativo')
-                elif usuario.Rol == 'profesor':
-                    print("🟡 Redirigiendo a profesor")
-                    return redirect('dashboard_profesor')
-                else:
-                    print("🟢 Redirigiendo a estudiante")
-                    return redirect('dashboard_estudiante')
-            else:
-                print(f"❌ Contraseña incorrecta o usuario sin vinculación")
-                messages.error(request, 'Contraseña incorrecta')
-                return redirect('login')
-                
-        except Usuario.DoesNotExist:
-            print(f"❌ Usuario no encontrado con correo: {correo}")
-            messages.error(request, 'El correo no está registrado')
-            return redirect('login')
+async def login(request):
+    """
+    Inicio de sesión. Es asíncrona para que el hash de la contraseña se
+    calcule en un hilo aparte (autenticar_usuario_async): bajo ASGI las
+    vistas síncronas comparten un solo hilo y un login no debe frenarlas.
+    """
+    if request.method != 'POST':
+        return await sync_to_async(render)(request, 'pagina_web/6_Pantalla_Inicio.html')
     
-    return render(request, 'pagina_web/6_Pantalla_Inicio.html')
+    correo = request.POST.get('correo')
+    contrasena = request.POST.get('contrasena')
+    usuario, error = None, 'incompleto'
+    if correo and contrasena:
+        # Perfil y User en una consulta; el hash se actualiza si es antiguo
+        usuario, error = await autenticar_usuario_async(correo, contrasena)
+    
+    return await sync_to_async(responder_login)(request, correo, usuario, error)
+
+
+def responder_login(request, correo, usuario, error):
+    """Mensajes, sesión y redirección según el resultado del login"""
+    if error == 'incompleto':
+        messages.error(request, 'Por favor ingresa correo y contraseña')
+        return redirect('login')
+    
+    if error == 'no_registrado':
+        logger.warning('login correo no registrado correo=%s', correo)
+        messages.error(request, 'El correo no está registrado')
+        return redirect('login')
+    
+    if error == 'inactivo':
+        logger.info('login rechazado cuenta inactiva usuario_id=%s', usuario.idUsuario)
+        messages.error(request, 'Tu cuenta está inactiva. Contacta al administrador')
+        return redirect('login')
+    
+    if error == 'contrasena':
+        logger.warning('login contraseña incorrecta o usuario sin vinculación usuario_id=%s',
+                       usuario.idUsuario)
+        messages.error(request, 'Contraseña incorrecta')
+        return redirect('login')
+    
+    # Guardar datos en sesión
+    request.session['usuario_id'] = usuario.idUsuario
+    request.session['usuario_nombre'] = f"{usuario.Nombres} {usuario.Apellidos}"
+    request.session['usuario_rol'] = usuario.Rol
+    request.session.modified = True
+    
+    logger.info('login correcto usuario_id=%s rol=%s', usuario.idUsuario, usuario.Rol)
+    
+    messages.success(request, f'¡Bienvenido {usuario.Nombres}! ¡Inicio de sesión exitosos!')
+    
+    # Redirigir según el rol
+    if usuario.Rol == 'admin':
+        return redirect('dashboard_administrativo')
+    elif usuario.Rol == 'profesor':
+        return redirect('dashboard_profesor')
+    else:
+        return redirect('dashboard_estudiante')
 
 
 def logout(request):
@@ -207,162 +217,355 @@ def logout(request):
 # ===================================
 # DASHBOARDS
 # ===================================
-def dashboard_estudiante(request):
-    """Panel del estudiante con datos de la BD"""
-    print(f"Dashboard estudiante - usuario_id en sesión: {request.session.get('usuario_id')}")
-    print(f"Dashboard estudiante - usuario_rol en sesión: {request.session.get('usuario_rol')}")
-    
-    if not verificar_sesion(request, 'estudiante'):
-        print("❌ Sesión inválida, redirigiendo a login")
-        messages.error(request, 'Debes iniciar sesión como estudiante')
-        return redirect('login')
-    
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, idUsuario=usuario_id)
-    
-    # Obtener inscripciones activas
-    inscripciones = Inscripcion.objects.filter(
+def proximas_clases_estudiante(usuario, por_curso=3):
+    """
+    Próximas clases de los cursos con inscripción activa del estudiante,
+    como máximo por_curso de cada curso, en una sola consulta
+    (ROW_NUMBER() OVER (PARTITION BY idCurso ORDER BY Fecha_hora)).
+    """
+    cursos_activos = Inscripcion.objects.filter(
         idUsuario=usuario,
         Estado='activa'
-    ).select_related('idCurso')
-    
-    # Obtener próximas clases
-    proximas_clases = []
-    for inscripcion in inscripciones:
-        clases = Clase.objects.filter(
-            idCurso=inscripcion.idCurso,
-            Fecha_hora__gte=timezone.now()
-        ).order_by('Fecha_hora')[:3]
-        proximas_clases.extend(clases)
-    
-    # Obtener resultados de evaluaciones
-    resultados = ResultadoEvaluacion.objects.filter(
-        idUsuario=usuario
-    ).select_related('idEvaluacion')[:5]
-    
-    # Obtener recibos pendientes
-    recibos_pendientes = ReciboPago.objects.filter(
-        idUsuario=usuario,
-        Estado_pago='pendiente'
-    )
+    ).values('idCurso')
+    
+    return Clase.objects.filter(
+        idCurso__in=cursos_activos,
+        Fecha_hora__gte=timezone.now()
+    ).annotate(
+        orden_en_curso=Window(
+            RowNumber(),
+            partition_by=[F('idCurso')],
+            order_by=[F('Fecha_hora').asc(), F('idClase').asc()]
+        )
+    ).filter(
+        orden_en_curso__lte=por_curso
+    ).select_related('idCurso').order_by('Fecha_hora', 'idClase')
+
+
+@sesion_requerida('estudiante', 'Debes iniciar sesión como estudiante')
+def dashboard_estudiante(request):
+    """Panel del estudiante: la página base, las secciones se cargan con seccion_panel"""
+    logger.debug('dashboard estudiante usuario_id=%s rol=%s',
+                 request.session.get('usuario_id'), request.session.get('usuario_rol'))
     
     context = {
-        'usuario': usuario,
-        'inscripciones': inscripciones,
-        'proximas_clases': proximas_clases,
-        'resultados': resultados,
-        'recibos_pendientes': recibos_pendientes
+        'usuario': usuario_o_404(request),
     }
     return render(request, 'pagina_web/8_Dashboard_Estudiante.html', context)
 
 
+@sesion_requerida('profesor', 'Debes iniciar sesión como profesor')
 def dashboard_profesor(request):
-    """Panel del profesor con datos de la BD"""
-    if not verificar_sesion(request, 'profesor'):
-        messages.error(request, 'Debes iniciar sesión como profesor')
-        return redirect('login')
-    
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, idUsuario=usuario_id)
-    
-    # Obtener cursos donde el profesor ha subido contenido
-    contenidos = ContenidoEducativo.objects.filter(
-        Subido_por=usuario
-    ).select_related('idCurso')
-    
-    # Obtener cursos únicos
-    cursos_profesor = list(set([contenido.idCurso for contenido in contenidos]))
-    
-    # Obtener estudiantes inscritos en los cursos del profesor
-    inscripciones = Inscripcion.objects.filter(
-        idCurso__in=cursos_profesor,
-        Estado='activa'
-    ).select_related('idUsuario', 'idCurso')
-    
-    inscripciones_activas = inscripciones.filter(Estado='activa')
-    
-    # Obtener evaluaciones creadas por los cursos del profesor
-    evaluaciones = Evaluacion.objects.filter(
-        idCurso__in=cursos_profesor
-    ).select_related('idCurso')
-    
+    """Panel del profesor: la página base, las secciones se cargan con seccion_panel"""
     context = {
-        'usuario': usuario,
-        'cursos': cursos_profesor,
-        'contenidos': contenidos,
-        'inscripciones': inscripciones,
-        'inscripciones_activas': inscripciones_activas,
-        'evaluaciones': evaluaciones,
+        'usuario': usuario_o_404(request),
     }
     return render(request, 'pagina_web/9_Dashboard_Profesor.html', context)
 
 
-def dashboard_administrativo(request):
-    """Panel administrativo con estadísticas"""
-    if not verificar_sesion(request, 'admin'):
-        messages.error(request, 'Debes iniciar sesión como administrador')
-        return redirect('login')
+# Usuarios por página en la tabla del panel administrativo
+USUARIOS_POR_PAGINA = 50
+
+
+def pagina_usuarios(busqueda='', rol='', estado='', cursor=None, por_pagina=USUARIOS_POR_PAGINA):
+    """
+    Página de usuarios para el panel administrativo, del más reciente al más
+    antiguo, con paginación por keyset sobre (Fecha_registro, idUsuario).
+    Cada palabra de la búsqueda debe aparecer en Nombres, Apellidos o Correo.
+    Retorna (usuarios, hay_mas).
+    """
+    usuarios = Usuario.objects.order_by('-Fecha_registro', '-idUsuario')
     
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, idUsuario=usuario_id)
+    for palabra in busqueda.split():
+        usuarios = usuarios.filter(
+            Q(Nombres__icontains=palabra) |
+            Q(Apellidos__icontains=palabra) |
+            Q(Correo__icontains=palabra)
+        )
+    if rol:
+        usuarios = usuarios.filter(Rol=rol)
+    if estado:
+        usuarios = usuarios.filter(Estado=estado)
+    if cursor:
+        fecha, usuario_id = cursor
+        usuarios = usuarios.filter(
+            Q(Fecha_registro__lt=fecha) |
+            Q(Fecha_registro=fecha, idUsuario__lt=usuario_id)
+        )
     
-    # Estadísticas generales
-    total_usuarios = Usuario.objects.count()
-    total_cursos = Curso.objects.count()
-    total_inscripciones = Inscripcion.objects.filter(Estado='activa').count()
+    # Pedir uno extra para saber si quedan más páginas
+    usuarios = list(usuarios[:por_pagina + 1])
+    return usuarios[:por_pagina], len(usuarios) > por_pagina
+
+
+def cursor_usuario(usuario):
+    """Cursor (Fecha_registro, idUsuario) para pedir la página siguiente"""
+    return f"{usuario.Fecha_registro.isoformat()}|{usuario.idUsuario}"
+
+
+@sesion_requerida('admin', 'Debes iniciar sesión como administrador')
+def dashboard_administrativo(request):
+    """Panel administrativo con estadísticas"""
+    usuario = usuario_o_404(request)
     
-    # Pagos pendientes
-    pagos_pendientes = ReciboPago.objects.filter(Estado_pago='pendiente').count()
+    # Estadísticas generales (contadores mantenidos por señales, una consulta)
+    estadisticas = Estadistica.leer()
     
-    # Obtener datos para mostrar en tablas
-    usuarios = Usuario.objects.all().order_by('-Fecha_registro')
-    cursos = Curso.objects.all()
-    pagos = ReciboPago.objects.filter(Estado_pago='pendiente').select_related('idUsuario')[:10]
-    tickets = TicketSoporte.objects.filter(Estado='abierto').order_by('-Fecha_creacion')[:10]
+    # Primera página de usuarios (el resto se pide a usuarios_admin al buscar
+    # o desplazarse); cursos, pagos y tickets se cargan con seccion_panel
+    usuarios, hay_mas_usuarios = pagina_usuarios()
     
     context = {
         'usuario': usuario,
-        'total_usuarios': total_usuarios,
-        'total_cursos': total_cursos,
-        'total_inscripciones': total_inscripciones,
-        'pagos_pendientes': pagos_pendientes,
+        'total_usuarios': estadisticas['total_usuarios'],
+        'total_cursos': estadisticas['total_cursos'],
+        'total_inscripciones': estadisticas['total_inscripciones'],
+        'pagos_pendientes': estadisticas['pagos_pendientes'],
         'usuarios': usuarios,
-        'cursos': cursos,
-        'pagos': pagos,
-        'tickets': tickets,
+        'hay_mas_usuarios': hay_mas_usuarios,
+        'cursor_usuarios': cursor_usuario(usuarios[-1]) if usuarios else '',
+        'roles': Usuario.ROLES,
+        'estados': Usuario.ESTADOS,
     }
     return render(request, 'pagina_web/10_Dashboard_Administrativo.html', context)
 
 
+@sesion_requerida('admin')
+def usuarios_admin(request):
+    """Tabla de usuarios del panel administrativo vía AJAX (búsqueda y filtros en el servidor)"""
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = leer_cursor(request.GET['cursor'])
+        if cursor is None:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido'})
+    
+    usuarios, hay_mas = pagina_usuarios(
+        busqueda=request.GET.get('q', '').strip(),
+        rol=request.GET.get('rol', ''),
+        estado=request.GET.get('estado', ''),
+        cursor=cursor,
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'usuarios': [
+            {
+                'id': usuario_item.idUsuario,
+                'nombre': f"{usuario_item.Nombres} {usuario_item.Apellidos}",
+                'correo': usuario_item.Correo,
+                'rol': usuario_item.get_Rol_display(),
+                'estado': usuario_item.Estado,
+                'fecha_registro': usuario_item.Fecha_registro.strftime('%d/%m/%Y'),
+            }
+            for usuario_item in usuarios
+        ],
+        'has_more': hay_mas,
+        'cursor': cursor_usuario(usuarios[-1]) if usuarios else '',
+    })
+
+
+# ===================================
+# SECCIONES DE LOS PANELES (JSON)
+# ===================================
+# Cada sección retorna su contexto ya evaluado, guardado en el cache del
+# panel (ver paneles.py), y se dibuja con pagina_web/paneles/<panel>_<seccion>.html
+
+def seccion_estudiante_inscripciones(usuario_id):
+    return seccion_en_cache(usuario_id, 'inscripciones', lambda: {
+        'inscripciones': list(Inscripcion.objects.filter(
+            idUsuario_id=usuario_id,
+            Estado='activa'
+        ).select_related('idCurso')),
+    })
+
+
+def seccion_estudiante_proximas_clases(usuario_id):
+    clases = seccion_en_cache(
+        usuario_id, 'proximas_clases', lambda: list(proximas_clases_estudiante(usuario_id))
+    )
+    # Descartar las que empezaron mientras estaban en cache
+    ahora = timezone.now()
+    return {'proximas_clases': [clase for clase in clases if clase.Fecha_hora >= ahora]}
+
+
+def seccion_estudiante_resultados(usuario_id):
+    return seccion_en_cache(usuario_id, 'resultados', lambda: {
+        'resultados': list(ResultadoEvaluacion.objects.filter(
+            idUsuario_id=usuario_id
+        ).select_related('idEvaluacion__idCurso')[:5]),
+    })
+
+
+def seccion_estudiante_recibos(usuario_id):
+    return seccion_en_cache(usuario_id, 'recibos_pendientes', lambda: {
+        'recibos_pendientes': list(ReciboPago.objects.filter(
+            idUsuario_id=usuario_id,
+            Estado_pago='pendiente'
+        )),
+    })
+
+
+def seccion_profesor_cursos(usuario_id):
+    return seccion_en_cache(usuario_id, 'cursos', lambda: {
+        'cursos': list(Curso.objects.filter(
+            profesores__idProfesor_id=usuario_id
+        ).order_by('Nombre', 'Nivel_mcerl')),
+    })
+
+
+def seccion_profesor_estudiantes(usuario_id):
+    def construir():
+        inscripciones = list(Inscripcion.objects.filter(
+            idCurso__profesores__idProfesor_id=usuario_id,
+            Estado='activa'
+        ).select_related('idUsuario', 'idCurso').order_by(
+            'idCurso__Nombre', 'idUsuario__Apellidos', 'idUsuario__Nombres'
+        ))
+        return {
+            'inscripciones': inscripciones,
+            'inscripciones_activas': inscripciones,
+        }
+    return seccion_en_cache(usuario_id, 'estudiantes', construir)
+
+
+def seccion_profesor_contenidos(usuario_id):
+    return seccion_en_cache(usuario_id, 'contenidos', lambda: {
+        'contenidos': list(ContenidoEducativo.objects.filter(
+            Subido_por_id=usuario_id,
+            idCurso__profesores__idProfesor_id=usuario_id
+        ).select_related('idCurso')),
+    })
+
+
+def seccion_profesor_evaluaciones(usuario_id):
+    return seccion_en_cache(usuario_id, 'evaluaciones', lambda: {
+        'evaluaciones': list(Evaluacion.objects.filter(
+            idCurso__profesores__idProfesor_id=usuario_id
+        ).select_related('idCurso').order_by('Fecha')),
+    })
+
+
+def seccion_admin_cursos(usuario_id):
+    return seccion_en_cache(PANEL_ADMIN, 'cursos', lambda: {
+        'cursos': list(Curso.objects.with_stats()),
+    })
+
+
+def seccion_admin_pagos(usuario_id):
+    return seccion_en_cache(PANEL_ADMIN, 'pagos', lambda: {
+        'pagos': list(ReciboPago.objects.filter(
+            Estado_pago='pendiente'
+        ).select_related('idUsuario')[:10]),
+    })
+
+
+def seccion_admin_tickets(usuario_id):
+    return seccion_en_cache(PANEL_ADMIN, 'tickets', lambda: {
+        'tickets': list(TicketSoporte.objects.filter(
+            Estado='abierto'
+        ).select_related('idUsuario').order_by('-Fecha_creacion')[:10]),
+    })
+
+
+# Panel (igual al rol que puede verlo) -> sección -> función que arma su contexto
+SECCIONES_PANEL = {
+    'estudiante': {
+        'inscripciones': seccion_estudiante_inscripciones,
+        'proximas_clases': seccion_estudiante_proximas_clases,
+        'resultados': seccion_estudiante_resultados,
+        'recibos_pendientes': seccion_estudiante_recibos,
+    },
+    'profesor': {
+        'cursos': seccion_profesor_cursos,
+        'estudiantes': seccion_profesor_estudiantes,
+        'contenidos': seccion_profesor_contenidos,
+        'evaluaciones': seccion_profesor_evaluaciones,
+    },
+    'admin': {
+        'cursos': seccion_admin_cursos,
+        'pagos': seccion_admin_pagos,
+        'tickets': seccion_admin_tickets,
+    },
+}
+
+
+def render_seccion(panel, seccion, usuario_id):
+    """
+    HTML de una sección del panel. Se dibuja sin request: las secciones no
+    usan los context processors y secciones_panel las dibuja desde varios
+    hilos a la vez, que no deben tocar la misma sesión ni los mensajes.
+    """
+    contexto = SECCIONES_PANEL[panel][seccion](usuario_id)
+    return render_to_string(f'pagina_web/paneles/{panel}_{seccion}.html', contexto)
+
+
+def render_seccion_en_hilo(panel, seccion, usuario_id):
+    """render_seccion para un hilo aparte: cierra la conexión que abrió ese hilo"""
+    try:
+        return render_seccion(panel, seccion, usuario_id)
+    finally:
+        connections.close_all()
+
+
+def seccion_panel(request, panel, seccion):
+    """Una sección del panel vía AJAX; la página las pide todas en paralelo"""
+    if seccion not in SECCIONES_PANEL.get(panel, {}):
+        return JsonResponse({'success': False, 'error': 'Sección no encontrada'}, status=404)
+    if not verificar_sesion(request, panel):
+        return JsonResponse({'success': False, 'error': 'No autorizado'})
+    
+    usuario_id = request.session.get('usuario_id')
+    return JsonResponse({
+        'success': True,
+        'html': render_seccion(panel, seccion, usuario_id),
+    })
+
+
+async def secciones_panel(request, panel):
+    """
+    Variante asíncrona (ASGI): todas las secciones del panel en una sola
+    respuesta. Las consultas de cada sección son independientes y se
+    ejecutan a la vez, cada una en su propio hilo y conexión, así que
+    la respuesta tarda lo que la sección más lenta y no la suma de todas.
+    """
+    if panel not in SECCIONES_PANEL:
+        return JsonResponse({'success': False, 'error': 'Panel no encontrado'}, status=404)
+    if not await sync_to_async(verificar_sesion)(request, panel):
+        return JsonResponse({'success': False, 'error': 'No autorizado'})
+    
+    usuario_id = await sync_to_async(request.session.get)('usuario_id')
+    nombres = list(SECCIONES_PANEL[panel])
+    htmls = await asyncio.gather(*(
+        sync_to_async(render_seccion_en_hilo, thread_sensitive=False)(panel, nombre, usuario_id)
+        for nombre in nombres
+    ))
+    return JsonResponse({'success': True, 'secciones': dict(zip(nombres, htmls))})
+
+
 # ===================================
 # FUNCIONALIDADES ADICIONALES
 # ===================================
 def detalle_curso(request, id_curso):
     """Detalle de un curso específico"""
-    curso = get_object_or_404(Curso, idCurso=id_curso)
-    
-    # Obtener información adicional del curso
-    clases = Clase.objects.filter(idCurso=curso).order_by('Fecha_hora')
-    contenidos = ContenidoEducativo.objects.filter(idCurso=curso)
-    evaluaciones = Evaluacion.objects.filter(idCurso=curso)
+    # Curso, clases, contenidos y evaluaciones salen del cache del curso
+    detalle = detalle_de_curso(id_curso)
+    if detalle is None:
+        raise Http404("Curso no encontrado")
     
-    # Verificar si el usuario está inscrito
+    # Verificar si el usuario está inscrito (lo único que depende del usuario)
     esta_inscrito = False
     usuario_id = request.session.get('usuario_id')
     if usuario_id:
         esta_inscrito = Inscripcion.objects.filter(
             idUsuario_id=usuario_id,
-            idCurso=curso,
+            idCurso_id=id_curso,
             Estado='activa'
         ).exists()
     
     context = {
-        'curso': curso,
-        'clases': clases,
-        'contenidos': contenidos,
-        'evaluaciones': evaluaciones,
+        **detalle,
         'esta_inscrito': esta_inscrito,
-        'usuario': get_usuario_sesion(request)
+        'usuario': request.usuario
     }
     return render(request, 'pagina_web/detalle_curso.html', context)
 
@@ -370,28 +573,12 @@ def detalle_curso(request, id_curso):
 # FUNCIONES AUXILIARES
 # ===================================
 def verificar_sesion(request, rol=None):
-    """Verifica si hay una sesión activa y opcionalmente el rol"""
-    if not request.session.get('usuario_id'):
-        print(f"❌ No hay usuario_id en sesión")
-        return False
-    
-    if rol and request.session.get('usuario_rol') != rol:
-        print(f"❌ Rol incorrecto. Esperado: {rol}, Actual: {request.session.get('usuario_rol')}")
-        return False
-    
-    print(f"✅ Sesión válida")
-    return True
-
-
-def get_usuario_sesion(request):
-    """Obtiene el usuario de la sesión actual"""
-    usuario_id = request.session.get('usuario_id')
-    if usuario_id:
-        try:
-            return Usuario.objects.get(idUsuario=usuario_id)
-        except Usuario.DoesNotExist:
-            return None
-    return None
+    """
+    Verifica si hay una sesión activa y opcionalmente el rol. Para vistas
+    con rol fijo usar el decorador sesion_requerida (core/sesion.py); el
+    usuario de la sesión está en request.usuario.
+    """
+    return sesion_valida(request.session, rol)
 
 # ===================================
 # SISTEMA DE TICKETS DE SOPORTE
@@ -407,15 +594,8 @@ def crear_ticket(request):
             descripcion = form.cleaned_data['Descripcion']
             
             try:
-                # Verificar si hay un usuario autenticado usando TU sistema de sesiones
-                usuario_id = request.session.get('usuario_id')
-                usuario_autenticado = None
-                
-                if usuario_id:
-                    try:
-                        usuario_autenticado = Usuario.objects.get(idUsuario=usuario_id)
-                    except Usuario.DoesNotExist:
-                        pass
+                # Usuario de TU sistema de sesiones (None si no hay sesión)
+                usuario_autenticado = request.usuario
                 
                 if usuario_autenticado:
                     # Usuario AUTENTICADO
@@ -459,57 +639,44 @@ def crear_ticket(request):
     # Determinar si hay usuario autenticado
     context = {
         'form': form,
-        'usuario': get_usuario_sesion(request)
+        'usuario': request.usuario
     }
     return render(request, 'pagina_web/crear_ticket.html', context)
 
 
+@sesion_requerida(mensaje='Debes iniciar sesión para ver tus tickets.', nivel=messages.WARNING)
 def mis_tickets(request):
     """Ver mis tickets de soporte"""
-    # Verificar usando tu sistema de sesiones
-    if not verificar_sesion(request):
-        messages.warning(request, 'Debes iniciar sesión para ver tus tickets.')
-        return redirect('login')
-    
-    try:
-        usuario_id = request.session.get('usuario_id')
-        usuario = Usuario.objects.get(idUsuario=usuario_id)
-        
-        tickets = TicketSoporte.objects.filter(idUsuario=usuario).order_by('-Fecha_creacion')
-        
-        context = {
-            'tickets': tickets,
-            'usuario': usuario
-        }
-        return render(request, 'pagina_web/mis_tickets.html', context)
-        
-    except Usuario.DoesNotExist:
+    usuario = request.usuario
+    if not usuario:
         messages.error(request, 'Usuario no encontrado.')
         return redirect('index')
+    
+    tickets = TicketSoporte.objects.filter(idUsuario=usuario).order_by('-Fecha_creacion')
+    
+    context = {
+        'tickets': tickets,
+        'usuario': usuario
+    }
+    return render(request, 'pagina_web/mis_tickets.html', context)
 
 
+@sesion_requerida(mensaje='Debes iniciar sesión para ver los detalles del ticket.', nivel=messages.WARNING)
 def detalle_ticket(request, id_ticket):
     """Ver detalles de un ticket específico"""
-    if not verificar_sesion(request):
-        messages.warning(request, 'Debes iniciar sesión para ver los detalles del ticket.')
-        return redirect('login')
-    
-    try:
-        usuario_id = request.session.get('usuario_id')
-        usuario = Usuario.objects.get(idUsuario=usuario_id)
-        
-        # Obtener el ticket solo si pertenece al usuario
-        ticket = get_object_or_404(TicketSoporte, idTicket=id_ticket, idUsuario=usuario)
-        
-        context = {
-            'ticket': ticket,
-            'usuario': usuario
-        }
-        return render(request, 'pagina_web/detalle_ticket.html', context)
-        
-    except Usuario.DoesNotExist:
+    usuario = request.usuario
+    if not usuario:
         messages.error(request, 'Usuario no encontrado.')
         return redirect('index')
+    
+    # Obtener el ticket solo si pertenece al usuario
+    ticket = get_object_or_404(TicketSoporte, idTicket=id_ticket, idUsuario=usuario)
+    
+    context = {
+        'ticket': ticket,
+        'usuario': usuario
+    }
+    return render(request, 'pagina_web/detalle_ticket.html', context)
 
 # ===================================
 # INSCRIPCION A CURSOS
@@ -523,8 +690,7 @@ def inscribirse_curso(request, curso_id):
             return redirect('login')
         
         curso = get_object_or_404(Curso, idCurso=curso_id, Estado='activo')
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, idUsuario=usuario_id)
+        usuario = usuario_o_404(request)
         
         # Verificar si ya está inscrito
         inscripcion_existente = Inscripcion.objects.filter(
@@ -555,71 +721,135 @@ def inscribirse_curso(request, curso_id):
 # ===================================
 
 from django.db.models import Q, Max, Count
-from django.http import JsonResponse
+from django.core.paginator import Paginator
+from django.http import JsonResponse, HttpResponseNotModified
 from django.contrib.auth.decorators import login_required
-from .models import Chat
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from .models import Chat, Conversation, ProfesorCurso
+from .notifier import notificador, marcar_leidos, difundir_envio_masivo, difundir_escribiendo
+from .busqueda import buscar_mensajes_usuario
+from .presencia import presencia
 
+# Conversaciones por página en la bandeja de entrada
+CONVERSACIONES_POR_PAGINA = 20
+
+# Resultados por página en la búsqueda de mensajes
+RESULTADOS_POR_PAGINA = 20
+
+
+def conversaciones_activas(usuario_id):
+    """Conversaciones del usuario con contrapartes activas y no administradoras"""
+    return Conversation.de_usuario(usuario_id).filter(
+        (Q(user_a_id=usuario_id) & Q(user_b__Estado='activo') & ~Q(user_b__Rol='admin')) |
+        (Q(user_b_id=usuario_id) & Q(user_a__Estado='activo') & ~Q(user_a__Rol='admin'))
+    ).select_related('user_a', 'user_b', 'last_message')
+
+
+@sesion_requerida(mensaje='Debes iniciar sesión para acceder al chat')
 def chat_list(request):
-    """Lista de usuarios disponibles para chatear (excluye admins)"""
-    if not verificar_sesion(request):
-        messages.error(request, 'Debes iniciar sesión para acceder al chat')
-        return redirect('login')
-    
+    """Bandeja de conversaciones del usuario (excluye admins), paginada"""
     usuario_id = request.session.get('usuario_id')
-    usuario_actual = get_object_or_404(Usuario, idUsuario=usuario_id)
+    usuario_actual = usuario_o_404(request)
+    presencia().latido(usuario_id)
     
-    # Obtener usuarios (estudiantes y profesores, sin admins)
-    usuarios_disponibles = Usuario.objects.filter(
-        Estado='activo'
-    ).exclude(
-        idUsuario=usuario_id
-    ).exclude(
-        Rol='admin'
-    ).order_by('Nombres', 'Apellidos')
-    
-    # Obtener conversaciones con mensajes no leídos
-    conversaciones = []
-    for user in usuarios_disponibles:
-        # Último mensaje entre ambos usuarios
-        ultimo_mensaje = Chat.objects.filter(
-            Q(sender=usuario_actual, receiver=user) | 
-            Q(sender=user, receiver=usuario_actual)
-        ).order_by('-timestamp').first()
-        
-        # Contar mensajes no leídos de este usuario
-        unread_count = Chat.objects.filter(
-            sender=user,
-            receiver=usuario_actual,
-            is_read=False
-        ).count()
-        
-        conversaciones.append({
-            'usuario': user,
-            'ultimo_mensaje': ultimo_mensaje,
-            'unread_count': unread_count
-        })
+    # Conversaciones activas (sin admins ni usuarios inactivos), por página
+    paginator = Paginator(conversaciones_activas(usuario_id), CONVERSACIONES_POR_PAGINA)
+    pagina = paginator.get_page(request.GET.get('page'))
     
-    # Ordenar por último mensaje más reciente
-    conversaciones.sort(
-        key=lambda x: x['ultimo_mensaje'].timestamp if x['ultimo_mensaje'] else timezone.now(),
-        reverse=True
-    )
+    # Indicadores "en línea" desde el rastreador de presencia (sin SQL)
+    contrapartes = [conversacion.contraparte_de(usuario_id) for conversacion in pagina.object_list]
+    en_linea = presencia().en_linea([otro.idUsuario for otro in contrapartes])
+    
+    conversaciones = [
+        {
+            'usuario': otro,
+            'ultimo_mensaje': conversacion.last_message,
+            'unread_count': conversacion.no_leidos_de(usuario_id),
+            'en_linea': otro.idUsuario in en_linea,
+        }
+        for conversacion, otro in zip(pagina.object_list, contrapartes)
+    ]
+    
+    # Buscar usuarios para iniciar una conversación nueva y mensajes que coincidan
+    busqueda = request.GET.get('q', '').strip()
+    usuarios_encontrados = []
+    mensajes_encontrados = []
+    if busqueda:
+        mensajes_encontrados, _ = buscar_mensajes_usuario(usuario_id, busqueda, 1, RESULTADOS_POR_PAGINA)
+        usuarios_encontrados = Usuario.objects.filter(
+            Q(Nombres__icontains=busqueda) | Q(Apellidos__icontains=busqueda),
+            Estado='activo'
+        ).exclude(
+            idUsuario=usuario_id
+        ).exclude(
+            Rol='admin'
+        ).order_by('Nombres', 'Apellidos')[:CONVERSACIONES_POR_PAGINA]
     
     context = {
         'usuario': usuario_actual,
-        'conversaciones': conversaciones
+        'conversaciones': conversaciones,
+        'total_no_leidos': Conversation.total_no_leidos(usuario_id),
+        'pagina': pagina,
+        'busqueda': busqueda,
+        'usuarios_encontrados': usuarios_encontrados,
+        'mensajes_encontrados': mensajes_encontrados,
     }
     return render(request, 'chat/chat_list.html', context)
 
 
+def mensajes_conversacion(usuario_id, otro_id):
+    """Mensajes entre dos usuarios, en ambos sentidos"""
+    return Chat.objects.filter(
+        Q(sender_id=usuario_id, receiver_id=otro_id) |
+        Q(sender_id=otro_id, receiver_id=usuario_id)
+    )
+
+
+def cursor_de(mensaje):
+    """Cursor (timestamp, id) de un mensaje para paginar hacia atrás"""
+    return f"{mensaje.timestamp.isoformat()}|{mensaje.id}"
+
+
+def leer_cursor(valor):
+    """Convierte un cursor 'timestamp|id' en tupla; None si es inválido"""
+    try:
+        timestamp, mensaje_id = valor.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(mensaje_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pagina_historial(usuario_id, otro_id, cursor=None):
+    """
+    Página de historial anterior al cursor (o la más reciente si no hay cursor),
+    en orden cronológico. Retorna (mensajes, hay_mas).
+    """
+    por_pagina = settings.CHAT_MENSAJES_POR_PAGINA
+    mensajes = mensajes_conversacion(usuario_id, otro_id).select_related(
+        'sender'
+    ).order_by('-timestamp', '-id')
+    
+    if cursor:
+        timestamp, mensaje_id = cursor
+        mensajes = mensajes.filter(
+            Q(timestamp__lt=timestamp) |
+            Q(timestamp=timestamp, id__lt=mensaje_id)
+        )
+    
+    # Pedir uno extra para saber si quedan mensajes anteriores
+    mensajes = list(mensajes[:por_pagina + 1])
+    hay_mas = len(mensajes) > por_pagina
+    mensajes = mensajes[:por_pagina]
+    mensajes.reverse()
+    return mensajes, hay_mas
+
+
+@sesion_requerida(mensaje='Debes iniciar sesión para acceder al chat')
 def chat_room(request, user_id):
     """Sala de chat con un usuario específico"""
-    if not verificar_sesion(request):
-        messages.error(request, 'Debes iniciar sesión para acceder al chat')
-        return redirect('login')
-    
-    usuario_id = request.session.get('usuario_id')
-    usuario_actual = get_object_or_404(Usuario, idUsuario=usuario_id)
+    usuario_actual = usuario_o_404(request)
     otro_usuario = get_object_or_404(Usuario, idUsuario=user_id)
     
     # Verificar que el otro usuario no sea admin
@@ -627,32 +857,60 @@ def chat_room(request, user_id):
         messages.error(request, 'No puedes chatear con administradores')
         return redirect('chat_list')
     
+    presencia().latido(usuario_actual.idUsuario)
+    
     # Marcar mensajes como leídos
-    Chat.objects.filter(
-        sender=otro_usuario,
-        receiver=usuario_actual,
-        is_read=False
-    ).update(is_read=True)
-    
-    # Obtener historial de mensajes
-    mensajes = Chat.objects.filter(
-        Q(sender=usuario_actual, receiver=otro_usuario) | 
-        Q(sender=otro_usuario, receiver=usuario_actual)
-    ).order_by('timestamp')
+    marcar_leidos(usuario_actual.idUsuario, otro_usuario.idUsuario)
+    
+    # Obtener solo los mensajes más recientes; los anteriores se piden por cursor
+    mensajes, hay_mas = pagina_historial(usuario_actual.idUsuario, otro_usuario.idUsuario)
     
     context = {
         'usuario': usuario_actual,
         'otro_usuario': otro_usuario,
-        'mensajes': mensajes
+        'mensajes': mensajes,
+        'ultimo_id': mensajes[-1].id if mensajes else 0,
+        'hay_mas': hay_mas,
+        'cursor': cursor_de(mensajes[0]) if mensajes else '',
+        'otro_en_linea': otro_usuario.idUsuario in presencia().en_linea([otro_usuario.idUsuario]),
+        'latido_segundos': settings.CHAT_PRESENCIA_LATIDO,
+        'escribiendo_segundos': settings.CHAT_ESCRIBIENDO_TTL,
     }
     return render(request, 'chat/chat_room.html', context)
 
 
+@sesion_requerida()
+def historial_mensajes(request, user_id):
+    """Mensajes anteriores al cursor vía AJAX (paginación por keyset)"""
+    usuario_id = request.session.get('usuario_id')
+    cursor = leer_cursor(request.GET.get('before'))
+    if cursor is None:
+        return JsonResponse({'success': False, 'error': 'Cursor inválido'})
+    
+    mensajes, hay_mas = pagina_historial(usuario_id, user_id, cursor)
+    
+    return JsonResponse({
+        'success': True,
+        'messages': [
+            {
+                'id': msg.id,
+                'text': msg.message,
+                'timestamp': msg.timestamp.strftime('%H:%M'),
+                'is_mine': msg.sender_id == usuario_id,
+                'is_read': msg.is_read,
+                'sender_name': f"{msg.sender.Nombres} {msg.sender.Apellidos}"
+            }
+            for msg in mensajes
+        ],
+        'has_more': hay_mas,
+        'cursor': cursor_de(mensajes[0]) if mensajes else '',
+    })
+
+
 def send_message(request):
     """Enviar mensaje vía AJAX"""
     if request.method == 'POST' and verificar_sesion(request):
-        usuario_id = request.session.get('usuario_id')
-        usuario_actual = get_object_or_404(Usuario, idUsuario=usuario_id)
+        usuario_actual = usuario_o_404(request)
         
         receiver_id = request.POST.get('receiver_id')
         message_text = request.POST.get('message', '').strip()
@@ -686,42 +944,210 @@ def send_message(request):
     return JsonResponse({'success': False, 'error': 'Método no permitido'})
 
 
+def difundir_mensaje_curso(request, curso_id):
+    """
+    Envía un mensaje del profesor a todos los estudiantes activos del curso
+    vía AJAX: una consulta para la lista, INSERT por lotes y actualización
+    en bloque de las conversaciones.
+    """
+    if request.method != 'POST' or not verificar_sesion(request, 'profesor'):
+        return JsonResponse({'success': False, 'error': 'Método no permitido'})
+    
+    usuario_id = request.session.get('usuario_id')
+    message_text = request.POST.get('message', '').strip()
+    
+    if not message_text:
+        return JsonResponse({'success': False, 'error': 'Mensaje vacío'})
+    
+    # Solo los profesores asignados al curso pueden escribir a sus estudiantes
+    if not ProfesorCurso.objects.filter(idProfesor_id=usuario_id, idCurso_id=curso_id).exists():
+        return JsonResponse({'success': False, 'error': 'No estás asignado a este curso'})
+    
+    receptores = list(Inscripcion.objects.filter(
+        idCurso_id=curso_id,
+        Estado='activa',
+        idUsuario__Estado='activo'
+    ).exclude(
+        idUsuario_id=usuario_id
+    ).values_list('idUsuario_id', flat=True))
+    
+    if not receptores:
+        return JsonResponse({'success': False, 'error': 'El curso no tiene estudiantes activos'})
+    
+    # MySQL no devuelve los ids de bulk_create: se anota el último id antes de
+    # insertar y después se leen solo las filas nuevas de este envío
+    devuelve_ids = connections[Chat.objects.db].features.can_return_rows_from_bulk_insert
+    
+    with transaction.atomic():
+        desde_id = None if devuelve_ids else (Chat.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0)
+        chats = Chat.objects.bulk_create(
+            [
+                Chat(sender_id=usuario_id, receiver_id=receptor, message=message_text)
+                for receptor in receptores
+            ],
+            batch_size=settings.CHAT_DIFUSION_LOTE
+        )
+        if not devuelve_ids:
+            creados = Chat.objects.filter(
+                id__gt=desde_id,
+                sender_id=usuario_id,
+                receiver_id__in=receptores,
+                message=message_text
+            ).order_by('id')
+            chats = list({chat.receiver_id: chat for chat in creados}.values())
+        Conversation.registrar_difusion(usuario_id, receptores)
+        transaction.on_commit(lambda: difundir_envio_masivo(chats))
+    
+    return JsonResponse({'success': True, 'enviados': len(receptores)})
+
+
+@sesion_requerida()
+def buscar_mensajes(request):
+    """Búsqueda de texto en los mensajes del usuario vía AJAX, por relevancia"""
+    usuario_id = request.session.get('usuario_id')
+    consulta = request.GET.get('q', '').strip()
+    try:
+        pagina = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        pagina = 1
+    
+    resultados, hay_mas = buscar_mensajes_usuario(usuario_id, consulta, pagina, RESULTADOS_POR_PAGINA)
+    
+    return JsonResponse({
+        'success': True,
+        'results': [
+            {
+                'type': resultado['tipo'],
+                'id': resultado['id'],
+                'text': resultado['texto'],
+                'timestamp': resultado['fecha'].strftime('%d/%m/%Y %H:%M'),
+                'user_id': resultado['contraparte'].idUsuario,
+                'user_name': f"{resultado['contraparte'].Nombres} {resultado['contraparte'].Apellidos}",
+            }
+            for resultado in resultados
+        ],
+        'page': pagina,
+        'has_more': hay_mas,
+    })
+
+
+@sesion_requerida()
 def get_messages(request, user_id):
-    """Obtener mensajes nuevos vía AJAX"""
-    if verificar_sesion(request):
-        usuario_id = request.session.get('usuario_id')
-        usuario_actual = get_object_or_404(Usuario, idUsuario=usuario_id)
-        otro_usuario = get_object_or_404(Usuario, idUsuario=user_id)
-        
-        last_message_id = request.GET.get('last_id', 0)
-        
-        # Obtener mensajes nuevos
-        nuevos_mensajes = Chat.objects.filter(
-            Q(sender=usuario_actual, receiver=otro_usuario) | 
-            Q(sender=otro_usuario, receiver=usuario_actual),
+    """
+    Obtener mensajes nuevos vía AJAX (sincronización por delta).
+    El ETag combina el último mensaje y los contadores de no leídos de la
+    conversación: si nada cambió responde 304 sin más consultas, y solo
+    marca como leído cuando realmente hay mensajes pendientes.
+    """
+    usuario_id = request.session.get('usuario_id')
+    presencia().latido(usuario_id)
+    try:
+        last_message_id = int(request.GET.get('last_id', 0))
+    except ValueError:
+        last_message_id = 0
+    
+    # Una lectura puntual del resumen de la conversación
+    user_a, user_b = Conversation.pareja(usuario_id, user_id)
+    estado = Conversation.objects.filter(
+        user_a_id=user_a, user_b_id=user_b
+    ).values('last_message_id', 'unread_a', 'unread_b').first()
+    if estado is None:
+        estado = {'last_message_id': 0, 'unread_a': 0, 'unread_b': 0}
+    
+    etag = '"{last_message_id}-{unread_a}-{unread_b}"'.format(**estado)
+    if request.headers.get('If-None-Match') == etag:
+        respuesta = HttpResponseNotModified()
+        respuesta['ETag'] = etag
+        return respuesta
+    
+    mensajes_data = []
+    if (estado['last_message_id'] or 0) > last_message_id:
+        # Una sola consulta con los datos del remitente
+        nuevos_mensajes = mensajes_conversacion(usuario_id, user_id).filter(
             id__gt=last_message_id
-        ).order_by('timestamp')
-        
-        # Marcar como leídos los mensajes recibidos
-        Chat.objects.filter(
-            sender=otro_usuario,
-            receiver=usuario_actual,
-            is_read=False
-        ).update(is_read=True)
-        
-        mensajes_data = []
-        for msg in nuevos_mensajes:
-            mensajes_data.append({
-                'id': msg.id,
-                'text': msg.message,
-                'timestamp': msg.timestamp.strftime('%H:%M'),
-                'is_mine': msg.sender.idUsuario == usuario_actual.idUsuario,
-                'sender_name': f"{msg.sender.Nombres} {msg.sender.Apellidos}"
-            })
+        ).order_by('timestamp', 'id').values(
+            'id', 'message', 'timestamp', 'sender_id', 'sender__Nombres', 'sender__Apellidos'
+        )
+        mensajes_data = [
+            {
+                'id': msg['id'],
+                'text': msg['message'],
+                'timestamp': msg['timestamp'].strftime('%H:%M'),
+                'is_mine': msg['sender_id'] == usuario_id,
+                'sender_name': f"{msg['sender__Nombres']} {msg['sender__Apellidos']}"
+            }
+            for msg in nuevos_mensajes
+        ]
+    
+    # Marcar como leídos solo si el contador indica mensajes pendientes
+    campo_unread = 'unread_a' if usuario_id == user_a else 'unread_b'
+    if estado[campo_unread]:
+        marcar_leidos(usuario_id, user_id)
+        estado[campo_unread] = 0
+    
+    respuesta = JsonResponse({
+        'success': True,
+        'messages': mensajes_data
+    })
+    respuesta['ETag'] = '"{last_message_id}-{unread_a}-{unread_b}"'.format(**estado)
+    respuesta['Cache-Control'] = 'no-cache, private'
+    return respuesta
+
+
+@sesion_requerida()
+def esperar_mensajes(request, user_id):
+    """
+    Long-polling de mensajes nuevos: mantiene la petición abierta hasta
+    que llegue un mensaje de la conversación o se cumpla el timeout.
+    get_messages sigue disponible como respaldo de polling.
+    """
+    usuario_id = request.session.get('usuario_id')
+    presencia().latido(usuario_id)
+    try:
+        last_message_id = int(request.GET.get('last_id', 0))
+    except ValueError:
+        last_message_id = 0
+    
+    # Consulta puntual al resumen: si ya hay mensajes nuevos no se espera
+    user_a, user_b = Conversation.pareja(usuario_id, user_id)
+    ultimo_id = Conversation.objects.filter(
+        user_a_id=user_a, user_b_id=user_b
+    ).values_list('last_message_id', flat=True).first() or 0
+    
+    if ultimo_id <= last_message_id:
+        # Solo se acepta 0 < timeout <= CHAT_LONG_POLL_TIMEOUT (nan o inf
+        # dejarían el hilo esperando para siempre)
+        timeout = settings.CHAT_LONG_POLL_TIMEOUT
+        try:
+            pedido = float(request.GET.get('timeout', timeout))
+        except (TypeError, ValueError):
+            pedido = timeout
+        if math.isfinite(pedido) and pedido > 0:
+            timeout = min(pedido, timeout)
         
-        return JsonResponse({
-            'success': True,
-            'messages': mensajes_data
-        })
+        if not notificador.esperar(usuario_id, user_id, last_message_id, timeout):
+            return JsonResponse({'success': True, 'messages': []})
+    
+    return get_messages(request, user_id)
+
+
+@sesion_requerida()
+def presencia_chat(request, user_id):
+    """
+    Latido de presencia vía AJAX. Con POST typing=1 avisa que el usuario
+    está escribiendo. Responde si el otro usuario está en línea o
+    escribiendo, leyendo solo el rastreador de presencia.
+    """
+    usuario_id = request.session.get('usuario_id')
+    rastreador = presencia()
+    rastreador.latido(usuario_id)
+    
+    if request.method == 'POST' and request.POST.get('typing') == '1':
+        rastreador.escribiendo(usuario_id, user_id)
+        difundir_escribiendo(usuario_id, user_id)
     
-    return JsonResponse({'success': False, 'error': 'No autorizado'})
\ No newline at end of file
+    return JsonResponse({
+        'success': True,
+        'online': user_id in rastreador.en_linea([user_id]),
+        'typing': rastreador.esta_escribiendo(user_id, usuario_id),
+    })